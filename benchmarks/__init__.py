@@ -0,0 +1,4 @@
+"""Performance benchmarks for simulation visualizer.
+
+Run ``python -m benchmarks.parsers --help`` from the repository root.
+"""
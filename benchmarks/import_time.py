@@ -0,0 +1,110 @@
+"""Measure cold start of the app: import time and first page latency.
+
+Every run is a fresh interpreter. Import time of the app module is measured
+together with the first call of the layout function which is what the first
+visitor of a freshly spawned worker waits for. Modules with the largest
+cumulative import time are listed from `python -X importtime` output.
+
+Examples
+--------
+>>> python -m benchmarks.import_time --runs 5 --top 15
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+from statistics import median
+from typing import Any, Dict, List, Tuple
+
+DEFAULT_MODULE = "simulation_visualizer.visualize"
+
+_SCRIPT = """
+import json, logging, time
+logging.disable(logging.CRITICAL)
+t0 = time.perf_counter()
+import {module} as m
+t1 = time.perf_counter()
+if hasattr(m, "app"):
+    # outside of a request the layout is only a skeleton for validation
+    with m.app.server.test_request_context():
+        m.app.layout()
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_layout_s": t2 - t1}}))
+"""
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _run(module: str) -> Tuple[Dict[str, float], List[Tuple[str, int]]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         _SCRIPT.format(module=module)],
+        capture_output=True, text=True, check=True
+    )
+    timing = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # cumulative import time in microseconds for every module
+    modules = [(m.group(4), int(m.group(2)))
+               for m in _LINE.finditer(proc.stderr)]
+    return timing, modules
+
+
+def run(module: str, runs: int, top: int) -> Dict[str, Any]:
+
+    timings = []
+    cumulative: Dict[str, List[int]] = {}
+    for _ in range(runs):
+        timing, modules = _run(module)
+        timings.append(timing)
+        for name, us in modules:
+            cumulative.setdefault(name, []).append(us)
+
+    slowest = sorted(((name, median(us) / 1e6)
+                      for name, us in cumulative.items()),
+                     key=lambda x: x[1], reverse=True)[:top]
+
+    return {
+        "module": module,
+        "runs": runs,
+        "import_s": median(t["import_s"] for t in timings),
+        "first_layout_s": median(t["first_layout_s"] for t in timings),
+        "slowest_modules": slowest,
+    }
+
+
+def input_parser() -> Dict[str, Any]:
+
+    p = argparse.ArgumentParser(
+        description="Measure import time and first page latency of the app",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    p.add_argument("-m", "--module", default=DEFAULT_MODULE,
+                   help="module to import")
+    p.add_argument("-r", "--runs", type=int, default=5,
+                   help="number of fresh interpreter runs, median is taken")
+    p.add_argument("-t", "--top", type=int, default=15,
+                   help="number of slowest modules to list")
+    p.add_argument("-o", "--output", default=None,
+                   help="json file to save results to")
+
+    return vars(p.parse_args())
+
+
+def main():
+    args = input_parser()
+    result = run(args["module"], args["runs"], args["top"])
+
+    print(f"import of {result['module']}: {result['import_s']:.3f}s, "
+          f"first layout: {result['first_layout_s']:.3f}s "
+          f"(median of {result['runs']} runs)")
+    for name, seconds in result["slowest_modules"]:
+        print(f"{seconds:8.3f}s  {name}")
+
+    if args["output"]:
+        with open(args["output"], "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""Load test of the dash callbacks with simulated user sessions.
+
+Requests go through the real flask server stack (authentication, callback
+dispatch, serialization) using flask test client, so no network is needed.
+Worker processes mimic server processes, each runs its share of sessions in
+threads. Sessions can be started all at once or ramped up.
+
+Each session types a path one directory at a time (`suggest_path`), submits it
+(`update_axis_select`), plots it several times (`update_figure`) and
+downloads csv (`download_data`).
+
+Examples
+--------
+>>> python -m benchmarks.load_test --sessions 30 --workers 10 --ramp linear:20
+>>> python -m benchmarks.load_test --sessions 50 --ramp step:10:5 -o load.json
+"""
+
+import argparse
+import base64
+import json
+import logging
+import multiprocessing as mp
+import resource
+import threading
+import time
+from pathlib import Path
+from socket import gethostname
+from statistics import quantiles
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from tests.generators import generate
+
+DEFAULT_FILES = ["colvar:10MB", "lcurve_v2:10MB", "lammps_log:10MB"]
+CALLBACKS = ("suggest_path", "update_axis_select", "update_figure",
+             "download_data")
+# output of each callback that identifies it in dash callback map
+_OUTPUT_IDS = {
+    "suggest_path": "list-paths.children",
+    "update_axis_select": "x-select.options",
+    "update_figure": "plot-graph.figure",
+    "download_data": "download.data",
+}
+
+_samples: List[Tuple[str, float, int]] = []
+_samples_lock = threading.Lock()
+
+
+class Session:
+    """One simulated user driving the dash callbacks.
+
+    Parameters
+    ----------
+    client:
+        flask test client
+    headers: dict
+        authentication headers
+    callbacks: dict
+        callback name -> (output key, callback spec)
+    """
+
+    def __init__(self, client, headers: Dict[str, str],
+                 callbacks: Dict[str, Tuple[str, dict]]) -> None:
+        self.client = client
+        self.headers = headers
+        self.callbacks = callbacks
+        self.session_id = str(uuid4())
+
+    def call(self, name: str, values: Dict[str, Any], changed: str
+             ) -> Optional[dict]:
+        """Send one callback request and record its latency.
+
+        Parameters
+        ----------
+        name: str
+            callback name
+        values: dict
+            'component.property' -> value for all inputs and states
+        changed: str
+            'component.property' that triggered the callback
+        """
+        output, spec = self.callbacks[name]
+
+        def fill(deps):
+            return [
+                {"id": d["id"], "property": d["property"],
+                 "value": values.get(f"{d['id']}.{d['property']}")}
+                for d in deps
+            ]
+
+        outputs = [
+            {"id": o.rsplit(".", 1)[0], "property": o.rsplit(".", 1)[1]}
+            for o in output.strip(".").split("...")
+        ]
+        payload = {
+            "output": output,
+            "outputs": outputs if output.startswith("..") else outputs[0],
+            "inputs": fill(spec["inputs"]),
+            "state": fill(spec["state"]),
+            "changedPropIds": [changed],
+        }
+
+        t0 = time.perf_counter()
+        response = self.client.post("/_dash-update-component", json=payload,
+                                    headers=self.headers)
+        latency = time.perf_counter() - t0
+
+        with _samples_lock:
+            _samples.append((name, latency, response.status_code))
+
+        if response.status_code == 200:
+            return response.get_json()
+        return None
+
+    def run(self, host: str, path: str, plots: int):
+        values = {
+            "session-id.children": self.session_id,
+            "input-host.value": host,
+            "input-path.value": "",
+            "url-path.href": "http://localhost:8050/",
+            "addressbar-sw.children": False,
+            "plot-button-state.n_clicks": 0,
+            "dimensionality-state.value": "2D",
+            "plot-type.value": "line",
+            "download-type.value": "csv",
+        }
+
+        if "suggest_path" in self.callbacks:
+            # type the path one directory at a time
+            parts = Path(path).parts
+            for i in range(2, len(parts) + 1):
+                values["input-path.value"] = str(Path(*parts[:i]))
+                self.call("suggest_path", values, "input-path.value")
+        values["input-path.value"] = path
+
+        if "update_axis_select" in self.callbacks:
+            values["submit-button.n_clicks"] = 1
+            response = self.call("update_axis_select", values,
+                                 "submit-button.n_clicks")
+            if response:
+                props = response["response"]
+                values["x-select.value"] = props["x-select"]["value"]
+                values["y-select.value"] = props["y-select"]["value"]
+                values["z-select.value"] = props["z-select"]["value"]
+
+        if "update_figure" in self.callbacks:
+            for i in range(plots):
+                values["plot-button-state.n_clicks"] = i + 1
+                self.call("update_figure", values,
+                          "plot-button-state.n_clicks")
+
+        if "download_data" in self.callbacks:
+            values["download-button.n_clicks"] = 1
+            self.call("download_data", values, "download-button.n_clicks")
+
+
+def _start_delays(n: int, ramp: str) -> List[float]:
+    """Compute start delay of each session from ramp-up profile."""
+    kind, *params = ramp.split(":")
+    if kind == "constant":
+        return [0.0] * n
+    elif kind == "linear":
+        duration = float(params[0])
+        return [duration * i / max(n - 1, 1) for i in range(n)]
+    elif kind == "step":
+        batch, interval = int(params[0]), float(params[1])
+        return [(i // batch) * interval for i in range(n)]
+    else:
+        raise ValueError(f"unknown ramp profile: {ramp}")
+
+
+def _worker(jobs: List[Tuple[float, str, str]], plots: int,
+            callbacks: List[str], queue: mp.Queue):
+    """Run sessions assigned to this worker, each in its own thread."""
+    logging.basicConfig(level=logging.ERROR)
+
+    from simulation_visualizer import data_cache
+    from simulation_visualizer.visualize import USER_LIST, app
+
+    user, password = next(iter(USER_LIST.items()))
+    token = base64.b64encode(f"{user}:{password}".encode()).decode()
+    headers = {"Authorization": f"Basic {token}"}
+
+    callback_map = {}
+    for name in callbacks:
+        for output, spec in app.callback_map.items():
+            if _OUTPUT_IDS[name] in output:
+                callback_map[name] = (output, spec)
+
+    t_start = time.perf_counter()
+
+    def session(delay: float, host: str, path: str):
+        time.sleep(delay)
+        # test client is not thread safe, each session gets its own
+        Session(app.server.test_client(), headers, callback_map).run(
+            host, path, plots
+        )
+
+    threads = [threading.Thread(target=session, args=job) for job in jobs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    queue.put({
+        "samples": _samples,
+        "cache": dict(data_cache.CACHE_STATS),
+        # ru_maxrss is in kilobytes on linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+        1024,
+        "wall_s": time.perf_counter() - t_start,
+    })
+
+
+def run(sessions: int, workers: int, ramp: str, plots: int,
+        files: List[Path], callbacks: List[str]) -> Dict[str, Any]:
+
+    host = gethostname().lower()
+    delays = _start_delays(sessions, ramp)
+    jobs = [(d, host, str(files[i % len(files)])) for i, d in
+            enumerate(delays)]
+
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker,
+                    args=(jobs[i::workers], plots, callbacks, queue))
+        for i in range(workers)
+    ]
+
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    reports = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    wall = time.perf_counter() - t0
+
+    return summarize(reports, wall)
+
+
+def summarize(reports: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+
+    samples = [s for r in reports for s in r["samples"]]
+    hits = sum(r["cache"].get("hits", 0) for r in reports)
+    misses = sum(r["cache"].get("misses", 0) for r in reports)
+
+    def percentiles(latencies: List[float]) -> Dict[str, float]:
+        if len(latencies) < 2:
+            latencies = latencies * 2 or [0.0, 0.0]
+        q = quantiles(latencies, n=100, method="inclusive")
+        return {"p50": q[49], "p90": q[89], "p99": q[98],
+                "max": max(latencies), "count": len(latencies)}
+
+    per_callback = {}
+    for name in CALLBACKS:
+        latencies = [s[1] for s in samples if s[0] == name]
+        if latencies:
+            per_callback[name] = percentiles(latencies)
+
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if s[2] != 200),
+        "wall_s": wall,
+        "throughput_rps": len(samples) / wall,
+        "latency": percentiles([s[1] for s in samples]),
+        "callbacks": per_callback,
+        "cache_hit_rate": hits / (hits + misses) if hits + misses else None,
+        "worker_peak_rss_mb": [r["peak_rss_mb"] for r in reports],
+    }
+
+
+def report(summary: Dict[str, Any]):
+
+    print(f"requests: {summary['requests']}, errors: {summary['errors']}, "
+          f"wall: {summary['wall_s']:.1f}s, "
+          f"throughput: {summary['throughput_rps']:.2f} req/s")
+    print(f"{'callback':>20} {'count':>6} {'p50':>8} {'p90':>8} {'p99':>8} "
+          f"{'max':>8}")
+    for name, p in [("all", summary["latency"]),
+                    *summary["callbacks"].items()]:
+        print(f"{name:>20} {p['count']:6d} {p['p50']:8.3f} {p['p90']:8.3f} "
+              f"{p['p99']:8.3f} {p['max']:8.3f}")
+    if summary["cache_hit_rate"] is not None:
+        print(f"dataframe cache hit rate: {summary['cache_hit_rate']:.1%}")
+    print("peak RSS per worker [MB]: " +
+          ", ".join(f"{m:.0f}" for m in summary["worker_peak_rss_mb"]))
+
+
+def input_parser() -> Dict[str, Any]:
+
+    p = argparse.ArgumentParser(
+        description="Load test dash callbacks with simulated user sessions",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    p.add_argument("-n", "--sessions", type=int, default=10,
+                   help="number of simulated user sessions")
+    p.add_argument("-w", "--workers", type=int, default=4,
+                   help="number of worker processes")
+    p.add_argument("--ramp", default="constant",
+                   help="ramp-up profile: 'constant', 'linear:SECONDS' or "
+                   "'step:SESSIONS:SECONDS'")
+    p.add_argument("--plots", type=int, default=3,
+                   help="number of plot requests in each session")
+    p.add_argument("-f", "--files", nargs="+", default=DEFAULT_FILES,
+                   help="synthetic files as format:size or paths to "
+                   "existing local files")
+    p.add_argument("-c", "--callbacks", nargs="+", default=list(CALLBACKS),
+                   choices=CALLBACKS, help="callbacks to exercise")
+    p.add_argument("-o", "--output", type=Path, default=None,
+                   help="json file to save summary to")
+
+    return vars(p.parse_args())
+
+
+def main():
+    args = input_parser()
+    logging.basicConfig(level=logging.ERROR)
+
+    files = []
+    for f in args["files"]:
+        if Path(f).is_file():
+            files.append(Path(f).resolve())
+        else:
+            kind, size = f.split(":")
+            files.append(generate(kind, size))
+
+    _start_delays(args["sessions"], args["ramp"])  # fail early on bad input
+
+    summary = run(args["sessions"], args["workers"], args["ramp"],
+                  args["plots"], files, args["callbacks"])
+    report(summary)
+
+    if args["output"]:
+        args["output"].write_text(json.dumps(summary, indent=2))
+        print(f"summary saved to {args['output']}")
+
+
+if __name__ == "__main__":
+    main()
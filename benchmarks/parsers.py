@@ -0,0 +1,199 @@
+"""Benchmark all registered parsers on synthetic files.
+
+Every parser is run against every generated file through a local
+connection. Each measurement runs in a fresh process so peak RSS is not
+polluted by previous runs. Each parser can be measured with several parse
+engines. Results are saved to json and two result files can be compared.
+
+Examples
+--------
+>>> python -m benchmarks.parsers --sizes 1MB 100MB -o before.json
+>>> python -m benchmarks.parsers --sizes 1MB 100MB -o after.json
+>>> python -m benchmarks.parsers --compare before.json after.json
+>>> python -m benchmarks.parsers --sizes 100MB --engines pandas numpy
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import resource
+import sys
+from datetime import datetime
+from pathlib import Path
+from socket import gethostname
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from tests.generators import DEFAULT_DIR, available, generate, parse_size
+
+DEFAULT_SIZES = ["1MB", "10MB", "100MB"]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(parser_name: str, path: str, engine: Optional[str],
+             queue: mp.Queue):
+    """Time all parser stages, runs in a child process."""
+    if engine:
+        os.environ["SIM_VISUALIZER_ENGINE"] = engine
+
+    from simulation_visualizer.parser import FileParser
+    from simulation_visualizer.parsers import load_parsers
+
+    # parsers that cannot handle the file log warnings, keep output clean
+    logging.basicConfig(level=logging.ERROR)
+    load_parsers()
+    parser = [p for p in FileParser.parsers if p.__name__ == parser_name][0]
+    host = gethostname().lower()
+    result: Dict[str, Any] = {"rss_start_mb": _peak_rss_mb()}
+
+    t0 = perf_counter()
+    result["handled"] = parser.can_handle(path, host)
+    result["can_handle_s"] = perf_counter() - t0
+
+    if result["handled"]:
+        t0 = perf_counter()
+        parser.extract_header(path, host)
+        result["header_s"] = perf_counter() - t0
+
+        t0 = perf_counter()
+        df = parser.extract_data(path, host)
+        result["data_s"] = perf_counter() - t0
+        result["rows"] = len(df)
+
+    result["peak_rss_mb"] = _peak_rss_mb()
+    queue.put(result)
+
+
+def run(formats: List[str], sizes: List[str], directory: Path,
+        repeat: int, engines: List[Optional[str]]) -> List[Dict[str, Any]]:
+
+    from simulation_visualizer.parser import FileParser
+    from simulation_visualizer.parsers import load_parsers
+
+    load_parsers()
+    parsers = [p.__name__ for p in FileParser.parsers]
+    ctx = mp.get_context("spawn")
+    results = []
+
+    for fmt in formats:
+        for size in sizes:
+            path = generate(fmt, size, directory)
+            nbytes = path.stat().st_size
+            for parser in parsers:
+                for engine in engines:
+                    for i in range(repeat):
+                        queue = ctx.Queue()
+                        proc = ctx.Process(
+                            target=_measure,
+                            args=(parser, str(path), engine, queue)
+                        )
+                        proc.start()
+                        result = queue.get()
+                        proc.join()
+
+                        result.update(format=fmt, size=size, bytes=nbytes,
+                                      parser=parser, engine=engine or "",
+                                      repeat=i)
+                        if "data_s" in result:
+                            result["throughput_mbs"] = (
+                                nbytes / 1024 ** 2 / result["data_s"]
+                            )
+                            print(f"{fmt:>18} {size:>6} {parser:>30} "
+                                  f"{engine or '':>7}: "
+                                  f"{result['data_s']:8.3f}s "
+                                  f"{result['throughput_mbs']:8.1f}MB/s "
+                                  f"{result['peak_rss_mb']:8.1f}MB RSS")
+                        results.append(result)
+
+    return results
+
+
+def compare(old: Path, new: Path):
+    """Print speedup of data extraction between two result files."""
+
+    def index(path: Path):
+        data = json.loads(path.read_text())["results"]
+        table: Dict[tuple, List[float]] = {}
+        for r in data:
+            if "data_s" in r:
+                # results saved before engines were added have none
+                key = (r["format"], r["size"], r["parser"],
+                       r.get("engine", ""))
+                table.setdefault(key, []).append(r["data_s"])
+        return {k: min(v) for k, v in table.items()}
+
+    a = index(old)
+    b = index(new)
+
+    print(f"{'format':>18} {'size':>6} {'parser':>30} {'engine':>7} "
+          f"{'old':>8} {'new':>8} {'speedup':>8}")
+    for key in sorted(set(a) & set(b)):
+        print(f"{key[0]:>18} {key[1]:>6} {key[2]:>30} {key[3]:>7} "
+              f"{a[key]:8.3f} {b[key]:8.3f} {a[key] / b[key]:7.2f}x")
+
+
+def input_parser() -> Dict[str, Any]:
+
+    p = argparse.ArgumentParser(
+        description="Benchmark registered file parsers on synthetic data",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    p.add_argument("-f", "--formats", nargs="+", default=available(),
+                   choices=available(), help="file formats to generate")
+    p.add_argument("-s", "--sizes", nargs="+", default=DEFAULT_SIZES,
+                   help="file sizes e.g. 1MB 500MB 5GB")
+    p.add_argument("-d", "--dir", type=Path, default=DEFAULT_DIR,
+                   help="directory for generated files, files are reused")
+    p.add_argument("-r", "--repeat", type=int, default=1,
+                   help="number of repetitions of each measurement")
+    p.add_argument("-o", "--output", type=Path, default=None,
+                   help="json file to save results to")
+    p.add_argument("-e", "--engines", nargs="+", default=[None],
+                   choices=("pandas", "pyarrow", "numpy"),
+                   help="parse engines to measure, by default the one each "
+                   "parser selects")
+    p.add_argument("--compare", nargs=2, type=Path, default=None,
+                   metavar=("OLD", "NEW"),
+                   help="compare two result files instead of running")
+
+    return vars(p.parse_args())
+
+
+def main():
+    args = input_parser()
+    logging.basicConfig(level=logging.ERROR)
+
+    if args["compare"]:
+        compare(*args["compare"])
+        return
+
+    for size in args["sizes"]:
+        parse_size(size)  # fail early on bad input
+
+    results = run(args["formats"], args["sizes"], args["dir"], args["repeat"],
+                  args["engines"])
+
+    output = args["output"] or Path(
+        f"bench-parsers-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.write_text(json.dumps({
+        "meta": {
+            "host": gethostname(),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "date": datetime.now().isoformat(),
+        },
+        "results": results,
+    }, indent=2))
+    print(f"results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
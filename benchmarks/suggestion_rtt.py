@@ -0,0 +1,126 @@
+"""Round trip latency of the suggestion server protocol.
+
+Starts suggestion server on a temporary socket and measures latency of
+`ping` requests, which are answered without touching the file system, and
+of `get_dirs` completions of a local directory which are served from the
+listing cache after the first call. Requests are sent one by one over a
+persistent connection and also pipelined in batches.
+
+Examples
+--------
+>>> python -m benchmarks.suggestion_rtt --requests 5000 --batch 32
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import time
+from pathlib import Path
+from socket import gethostname
+from statistics import quantiles
+from tempfile import mkdtemp
+from typing import Any, Callable, Dict, List
+
+from simulation_visualizer.suggestion_server.client import \
+    connect_to_suggestion_server
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+
+    q = quantiles(latencies, n=100, method="inclusive")
+    return {"p50_us": q[49] * 1e6, "p95_us": q[94] * 1e6,
+            "p99_us": q[98] * 1e6, "max_us": max(latencies) * 1e6}
+
+
+def _measure(call: Callable[[], Any], repeats: int) -> List[float]:
+
+    latencies = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def run(requests: int, batch: int, directory: str) -> Dict[str, Any]:
+
+    address = Path(mkdtemp(prefix="sim_visualizer_rtt_")) / "server"
+    host = gethostname().lower()
+
+    client = connect_to_suggestion_server(
+        log_level=logging.WARNING, unique_socket_address=address
+    )
+    try:
+        # warm up connection pool and listing cache
+        client.request("get_dirs", host=host, input_path=directory)
+
+        ping = _measure(lambda: client.request("ping"), requests)
+        complete = _measure(
+            lambda: client.request("get_dirs", host=host,
+                                   input_path=directory),
+            requests
+        )
+        batches = _measure(
+            lambda: client.pipeline([("ping", {})] * batch),
+            max(requests // batch, 1)
+        )
+    finally:
+        client.close()
+        _stop_server(address)
+
+    return {
+        "requests": requests,
+        "batch": batch,
+        "ping": _percentiles(ping),
+        "get_dirs": _percentiles(complete),
+        "pipelined_ping_per_request": _percentiles(
+            [b / batch for b in batches]
+        ),
+    }
+
+
+def _stop_server(address: Path):
+
+    pids = subprocess.run(["pgrep", "-f", f"server.py {address}"],
+                          capture_output=True, text=True).stdout.split()
+    for pid in pids:
+        os.kill(int(pid), signal.SIGTERM)
+
+
+def input_parser() -> Dict[str, Any]:
+
+    p = argparse.ArgumentParser(
+        description="Measure round trip latency of the suggestion server",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    p.add_argument("-n", "--requests", type=int, default=5000,
+                   help="number of requests in each measurement")
+    p.add_argument("-b", "--batch", type=int, default=32,
+                   help="number of pipelined requests in one batch")
+    p.add_argument("-d", "--directory", default=str(Path.home()),
+                   help="local directory to complete")
+    p.add_argument("-o", "--output", default=None,
+                   help="json file to save results to")
+
+    return vars(p.parse_args())
+
+
+def main():
+    args = input_parser()
+    result = run(args["requests"], args["batch"], args["directory"])
+
+    for name in ("ping", "get_dirs", "pipelined_ping_per_request"):
+        r = result[name]
+        print(f"{name:28s} p50 {r['p50_us']:8.1f}us  p95 {r['p95_us']:8.1f}us"
+              f"  p99 {r['p99_us']:8.1f}us  max {r['max_us']:8.1f}us")
+
+    if args["output"]:
+        with open(args["output"], "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -44,10 +44,14 @@ setup(
         "Programming Language :: Python :: 3.9",
         "Typing :: Typed"
     ],
-    packages=find_packages(exclude=("setup", "tests")),
+    packages=find_packages(exclude=("setup", "tests", "benchmarks")),
     include_package_data=True,
     install_requires=REQUIREMENTS,
-    extras_require={"test": ["unittest"] + REQUIREMENTS},
+    extras_require={
+        "test": ["unittest"] + REQUIREMENTS,
+        "metrics": ["prometheus_client>=0.9.0"],
+        "zstd": ["zstandard>=0.15.0"],
+    },
     python_requires=">=3.6",
     entry_points={
         'console_scripts': [
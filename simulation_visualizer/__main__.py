@@ -1,7 +1,11 @@
 import logging
+import os
 from utils import input_parser
 from pathlib import Path
-from visualize import app
+
+# package module, a second copy under top-level name would register the
+# metrics twice
+from simulation_visualizer.metrics import reset_multiproc_dir
 
 SERVER_HOST = "0.0.0.0"
 
@@ -36,6 +40,33 @@ def main():
     for p in (Path(__file__).parent / "logs").glob("suggestion_server*"):
         p.unlink()
 
+    # must be set before the app is imported
+    if args["cache"]:
+        os.environ["SIM_VISUALIZER_CACHE"] = args["cache"]
+    if args["engine"]:
+        os.environ["SIM_VISUALIZER_ENGINE"] = args["engine"]
+    if args["agent"]:
+        os.environ["SIM_VISUALIZER_AGENT"] = "1"
+    if args["streams"]:
+        os.environ["SIM_VISUALIZER_STREAMS"] = str(args["streams"])
+    if args["chunk"]:
+        os.environ["SIM_VISUALIZER_CHUNK"] = str(args["chunk"])
+
+    if args["server"] != "dev":
+        from simulation_visualizer.wsgi import serve
+
+        serve(args["server"], SERVER_HOST, args["port"], args["workers"],
+              args["threads"], args["certfile"], args["keyfile"])
+        return
+
+    from simulation_visualizer.visualize import (app, start_bookmark_watcher,
+                                                  start_index_crawler)
+
+    # forked request processes share metrics of this run only
+    reset_multiproc_dir()
+    start_bookmark_watcher()
+    start_index_crawler()
+
     app.run_server(
         debug=True,
         host=SERVER_HOST,
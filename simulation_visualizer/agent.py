@@ -0,0 +1,253 @@
+"""Remote pre-aggregation agent.
+
+Plotting a huge file needs only a few thousand points, so instead of
+transferring it the agent script is run on the remote host through the
+existing ssh connection. It reads the data lines laid out as the parser
+declares in its `agent_layout`, keeps only the plotted columns and averages
+them in consecutive row bins. Only the bin means are sent back, zlib
+compressed as float64 array.
+
+The script needs numpy on the remote host, when it is not installed or the
+agent fails for any other reason the file is transferred and parsed as
+usual. The agent mode is switched on by SIM_VISUALIZER_AGENT environment
+variable or `--agent` option and used only for files bigger than
+AGENT_MIN_BYTES.
+
+The agent can be tried against local host, where it runs in a subprocess
+exactly as it would on the remote one::
+
+    python -m simulation_visualizer.agent $(hostname) /path/to/COLVAR -c 0 1
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
+
+from simulation_visualizer.metrics import count_transfer, stage
+from simulation_visualizer.utils import is_local
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+log = logging.getLogger(__name__)
+
+AGENT_ENV = "SIM_VISUALIZER_AGENT"
+# smaller files are transferred, that is faster than running the agent
+AGENT_MIN_BYTES: int = 64 * 1024 ** 2
+# maximum number of bins the plotted columns are averaged in
+AGENT_POINTS: int = 10000
+# python interpreter that runs the agent on remote hosts
+REMOTE_PYTHON = "python3"
+# agent exit code signalling that it cannot run on the host
+UNAVAILABLE: int = 3
+
+# runs on the remote host, so it must only use python standard library and
+# numpy, argument is json [path, layout, columns, points], prints json line
+# {"rows": data rows, "bins": returned bins} and base64 encoded zlib
+# compressed float64 array of bin means with shape (bins, columns)
+AGENT_SCRIPT = """
+import base64, bz2, gzip, io, json, lzma, re, sys, zlib
+try:
+    import numpy as np
+except ImportError:
+    sys.exit(%d)
+path, (start, skip, stop), columns, points = json.loads(sys.argv[1])
+openers = {b"\\x1f\\x8b": gzip.open, b"BZh": bz2.open, b"\\xfd7zXZ": lzma.open}
+with open(path, "rb") as f:
+    magic = f.read(6)
+if magic.startswith(b"\\x28\\xb5\\x2f\\xfd"):
+    sys.exit(%d)
+opener = next((o for m, o in openers.items() if magic.startswith(m)), open)
+number = re.compile(r"\\s*[-+.]?\\d")
+# rows are binned by size, when bins run out neighbours are merged
+capacity = 2 * points
+sums = np.zeros((capacity, len(columns)))
+counts = np.zeros(capacity)
+size = 1
+rows = 0
+
+def merge():
+    global sums, counts, size
+    sums = np.vstack([sums.reshape(points, 2, -1).sum(axis=1),
+                      np.zeros((points, len(columns)))])
+    counts = np.concatenate([counts.reshape(points, 2).sum(axis=1),
+                             np.zeros(points)])
+    size *= 2
+
+def flush(block):
+    global rows, counts
+    try:
+        data = np.loadtxt(block, usecols=columns, ndmin=2)
+    except (ValueError, IndexError):
+        data = np.array([[float(r[c]) if c < len(r) else np.nan
+                          for c in columns]
+                         for r in (line.split() for line in block)])
+    data = data.reshape(-1, len(columns))
+    while (rows + len(data) - 1) // size >= capacity:
+        merge()
+    bins = np.arange(rows, rows + len(data)) // size
+    for j in range(len(columns)):
+        sums[:, j] += np.bincount(bins, data[:, j], minlength=capacity)
+    counts += np.bincount(bins, minlength=capacity)
+    rows += len(data)
+
+with io.TextIOWrapper(opener(path, "rb"), "utf-8", "replace") as f:
+    if start:
+        pattern = re.compile(start)
+        for line in f:
+            if pattern.search(line):
+                break
+        for _ in range(skip):
+            f.readline()
+    block = []
+    for line in f:
+        if stop and line.startswith(stop):
+            break
+        if number.match(line):
+            block.append(line)
+        if len(block) == 100000:
+            flush(block)
+            block = []
+    if block:
+        flush(block)
+while -(-rows // size) > points:
+    merge()
+
+means = (sums[counts > 0] / counts[counts > 0, None]).astype("<f8")
+print(json.dumps({"rows": rows, "bins": len(means)}))
+print(base64.b64encode(zlib.compress(means.tobytes())).decode())
+""" % (UNAVAILABLE, UNAVAILABLE)
+
+
+class AgentUnavailable(RuntimeError):
+    """Raised when the agent cannot aggregate the file on its host."""
+
+
+def enabled() -> bool:
+    """Check if agent mode is switched on."""
+    return os.environ.get(AGENT_ENV, "").lower() in ("1", "true", "yes")
+
+
+def aggregate(host: str, path: str, layout: Sequence[Any], names: List[str],
+              columns: List[int], points: int = AGENT_POINTS
+              ) -> "DataFrame":
+    """Average columns of file in row bins on the host it is stored on.
+
+    Parameters
+    ----------
+    host: str
+        server name, local host runs the agent in subprocess
+    path: str
+        path to the file on host
+    layout: Sequence[Any]
+        parser's `agent_layout`
+    names: List[str]
+        labels of all file columns
+    columns: List[int]
+        positions of columns to aggregate
+    points: int
+        maximum number of bins
+
+    Returns
+    -------
+    DataFrame
+        bin means of selected columns
+
+    Raises
+    ------
+    AgentUnavailable
+        if remote python has no numpy, file compression is not supported,
+        the agent failed or it found no data rows
+    """
+    import numpy as np
+    from pandas import DataFrame
+
+    argument = json.dumps([path, list(layout), columns, points])
+
+    with stage("agent", host=host):
+        if is_local(host):
+            result = subprocess.run(
+                [sys.executable, "-c", AGENT_SCRIPT, argument],
+                capture_output=True, encoding="utf-8"
+            )
+        else:
+            from ssh_utilities import Connection
+
+            with stage("ssh_connect", host=host):
+                conn = Connection(host, local=False, quiet=True)
+
+            command = [REMOTE_PYTHON, "-c", shlex.quote(AGENT_SCRIPT),
+                       shlex.quote(argument)]
+            with conn as c:
+                result = c.subprocess.run(command, suppress_out=True,
+                                          quiet=True, capture_output=True,
+                                          encoding="utf-8")
+
+    if result.returncode == UNAVAILABLE:
+        raise AgentUnavailable(f"agent cannot run on {host}, numpy is "
+                               f"missing or the file compression is not "
+                               f"supported")
+    elif result.returncode:
+        raise AgentUnavailable(f"agent failed on {host}: {result.stderr}")
+
+    meta, _, data = result.stdout.partition("\n")
+    meta = json.loads(meta)
+    count_transfer(len(result.stdout), "agent", host)
+    if not meta["rows"]:
+        # start of data was not found, let the parser report what is wrong
+        raise AgentUnavailable(f"agent found no data rows in {host}@{path}")
+
+    values = np.frombuffer(zlib.decompress(base64.b64decode(data)),
+                           dtype="<f8")
+    log.debug(f"agent averaged {meta['rows']} rows of {host}@{path} to "
+              f"{meta['bins']} bins")
+    return DataFrame(values.reshape(meta["bins"], len(columns)),
+                     columns=[names[c] for c in columns])
+
+
+def input_parser() -> Dict[str, Any]:
+
+    p = argparse.ArgumentParser(
+        description="Run remote aggregation agent on a file and print the "
+        "result",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    p.add_argument("host", help="server name, local host name runs the "
+                   "agent in subprocess")
+    p.add_argument("path", help="path to file on the host")
+    p.add_argument("-c", "--columns", nargs="+", type=int, default=[0, 1],
+                   help="positions of aggregated columns")
+    p.add_argument("-p", "--points", type=int, default=AGENT_POINTS,
+                   help="maximum number of bins")
+
+    return vars(p.parse_args())
+
+
+def main():
+    from simulation_visualizer.parser import DataExtractor, find_parser
+
+    args = input_parser()
+    logging.basicConfig(level=logging.DEBUG)
+
+    extractor = DataExtractor(args["path"], args["host"], "agent")
+    header = extractor.header()
+    if isinstance(header, Exception):
+        raise header
+    layout = find_parser(extractor.detected).agent_layout
+    if layout is None:
+        raise AgentUnavailable(f"parser {extractor.detected} does not "
+                               f"declare agent layout")
+
+    print(aggregate(args["host"], args["path"], layout, header[0],
+                    args["columns"], args["points"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Cache backends shared by all server worker processes.
+
+The backend is selected by SIM_VISUALIZER_CACHE environment variable:
+
+* ``sqlite`` or ``sqlite:///path/to/cache.db`` - default, local SQLite store,
+  large values are kept in files next to the database
+* ``redis://host:port/db`` - Redis or compatible server
+* ``filesystem`` or ``filesystem:///path/to/dir`` - flask-caching file cache
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from getpass import getuser
+from pathlib import Path
+from shutil import rmtree
+from tempfile import gettempdir
+from time import time
+from typing import Any, Dict, Optional
+
+from flask_caching.backends.base import BaseCache
+
+log = logging.getLogger(__name__)
+
+CACHE_ENV = "SIM_VISUALIZER_CACHE"
+DEFAULT_CACHE = "sqlite"
+DEFAULT_TIMEOUT: int = 60
+# values bigger than this are stored in separate files
+INLINE_LIMIT: int = 1024 ** 2
+# maximum number of cached items, oldest are removed first
+THRESHOLD: int = 500
+
+
+class SQLiteCache(BaseCache):
+    """Cache stored in local SQLite database usable from many processes.
+
+    Small values are stored inline, big ones (e.g. parsed dataframes) are
+    pickled to files next to the database so they are not limited by SQLite
+    blob size.
+
+    Parameters
+    ----------
+    path: str
+        database file path
+    default_timeout: int
+        default item timeout in seconds
+    threshold: int
+        maximum number of items in cache
+    """
+
+    def __init__(self, path: str, default_timeout: int = DEFAULT_TIMEOUT,
+                 threshold: int = THRESHOLD):
+        super().__init__(default_timeout=default_timeout)
+        self._path = Path(path)
+        self._blob_dir = self._path.with_suffix(".blobs")
+        self._blob_dir.mkdir(parents=True, exist_ok=True)
+        self._threshold = threshold
+        self._local = threading.local()
+
+        with self._db as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, "
+                "expires REAL, value BLOB, file TEXT)"
+            )
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(path=config["CACHE_SQLITE_PATH"],
+                      threshold=config.get("CACHE_THRESHOLD", THRESHOLD))
+        return cls(*args, **kwargs)
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # connections cannot be shared between threads nor forked processes
+        key = (os.getpid(), threading.get_ident())
+        if getattr(self._local, "key", None) != key:
+            self._local.db = sqlite3.connect(str(self._path), timeout=30)
+            self._local.db.execute("PRAGMA journal_mode=WAL")
+            self._local.key = key
+        return self._local.db
+
+    def _expires(self, timeout: Optional[int]) -> float:
+        timeout = self._normalize_timeout(timeout)
+        return time() + timeout if timeout else 0
+
+    def _blob_path(self, key: str) -> Path:
+        return self._blob_dir / hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Any:
+        row = self._db.execute(
+            "SELECT expires, value, file FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+
+        if not row:
+            return None
+        expires, value, file = row
+        if expires and expires < time():
+            self.delete(key)
+            return None
+
+        try:
+            if file:
+                with open(file, "rb") as f:
+                    return pickle.load(f)
+            return pickle.loads(value)
+        except (OSError, pickle.PickleError, EOFError) as e:
+            log.warning(f"could not load cached value {key}: {e}")
+            return None
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None
+            ) -> bool:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        file = None
+        if len(data) > INLINE_LIMIT:
+            # write to temporary file first so readers never see partial data,
+            # threads of one process may write the same key concurrently
+            path = self._blob_path(key)
+            tmp = path.with_suffix(
+                f".{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            file, data = str(path), None
+
+        with self._db as db:
+            old = db.execute("SELECT file FROM cache WHERE key = ?",
+                             (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, self._expires(timeout), data, file)
+            )
+        # value that is now stored inline leaves its old file behind
+        if old and old[0] and file is None:
+            try:
+                os.remove(old[0])
+            except FileNotFoundError:
+                pass
+        self._prune()
+        return True
+
+    def add(self, key: str, value: Any, timeout: Optional[int] = None
+            ) -> bool:
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def has(self, key: str) -> bool:
+        row = self._db.execute(
+            "SELECT expires FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        return bool(row) and (not row[0] or row[0] >= time())
+
+    def delete(self, key: str) -> bool:
+        with self._db as db:
+            row = db.execute("SELECT file FROM cache WHERE key = ?",
+                             (key,)).fetchone()
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+        if row and row[0]:
+            try:
+                os.remove(row[0])
+            except FileNotFoundError:
+                pass
+        return bool(row)
+
+    def clear(self) -> bool:
+        with self._db as db:
+            db.execute("DELETE FROM cache")
+        rmtree(self._blob_dir, ignore_errors=True)
+        self._blob_dir.mkdir(parents=True, exist_ok=True)
+        return True
+
+    def _prune(self):
+        """Remove expired items and the oldest ones above threshold."""
+        db = self._db
+        expired = db.execute(
+            "SELECT key FROM cache WHERE expires != 0 AND expires < ?",
+            (time(),)
+        ).fetchall()
+        overflow = db.execute(
+            "SELECT key FROM cache ORDER BY rowid LIMIT max("
+            "(SELECT count(*) FROM cache) - ?, 0)", (self._threshold,)
+        ).fetchall()
+
+        for (key,) in set(expired + overflow):
+            self.delete(key)
+
+
+def is_distributed(spec: Optional[str] = None) -> bool:
+    """Check if the cache is shared by workers on several machines.
+
+    Parameters
+    ----------
+    spec: Optional[str]
+        backend specification, if None it is read from SIM_VISUALIZER_CACHE
+        environment variable
+    """
+    spec = spec or os.environ.get(CACHE_ENV, DEFAULT_CACHE)
+    return spec.partition("://")[0] in ("redis", "rediss")
+
+
+def get_cache_config(spec: Optional[str] = None) -> Dict[str, Any]:
+    """Build flask-caching config for selected backend.
+
+    Parameters
+    ----------
+    spec: Optional[str]
+        backend specification, if None it is read from SIM_VISUALIZER_CACHE
+        environment variable, see module docstring for the format
+
+    Returns
+    -------
+    Dict[str, Any]
+        flask-caching config
+    """
+    spec = spec or os.environ.get(CACHE_ENV, DEFAULT_CACHE)
+    kind, _, location = spec.partition("://")
+    config: Dict[str, Any] = {"CACHE_DEFAULT_TIMEOUT": DEFAULT_TIMEOUT,
+                              "CACHE_THRESHOLD": THRESHOLD}
+
+    if kind == "sqlite":
+        # path is the same for all workers so they share the cache
+        path = location or str(
+            Path(gettempdir()) / f"sim_visualizer_cache_{getuser()}.db"
+        )
+        config.update(CACHE_TYPE=f"{__name__}.SQLiteCache",
+                      CACHE_SQLITE_PATH=path)
+    elif kind in ("redis", "rediss"):
+        config.update(CACHE_TYPE="RedisCache", CACHE_REDIS_URL=spec)
+    elif kind == "filesystem":
+        # directory must be the same for all processes so they share it
+        location = location or str(
+            Path(gettempdir()) / f"sim_visualizer_cache_{getuser()}"
+        )
+        config.update(CACHE_TYPE="FileSystemCache", CACHE_DIR=location)
+    else:
+        raise ValueError(f"unsupported cache backend: {spec}")
+
+    log.info(f"using {kind} cache backend")
+    return config
+
+
+def get_cache_backend(spec: Optional[str] = None) -> BaseCache:
+    """Create the shared cache backend outside of flask app.
+
+    Used by helper processes, e.g. suggestion server, to pre-populate the
+    cache the app reads from.
+
+    Parameters
+    ----------
+    spec: Optional[str]
+        backend specification, see `get_cache_config`
+    """
+    from werkzeug.utils import import_string
+
+    config = get_cache_config(spec)
+    config.setdefault("CACHE_IGNORE_ERRORS", False)
+
+    name = config["CACHE_TYPE"]
+    if "." not in name:
+        name = f"flask_caching.backends.{name}"
+
+    return import_string(name).factory(
+        None, config, [], {"default_timeout": config["CACHE_DEFAULT_TIMEOUT"]}
+    )
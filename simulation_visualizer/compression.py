@@ -0,0 +1,251 @@
+"""Transparent reading of compressed simulation outputs.
+
+Compression is recognized by magic bytes at the file start, not by file
+suffix, so archived runs are read the same way as running ones:
+
+* ``gzip`` - python gzip module or ``pigz``
+* ``bz2`` - python bz2 module or ``lbzip2``
+* ``xz`` - python lzma module or ``xz -T0``
+* ``zstd`` - optional zstandard package or ``pzstd``/``zstd``
+
+Files are always decompressed as a stream, never expanded to disk. Local
+files (including local copies of remote ones) are preferably decompressed
+by the command line tool in a separate process, so decompression runs in
+parallel with parsing and the multithreaded tools decompress multi-block xz
+and multi-frame zstd archives on all cores.
+
+Compressed files cannot be read from the end, so tail windows are cut out
+of the whole parsed file instead.
+"""
+
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import shutil
+import subprocess
+import zlib
+from contextlib import contextmanager
+from typing import IO, Callable, Dict, Iterator, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+MAGIC: Tuple[Tuple[bytes, str], ...] = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+# number of bytes needed to recognize compression
+MAGIC_BYTES: int = 6
+# command line decompressors to stdout in order of preference
+TOOLS: Dict[str, Tuple[Tuple[str, ...], ...]] = {
+    "gzip": (("pigz", "-dc"),),
+    "bz2": (("lbzip2", "-dc"),),
+    "xz": (("xz", "-dc", "-T0"),),
+    "zstd": (("pzstd", "-dc"), ("zstd", "-dc")),
+}
+# forward seeks in decompressed stream read and drop blocks of this size
+SKIP_BLOCK: int = 1024 ** 2
+
+# starts decompression, returns stream and function that stops it
+_STARTER = Callable[[], Tuple[IO, Callable[[], None]]]
+
+
+def detect(head: bytes) -> Optional[str]:
+    """Name of compression of data starting with head, None if plain."""
+    for magic, name in MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def _tool(kind: str) -> Optional[Tuple[str, ...]]:
+    for command in TOOLS[kind]:
+        if shutil.which(command[0]):
+            return command
+    return None
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("reading zstd compressed files requires zstandard "
+                          "package or zstd command line tool") from None
+    return zstandard
+
+
+class RestartableStream(io.RawIOBase):
+    """Decompressed stream with emulated seeking.
+
+    Seeking forward decompresses and drops data, seeking back restarts the
+    decompression, same as python gzip module does. Parsers mostly only
+    rewind to file start after reading the header, which is cheap.
+
+    Parameters
+    ----------
+    start: Callable[[], Tuple[IO, Callable[[], None]]]
+        starts decompression from the beginning, returns binary stream and
+        function that stops it
+    """
+
+    def __init__(self, start: _STARTER) -> None:
+        self._start = start
+        self._stream, self._stop = start()
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._stream.read(len(b))
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("cannot seek from the end of "
+                                          "compressed stream")
+
+        if offset < self._pos:
+            self._stop()
+            self._stream, self._stop = self._start()
+            self._pos = 0
+        while self._pos < offset:
+            data = self._stream.read(min(offset - self._pos, SKIP_BLOCK))
+            if not data:
+                break
+            self._pos += len(data)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._stop()
+        super().close()
+
+
+def decompress_head(head: bytes, kind: str) -> bytes:
+    """Decompress beginning of compressed file.
+
+    Parameters
+    ----------
+    head: bytes
+        first bytes of the file, need not end on block boundary
+    kind: str
+        compression name as returned by `detect`
+
+    Returns
+    -------
+    bytes
+        as much of the decompressed data as the head holds
+    """
+    if kind == "gzip":
+        return zlib.decompressobj(wbits=31).decompress(head)
+    elif kind == "bz2":
+        return bz2.BZ2Decompressor().decompress(head)
+    elif kind == "xz":
+        return lzma.LZMADecompressor().decompress(head)
+
+    try:
+        return _zstandard().ZstdDecompressor().decompressobj().decompress(
+            head
+        )
+    except ImportError:
+        command = _tool(kind)
+        if not command:
+            raise
+    # tool complains about truncated input but outputs what it decompressed
+    return subprocess.run(command, input=head, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL).stdout
+
+
+def open_stream(fileobj: IO, kind: str) -> IO:
+    """Binary stream decompressing file object on the fly.
+
+    Parameters
+    ----------
+    fileobj: IO
+        compressed binary file object positioned at its start
+    kind: str
+        compression name as returned by `detect`
+    """
+    if kind == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    elif kind == "bz2":
+        return bz2.BZ2File(fileobj, mode="rb")
+    elif kind == "xz":
+        return lzma.LZMAFile(fileobj, mode="rb")
+
+    dctx = _zstandard().ZstdDecompressor()
+
+    def start():
+        fileobj.seek(0)
+        # archives written by pzstd or zstd -T consist of many frames
+        reader = dctx.stream_reader(fileobj, read_across_frames=True)
+        return reader, lambda: None
+
+    return io.BufferedReader(RestartableStream(start))
+
+
+def _open_tool(command: Tuple[str, ...], path: str) -> IO:
+    """Binary stream of file decompressed by command line tool."""
+
+    def start():
+        proc = subprocess.Popen(command + ("--", path),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL)
+
+        def stop():
+            # reader might stop early, e.g. after reading the header
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            proc.stdout.close()
+
+        return proc.stdout, stop
+
+    return io.BufferedReader(RestartableStream(start))
+
+
+@contextmanager
+def open_decompressed(fileobj: IO, kind: str, path: Optional[str] = None
+                      ) -> Iterator[IO]:
+    """Open compressed file in text mode.
+
+    Parameters
+    ----------
+    fileobj: IO
+        compressed binary file object positioned at its start
+    kind: str
+        compression name as returned by `detect`
+    path: Optional[str]
+        local path of the file, if given and decompression tool is installed
+        the file is decompressed by it in separate process
+
+    Yields
+    ------
+    IO
+        text mode file object with decompressed data
+    """
+    command = _tool(kind) if path else None
+
+    if command:
+        log.debug(f"decompressing {kind} stream with {command[0]}")
+        stream = _open_tool(command, path)
+    else:
+        log.debug(f"decompressing {kind} stream in process")
+        stream = open_stream(fileobj, kind)
+
+    with io.TextIOWrapper(stream, encoding="utf-8", errors="replace") as text:
+        yield text
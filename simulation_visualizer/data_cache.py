@@ -0,0 +1,537 @@
+"""Cache of parsed dataframes and their downsampled pyramids.
+
+Cached items are keyed by file fingerprint - host, path, size and
+modification time, so data are invalidated as soon as the file changes and
+the cache can be pre-populated by other processes e.g. bookmark watcher.
+
+When user submits a file it is probed - fingerprint, file start, parser and
+header are obtained in one round trip and remembered for a short time, so
+the following plot and download requests neither stat the file again nor
+detect its parser.
+
+For monitoring, only a window at the end of file can be read - last N rows,
+megabytes or time units. It is cut out with ranged reads from the file end
+and parsed with the column layout of the detected parser. Compressed files
+cannot be read from the end, the window is then cut out of the whole file.
+
+Big numeric dataframes are published to shared memory instead of the cache
+so worker processes attach them without copying, only the decimated pyramid
+levels are kept in the cache.
+
+In agent mode plotted columns of big remote files are averaged on their
+host by the aggregation agent and only the bin means are cached.
+"""
+
+import logging
+from collections import Counter
+from io import StringIO
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Tuple, Union
+
+from typing_extensions import Literal
+
+from simulation_visualizer import agent, shared_arrays
+from simulation_visualizer.cache_backends import is_distributed
+from simulation_visualizer.compression import MAGIC_BYTES, detect
+from simulation_visualizer.metrics import count_cache, stage
+from simulation_visualizer.parser import (SAMPLE_SEED, DataExtractor,
+                                          find_parser)
+from simulation_visualizer.utils import (PROBE_BYTES, is_local, probe_file,
+                                         read_range, stat_files)
+
+if TYPE_CHECKING:
+    from flask_caching import Cache
+    from pandas import DataFrame
+
+    from simulation_visualizer.parser import SUGGEST
+
+    _STAT = Tuple[int, float]
+
+log = logging.getLogger(__name__)
+
+DF_TIMEOUT: int = 600
+# each pyramid level has PYRAMID_BASE times less rows than previous
+PYRAMID_BASE: int = 4
+# do not build levels with less rows than this
+PYRAMID_MIN_ROWS: int = 5000
+# maximum number of rows that will be sent to plotly figure
+MAX_PLOT_ROWS: int = 200000
+# plot and download requests reuse fingerprint of file probed this long ago,
+# so rows appended in the meantime are shown only by the next request, kept
+# short to cover the header and plot requests that follow one another
+PROBE_TIMEOUT: int = 5
+# first window read from file end in tail mode, it grows until it is enough
+TAIL_BLOCK: int = 1024 ** 2
+TAIL_GROWTH: int = 4
+
+# dataframe cache hits and misses of this process
+CACHE_STATS: Counter = Counter()
+
+
+class Probe(NamedTuple):
+    """Everything known about a file after probing it."""
+
+    size: int
+    mtime: float
+    inode: int
+    head: str
+    parser: Optional[str]
+    header: Union[Tuple[List[str], "SUGGEST"], Exception]
+    compression: Optional[str] = None
+
+    @property
+    def stat(self) -> "_STAT":
+        """Fingerprint used in cache keys."""
+        return self.size, self.mtime
+
+
+def file_stat(path: str, host: str) -> "_STAT":
+    """Get file size and modification time.
+
+    Raises
+    ------
+    FileNotFoundError
+        if file does not exist or cannot be accessed
+    """
+    try:
+        return stat_files(host, [path])[path]
+    except KeyError:
+        raise FileNotFoundError(f"Cannot access {host}@{path}")
+
+
+def cache_key(kind: str, path: str, host: str, stat: "_STAT") -> str:
+    """Build cache key from file fingerprint."""
+    return f"{kind}-{host}-{path}-{stat[0]}-{stat[1]}"
+
+
+def _kind(kind: str, stride: int, sample: float) -> str:
+    """Data read with stride or sampling are cached under their own keys."""
+    if stride > 1 or sample < 1:
+        return f"{kind}-stride{stride}-sample{sample}"
+    return kind
+
+
+def build_pyramid(df: "DataFrame") -> List["DataFrame"]:
+    """Build progressively decimated versions of dataframe.
+
+    The first level is the dataframe itself.
+    """
+    pyramid = [df]
+    stride = PYRAMID_BASE
+    while len(df) // stride >= PYRAMID_MIN_ROWS:
+        pyramid.append(df.iloc[::stride])
+        stride *= PYRAMID_BASE
+
+    return pyramid
+
+
+def pick_level(pyramid: List["DataFrame"],
+               max_rows: int = MAX_PLOT_ROWS) -> "DataFrame":
+    """Select the most detailed pyramid level that has at most max_rows."""
+    for level in pyramid:
+        if len(level) <= max_rows:
+            return level
+    else:
+        return pyramid[-1]
+
+
+def store_df(cache: "Cache", path: str, host: str, stat: "_STAT",
+             df: "DataFrame", stride: int = 1, sample: float = 1.0):
+    """Store dataframe and its pyramid under file fingerprint.
+
+    The dataframe goes to shared memory if possible, otherwise to cache.
+    Shared memory is local to the machine, so it is skipped when the cache
+    is shared by workers on several machines.
+    """
+    kind = _kind("df", stride, sample)
+    key = cache_key(kind, path, host, stat)
+    # new fingerprint of the same file supersedes the old entry
+    if is_distributed() or not shared_arrays.publish(
+        key, df, timeout=DF_TIMEOUT, group=f"{kind}-{host}-{path}"
+    ):
+        cache.set(key, df, timeout=DF_TIMEOUT)
+    cache.set(cache_key(_kind("pyramid", stride, sample), path, host, stat),
+              build_pyramid(df)[1:], timeout=DF_TIMEOUT)
+
+
+def has_df(cache: "Cache", path: str, host: str, stat: "_STAT") -> bool:
+    """Check if dataframe of file is in shared memory or cache."""
+    key = cache_key("df", path, host, stat)
+    return shared_arrays.exists(key) or cache.has(key)
+
+
+def lookup_df(cache: "Cache", key: str, host: str
+              ) -> Optional["DataFrame"]:
+    """Dataframe from shared memory or cache, None if it is in neither."""
+    with stage("cache_lookup", host=host):
+        df = shared_arrays.attach(key)
+        if df is None:
+            df = cache.get(key)
+    count_cache(df is not None)
+    return df
+
+
+def _fingerprint(cache: "Cache", path: str, host: str
+                 ) -> Tuple["_STAT", Optional[str]]:
+    """Fingerprint and parser of recently probed file, stat it otherwise."""
+    probed = last_probe(cache, path, host)
+    if probed:
+        return probed.stat, probed.parser
+    return file_stat(path, host), None
+
+
+def get_df(cache: "Cache", path: str, host: str, session_id: str,
+           stat: Optional["_STAT"] = None, parser: Optional[str] = None,
+           stride: int = 1, sample: float = 1.0
+           ) -> Union["DataFrame", Exception]:
+    """Get parsed dataframe from shared memory or cache, parse the file on
+    cache miss.
+
+    With stride more than 1 or sample less than 1 only every stride-th or
+    randomly sampled rows are parsed.
+    """
+    if not stat:
+        stat, parser = _fingerprint(cache, path, host)
+
+    key = cache_key(_kind("df", stride, sample), path, host, stat)
+    df = lookup_df(cache, key, host)
+
+    if df is None:
+        log.debug("dataframe not cached yet")
+        CACHE_STATS["misses"] += 1
+        df = DataExtractor(path, host, session_id, parser).extract(
+            stride, sample
+        )
+        if not isinstance(df, Exception):
+            store_df(cache, path, host, stat, df, stride, sample)
+    else:
+        log.debug("dataframe cache hit")
+        CACHE_STATS["hits"] += 1
+
+    return df
+
+
+def export_csv(cache: "Cache", path: str, host: str, session_id: str,
+               stride: int = 1, sample: float = 1.0) -> str:
+    """Export file data to csv.
+
+    Already parsed data are exported from cache, otherwise the file is
+    streamed through the parser chunk by chunk and each chunk is written
+    out as soon as it is parsed, so the whole dataframe is never built.
+    The streamed data are not cached.
+
+    Raises
+    ------
+    ValueError
+        if none of the parsers can handle the file
+    """
+    stat, parser = _fingerprint(cache, path, host)
+    key = cache_key(_kind("df", stride, sample), path, host, stat)
+    df = lookup_df(cache, key, host)
+
+    if df is not None:
+        return df.to_csv()
+
+    out = StringIO()
+    chunks = DataExtractor(path, host, session_id, parser).iter_chunks(
+        stride=stride, sample=sample
+    )
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(out, header=i == 0)
+    return out.getvalue()
+
+
+def get_pyramid(cache: "Cache", path: str, host: str, session_id: str,
+                stat: Optional["_STAT"] = None, stride: int = 1,
+                sample: float = 1.0
+                ) -> Union[List["DataFrame"], Exception]:
+    """Get downsampled pyramid of dataframe, parse the file on cache miss."""
+    parser = None
+    if not stat:
+        stat, parser = _fingerprint(cache, path, host)
+
+    df = get_df(cache, path, host, session_id, stat=stat, parser=parser,
+                stride=stride, sample=sample)
+    if isinstance(df, Exception):
+        return df
+
+    with stage("cache_lookup", host=host):
+        levels = cache.get(
+            cache_key(_kind("pyramid", stride, sample), path, host, stat)
+        )
+
+    if levels is None:
+        levels = build_pyramid(df)[1:]
+    else:
+        log.debug("pyramid cache hit")
+
+    return [df] + levels
+
+
+def get_aggregated(cache: "Cache", path: str, host: str, session_id: str,
+                   columns: List[str]) -> Optional["DataFrame"]:
+    """Get columns averaged in row bins by agent on the remote host.
+
+    The agent is used only in agent mode for remote files bigger than
+    AGENT_MIN_BYTES whose parser declares `agent_layout`.
+
+    Parameters
+    ----------
+    columns: List[str]
+        labels of plotted columns
+
+    Returns
+    -------
+    Optional[DataFrame]
+        bin means of the columns, None if the agent cannot be used and the
+        file must be transferred
+    """
+    if not agent.enabled() or is_local(host):
+        return None
+
+    stat, parser = _fingerprint(cache, path, host)
+    if stat[0] < agent.AGENT_MIN_BYTES:
+        return None
+
+    parser, header = _detect(cache, path, host, session_id, stat)
+    if isinstance(header, Exception) or not parser:
+        return None
+    layout = find_parser(parser).agent_layout
+    names = header[0]
+    if layout is None or not set(columns) <= set(names):
+        return None
+
+    positions = list(dict.fromkeys(names.index(c) for c in columns))
+    key = cache_key(f"agent-{'-'.join(map(str, positions))}", path, host,
+                    stat)
+    with stage("cache_lookup", host=host):
+        df = cache.get(key)
+    count_cache(df is not None)
+    if df is not None:
+        return df
+
+    try:
+        df = agent.aggregate(host, path, layout, names, positions)
+    except agent.AgentUnavailable as e:
+        log.info(f"{e}, transferring the file")
+        return None
+
+    cache.set(key, df, timeout=DF_TIMEOUT)
+    return df
+
+
+def _detect(cache: "Cache", path: str, host: str, session_id: str,
+            stat: "_STAT", head: Optional[str] = None,
+            compressed: bool = False
+            ) -> Tuple[Optional[str],
+                       Union[Tuple[List[str], "SUGGEST"], Exception]]:
+    """Get parser name and header from cache, parse them on cache miss."""
+    key = cache_key("header", path, host, stat)
+    with stage("cache_lookup", host=host):
+        cached = cache.get(key)
+    count_cache(cached is not None)
+
+    if cached is not None:
+        log.debug("header cache hit")
+        return cached
+
+    log.debug("header not cached yet")
+    extractor = DataExtractor(path, host, session_id)
+    header = None
+    if head is not None:
+        header = extractor.header_from(head)
+        # header might continue past the file start, e.g. LAMMPS logs,
+        # decompressed start says nothing about size of the whole file
+        if ((compressed or len(head.encode()) < stat[0]) and
+                (isinstance(header, Exception) or not header[0])):
+            log.debug("header not found in file start, reading file")
+            extractor = DataExtractor(path, host, session_id,
+                                      extractor.detected)
+            header = None
+    if header is None:
+        header = extractor.header()
+
+    if not isinstance(header, Exception):
+        cache.set(key, (extractor.detected, header), timeout=DF_TIMEOUT)
+    return extractor.detected, header
+
+
+def get_header(cache: "Cache", path: str, host: str, session_id: str,
+               stat: Optional["_STAT"] = None
+               ) -> Union[Tuple[List[str], "SUGGEST"], Exception]:
+    """Get parsed file header from cache, parse it on cache miss.
+
+    Headers of known output files are prefetched to cache by the
+    suggestion server while user browses directories.
+    """
+    if not stat:
+        stat = file_stat(path, host)
+
+    return _detect(cache, path, host, session_id, stat)[1]
+
+
+def probe(cache: "Cache", path: str, host: str, session_id: str) -> Probe:
+    """Probe file in one round trip and remember the result.
+
+    Size, modification time, inode and the file start are read at once,
+    parser and header are then detected from the file start or taken from
+    cache by file fingerprint. Plot and download requests that follow
+    within PROBE_TIMEOUT reuse the result, rows appended to the file in that
+    window are not seen by them.
+
+    Raises
+    ------
+    FileNotFoundError
+        if file does not exist or cannot be accessed
+    """
+    with stage("probe", host=host):
+        stat, inode, head, compression = probe_file(host, path, PROBE_BYTES)
+    parser, header = _detect(cache, path, host, session_id, stat, head,
+                             compression is not None)
+
+    probed = Probe(stat[0], stat[1], inode, head, parser, header,
+                   compression)
+    if parser:
+        cache.set(f"probe-{host}-{path}", probed, timeout=PROBE_TIMEOUT)
+    return probed
+
+
+def last_probe(cache: "Cache", path: str, host: str) -> Optional[Probe]:
+    """Result of recent successful probe of the file, if any."""
+    return cache.get(f"probe-{host}-{path}")
+
+
+def _select_tail(df: "DataFrame", mode: Literal["rows", "mb", "time"],
+                 amount: float) -> "DataFrame":
+    """Cut the window from the end of parsed data."""
+    if mode == "rows":
+        return df.iloc[-int(amount):]
+    elif mode == "time":
+        x = df.iloc[:, 0]
+        return df[x >= x.iloc[-1] - amount]
+    else:
+        return df
+
+
+def _enough(df: "DataFrame", mode: Literal["rows", "mb", "time"],
+            amount: float) -> bool:
+    if df.empty:
+        return False
+    elif mode == "rows":
+        return len(df) >= amount
+    elif mode == "time":
+        x = df.iloc[:, 0]
+        return x.iloc[0] <= x.iloc[-1] - amount
+    else:
+        return True
+
+
+def _thin(df: "DataFrame", stride: int, sample: float) -> "DataFrame":
+    """Keep every stride-th row and random fraction of them."""
+    if stride > 1:
+        df = df.iloc[::stride]
+    if sample < 1:
+        df = df.sample(frac=sample, random_state=SAMPLE_SEED).sort_index()
+    return df
+
+
+def _whole_tail(cache: "Cache", path: str, host: str, session_id: str,
+                stat: "_STAT", parser: Optional[str],
+                mode: Literal["rows", "mb", "time"], amount: float
+                ) -> Union["DataFrame", Exception]:
+    """Cut the window out of the whole parsed file."""
+    df = get_df(cache, path, host, session_id, stat=stat, parser=parser)
+    if isinstance(df, Exception):
+        return df
+    return _select_tail(df, mode, amount)
+
+
+def _read_tail(cache: "Cache", path: str, host: str, session_id: str,
+               stat: "_STAT", parser: Optional[str], header: List[str],
+               mode: Literal["rows", "mb", "time"], amount: float
+               ) -> Union["DataFrame", Exception]:
+    """Read the window from the file end in growing blocks and parse it."""
+    if mode == "mb":
+        nbytes = int(amount * 1024 ** 2)
+    else:
+        nbytes = TAIL_BLOCK
+
+    while nbytes < stat[0]:
+        with stage("tail_read", parser or "", host):
+            data = read_range(host, path, stat[0] - nbytes, nbytes)
+        # drop partial line at the window start
+        data = data[data.find(b"\n") + 1:]
+
+        with stage("parse", parser or "", host):
+            df = find_parser(parser).parse_lines(
+                StringIO(data.decode("utf-8", "replace")), header
+            )
+        if _enough(df, mode, amount):
+            return _select_tail(df, mode, amount)
+        nbytes *= TAIL_GROWTH
+
+    log.debug("tail window spans whole file")
+    return _whole_tail(cache, path, host, session_id, stat, parser, mode,
+                       amount)
+
+
+def get_tail(cache: "Cache", path: str, host: str, session_id: str,
+             mode: Literal["rows", "mb", "time"], amount: float,
+             stride: int = 1, sample: float = 1.0
+             ) -> Union["DataFrame", Exception]:
+    """Parse only the window at the end of file.
+
+    The window is read from the file end in blocks growing by TAIL_GROWTH
+    until it holds enough rows or time span. Data lines are cut at the first
+    complete line and parsed with the detected parser's `parse_lines`. If
+    the window reaches file start or the file is compressed, the whole file
+    is parsed instead. As in `get_df` errors are returned, not raised.
+
+    Parameters
+    ----------
+    mode: Literal["rows", "mb", "time"]
+        window is given as number of last rows, megabytes or time units of
+        the first column
+    amount: float
+        window size
+    stride: int
+        keep only every stride-th row of the window
+    sample: float
+        keep only this random fraction of rows of the window
+    """
+    stat, parser = _fingerprint(cache, path, host)
+    key = cache_key(_kind(f"tail-{mode}-{amount}", stride, sample), path,
+                    host, stat)
+    with stage("cache_lookup", host=host):
+        df = cache.get(key)
+    count_cache(df is not None)
+    if df is not None:
+        return df
+
+    parser, header = _detect(cache, path, host, session_id, stat)
+    if isinstance(header, Exception):
+        return header
+
+    probed = last_probe(cache, path, host)
+    try:
+        if probed:
+            compression = probed.compression
+        else:
+            compression = detect(read_range(host, path, 0, MAGIC_BYTES))
+
+        if compression:
+            log.info(f"{path} is {compression} compressed, it cannot be "
+                     f"read from the end, parsing whole file")
+            df = _whole_tail(cache, path, host, session_id, stat, parser,
+                             mode, amount)
+        else:
+            df = _read_tail(cache, path, host, session_id, stat, parser,
+                            header[0], mode, amount)
+    except Exception as e:
+        log.exception(f"could not read tail of {host}@{path}: {e}")
+        return e
+    if isinstance(df, Exception):
+        return df
+
+    df = _thin(df, stride, sample)
+    cache.set(key, df, timeout=DF_TIMEOUT)
+    return df
@@ -0,0 +1,164 @@
+"""Parse engines reading whitespace separated numeric tables.
+
+Parsers hand the data part of the file to `read_table` together with column
+labels and declared dtypes, so types are not inferred chunk by chunk. The
+engine is selected by SIM_VISUALIZER_ENGINE environment variable, then by
+the parser's `engine` attribute:
+
+* ``pandas`` - default, pandas C parser, handles any layout
+* ``pyarrow`` - multithreaded pyarrow CSV reader, requires pyarrow, it
+  only splits on single characters so comments are removed and runs of
+  blanks collapsed to one space beforehand
+* ``numpy`` - `numpy.loadtxt` fast path for rectangular float tables
+
+When the selected engine is not installed or cannot read the table it falls
+back to pandas, and when the declared dtypes do not fit the data pandas
+infers them.
+"""
+
+import io
+import logging
+import os
+import re
+from typing import (IO, TYPE_CHECKING, Callable, Dict, Iterable, List,
+                    Optional, Union)
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+log = logging.getLogger(__name__)
+
+ENGINE_ENV = "SIM_VISUALIZER_ENGINE"
+DEFAULT_ENGINE = "pandas"
+
+_COMMENT = re.compile(rb"#[^\n]*")
+_BLANKS = re.compile(rb"[ \t\r]+")
+_LINE_EDGES = re.compile(rb"^ | $", re.M)
+
+
+def _read_pandas(fileobj: IO, names: List[str],
+                 dtypes: Optional[Dict[str, str]], usecols: Optional[int]
+                 ) -> "DataFrame":
+    import pandas as pd
+
+    columns = names[:usecols] if usecols else names
+    if dtypes is not None:
+        dtypes = {n: dtypes.get(n, "float64") for n in columns}
+
+    return pd.read_table(
+        fileobj, sep=r"\s+", header=None, names=names, comment="#",
+        usecols=columns if usecols else None, dtype=dtypes
+    )
+
+
+def _single_spaced(data: bytes) -> bytes:
+    """Drop comments and separate columns by exactly one space."""
+    return _LINE_EDGES.sub(b"", _BLANKS.sub(b" ", _COMMENT.sub(b"", data)))
+
+
+def _read_pyarrow(fileobj: IO, names: List[str],
+                  dtypes: Optional[Dict[str, str]], usecols: Optional[int]
+                  ) -> "DataFrame":
+    import pyarrow as pa
+    from pyarrow import csv
+
+    data = fileobj.read()
+    if isinstance(data, str):
+        data = data.encode()
+
+    table = csv.read_csv(
+        pa.py_buffer(_single_spaced(data)),
+        read_options=csv.ReadOptions(column_names=names, use_threads=True),
+        parse_options=csv.ParseOptions(delimiter=" ",
+                                       ignore_empty_lines=True),
+        convert_options=csv.ConvertOptions(
+            column_types={n: pa.type_for_alias((dtypes or {}).get(n,
+                                                                  "float64"))
+                          for n in names},
+            include_columns=names[:usecols] if usecols else None
+        )
+    )
+    return table.to_pandas()
+
+
+def _read_numpy(fileobj: IO, names: List[str],
+                dtypes: Optional[Dict[str, str]], usecols: Optional[int]
+                ) -> "DataFrame":
+    import numpy as np
+    from pandas import DataFrame
+
+    columns = usecols or len(names)
+    # raises on ragged rows so the table is never silently misaligned
+    data = np.loadtxt(fileobj, dtype=np.float64, comments="#", ndmin=2,
+                      usecols=range(columns) if usecols else None)
+    if data.shape[1] != columns:
+        raise ValueError(f"table has {data.shape[1]} columns, expected "
+                         f"{columns}")
+
+    df = DataFrame(data, columns=names[:columns], copy=False)
+    return df.astype(dtypes) if dtypes else df
+
+
+ENGINES: Dict[str, Callable[..., "DataFrame"]] = {
+    "pandas": _read_pandas,
+    "pyarrow": _read_pyarrow,
+    "numpy": _read_numpy,
+}
+
+
+def select_engine(preferred: Optional[str] = None) -> str:
+    """Engine from environment variable, then parser preference."""
+    engine = os.environ.get(ENGINE_ENV) or preferred or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        log.warning(f"unknown parse engine {engine}, using {DEFAULT_ENGINE}")
+        engine = DEFAULT_ENGINE
+    return engine
+
+
+def read_table(source: Union[IO, Iterable[str]], names: List[str],
+               dtypes: Optional[Dict[str, str]] = None,
+               engine: Optional[str] = None, usecols: Optional[int] = None
+               ) -> "DataFrame":
+    """Parse whitespace separated numeric table.
+
+    Parameters
+    ----------
+    source: Union[IO, Iterable[str]]
+        seekable text stream positioned at the first data line or iterable
+        of data lines
+    names: List[str]
+        column labels
+    dtypes: Optional[Dict[str, str]]
+        dtype of columns by label, other columns are float64, if None
+        pandas infers the types
+    engine: Optional[str]
+        preferred engine, environment variable takes precedence
+    usecols: Optional[int]
+        read only this many leading columns
+
+    Returns
+    -------
+    DataFrame
+        parsed table
+    """
+    if not hasattr(source, "seek"):
+        source = io.StringIO("".join(source))
+    start = source.tell()
+
+    engine = select_engine(engine)
+    attempts = [(engine, dtypes)]
+    if engine != DEFAULT_ENGINE:
+        attempts.append((DEFAULT_ENGINE, dtypes))
+    if dtypes is not None:
+        attempts.append((DEFAULT_ENGINE, None))
+
+    for i, (name, types) in enumerate(attempts):
+        source.seek(start)
+        try:
+            return ENGINES[name](source, names, types, usecols)
+        except (ImportError, ValueError, TypeError, OverflowError) as e:
+            # the last attempt has nothing to fall back to
+            if i == len(attempts) - 1:
+                raise
+            log.debug(f"{name} engine could not parse table with dtypes "
+                      f"{types}: {e}")
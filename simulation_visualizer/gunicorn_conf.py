@@ -0,0 +1,24 @@
+"""Gunicorn server hooks, load them when running gunicorn directly:
+
+    gunicorn -c python:simulation_visualizer.gunicorn_conf \\
+        simulation_visualizer.wsgi:application
+
+`wsgi.serve` installs the same hooks.
+"""
+
+from simulation_visualizer import metrics
+
+
+def on_starting(server):
+    metrics.reset_multiproc_dir()
+
+
+def post_fork(server, worker):
+    # threads do not survive fork, each worker competes for the locks
+    from simulation_visualizer.wsgi import start_background_threads
+
+    start_background_threads()
+
+
+def child_exit(server, worker):
+    metrics.worker_exit(worker.pid)
@@ -0,0 +1,414 @@
+"""Index of simulation output files on configured hosts.
+
+Root directories to index are listed in data/index_roots.txt, one host per
+line followed by whitespace separated paths, e.g.::
+
+    hydra /scratch/me /home/me/simulations
+    kohn /data/me
+
+Each host is crawled by one remote command that walks all its roots and
+reads the first line of every file, compressed files are decompressed on the
+fly. Only files whose first line matches header of some registered parser
+are reported back. Results are stored with
+size and modification time in local SQLite database, so searching e.g. for
+all COLVAR files modified in the last day never touches the remote hosts.
+
+The crawl runs periodically in background of one server process or it can
+be run from cron::
+
+    python -m simulation_visualizer.indexer
+"""
+
+import argparse
+import fcntl
+import json
+import logging
+import re
+import shlex
+import sqlite3
+import subprocess
+import sys
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from fnmatch import fnmatch
+from pathlib import Path
+from time import time
+from typing import IO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from simulation_visualizer.metrics import stage
+from simulation_visualizer.parser import FileParser
+from simulation_visualizer.parsers import load_parsers
+from simulation_visualizer.utils import is_local
+
+log = logging.getLogger(__name__)
+
+INDEX_ROOTS = Path(__file__).parent / "data" / "index_roots.txt"
+INDEX_DB = Path(__file__).parent / "data" / "index.db"
+INDEXER_LOCK = INDEX_DB.with_suffix(".lock")
+# seconds between two crawls of all hosts
+INDEX_INTERVAL: int = 3600
+# maximum number of files returned by one search
+MAX_RESULTS: int = 200
+# only this many bytes of each file are read when looking for the header
+HEAD_BYTES: int = 1024
+# python interpreter that runs the crawl script on remote hosts
+REMOTE_PYTHON = "python3"
+
+# (host, path, parser name, size, modification time)
+_RESULT = Tuple[str, str, str, int, float]
+# called with host and its roots after the host is indexed
+_ON_UPDATE = Callable[[str, List[str]], None]
+
+# runs on the crawled host, files are opened by open_text where the package
+# is installed, otherwise only python standard library is used, prints one
+# json line [path, size, mtime, parser] for each recognized file
+CRAWL_SCRIPT = """
+import bz2, gzip, io, json, lzma, os, re, sys
+try:
+    from simulation_visualizer.utils import open_text
+except ImportError:
+    open_text = None
+roots, parsers, head = json.loads(sys.argv[1])
+parsers = [(n, re.compile(p, f)) for n, p, f in parsers]
+openers = {b"\\x1f\\x8b": gzip.open, b"BZh": bz2.open, b"\\xfd7zXZ": lzma.open}
+
+def first_line(path):
+    with open(path, "rb", buffering=0) as raw:
+        if open_text:
+            with open_text(raw) as f:
+                return f.readline(head)
+        magic = raw.read(6)
+        raw.seek(0)
+        opener = next((o for m, o in openers.items() if magic.startswith(m)),
+                      None)
+        stream = opener(raw, "rb") if opener else raw
+        with io.TextIOWrapper(stream, "utf-8", "replace") as f:
+            return f.readline(head)
+
+stack = list(roots)
+while stack:
+    try:
+        with os.scandir(stack.pop()) as it:
+            entries = list(it)
+    except OSError:
+        continue
+    for e in entries:
+        if e.name.startswith("."):
+            continue
+        try:
+            if e.is_dir(follow_symlinks=False):
+                stack.append(e.path)
+                continue
+            if not e.is_file():
+                continue
+            line = first_line(e.path)
+            for name, pattern in parsers:
+                if pattern.match(line):
+                    st = e.stat()
+                    print(json.dumps([e.path, st.st_size, st.st_mtime, name]))
+                    break
+        except Exception:
+            # unreadable or corrupted file, zstd without zstandard package
+            continue
+"""
+
+# age in query, e.g. 30m, 24h, 7d
+_AGE = re.compile(r"(\d+(?:\.\d+)?)([smhdw])", re.I)
+_AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def load_roots() -> Dict[str, List[str]]:
+    """Read directories to index on each host.
+
+    Returns
+    -------
+    Dict[str, List[str]]
+        host -> list of root directories
+    """
+    roots: Dict[str, List[str]] = defaultdict(list)
+    try:
+        lines = INDEX_ROOTS.read_text().splitlines()
+    except FileNotFoundError:
+        return roots
+
+    for line in lines:
+        line = line.split("#", 1)[0].split()
+        if len(line) > 1:
+            roots[line[0]].extend(line[1:])
+    return roots
+
+
+@contextmanager
+def _connect() -> Iterator[sqlite3.Connection]:
+
+    INDEX_DB.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(INDEX_DB), timeout=30)
+    try:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS files (host TEXT, path TEXT, "
+            "name TEXT, parser TEXT, size INTEGER, mtime REAL, seen REAL, "
+            "PRIMARY KEY (host, path))"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime)")
+        with db:
+            yield db
+    finally:
+        db.close()
+
+
+def _header_patterns() -> List[Tuple[str, str, int]]:
+    """Header regular expressions of all parsers that define one."""
+    load_parsers()
+    return [(p.name, p.header.pattern, p.header.flags)
+            for p in FileParser.parsers
+            if isinstance(getattr(p, "header", None), re.Pattern)]
+
+
+def crawl_host(host: str, roots: List[str]
+               ) -> List[Tuple[str, int, float, str]]:
+    """Find recognized files under roots with one command run on the host.
+
+    Parameters
+    ----------
+    host: str
+        server name
+    roots: List[str]
+        directories to walk recursively
+
+    Returns
+    -------
+    List[Tuple[str, int, float, str]]
+        path, size, modification time and name of parser for each file
+
+    Raises
+    ------
+    RuntimeError
+        if the crawl script fails on the host
+    """
+    argument = json.dumps([roots, _header_patterns(), HEAD_BYTES])
+
+    if is_local(host):
+        result = subprocess.run([sys.executable, "-c", CRAWL_SCRIPT, argument],
+                                capture_output=True, encoding="utf-8")
+    else:
+        from ssh_utilities import Connection
+
+        with stage("ssh_connect", host=host):
+            conn = Connection(host, local=False, quiet=True)
+
+        command = [REMOTE_PYTHON, "-c", shlex.quote(CRAWL_SCRIPT),
+                   shlex.quote(argument)]
+        with conn as c:
+            result = c.subprocess.run(command, suppress_out=True, quiet=True,
+                                      capture_output=True, encoding="utf-8")
+
+    if result.returncode:
+        raise RuntimeError(f"crawl failed on {host}: {result.stderr}")
+
+    files = []
+    for line in result.stdout.splitlines():
+        path, size, mtime, parser = json.loads(line)
+        files.append((path, int(size), float(mtime), parser))
+    return files
+
+
+def update_index(host: str, roots: List[str]) -> int:
+    """Crawl host and replace its entries under roots in the index.
+
+    Returns
+    -------
+    int
+        number of indexed files
+    """
+    started = time()
+    with stage("index_crawl", host=host):
+        files = crawl_host(host, roots)
+
+    with _connect() as db:
+        db.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(host, path, Path(path).name, parser, size, mtime, started)
+             for path, size, mtime, parser in files]
+        )
+        # drop files that were not seen under the crawled roots any more
+        for root in roots:
+            prefix = root.rstrip("/") + "/"
+            db.execute(
+                "DELETE FROM files WHERE host = ? AND seen < ? AND "
+                "substr(path, 1, ?) = ?",
+                (host, started, len(prefix), prefix)
+            )
+
+    log.info(f"indexed {len(files)} files on {host}")
+    return len(files)
+
+
+def update_all(on_update: Optional[_ON_UPDATE] = None):
+    """Crawl all configured hosts, failed hosts keep their old entries.
+
+    Parameters
+    ----------
+    on_update: Optional[Callable[[str, List[str]], None]]
+        called with host and its roots after the host is indexed
+    """
+    for host, roots in load_roots().items():
+        try:
+            update_index(host, roots)
+        except Exception as e:
+            log.warning(f"could not index {host}: {e}")
+        else:
+            if on_update:
+                on_update(host, roots)
+
+
+def search(query: str, limit: int = MAX_RESULTS) -> List[_RESULT]:
+    """Search the index, newest files first.
+
+    Query is a whitespace separated list of terms that must all match:
+
+    * ``host:<name>`` - files on the host
+    * ``parser:<name>`` - part of the parser name, e.g. ``parser:colvar``
+    * ``/some/path`` or ``under:/some/path`` - files under the directory
+    * ``24h``, ``30m``, ``7d`` - files modified in that time
+    * any other word - part of file name or parser name, shell patterns
+      such as ``*.out`` are matched against the whole file name
+
+    Parameters
+    ----------
+    query: str
+        search terms, e.g. ``colvar 24h /scratch/me``
+    limit: int
+        maximum number of results
+
+    Returns
+    -------
+    List[Tuple[str, str, str, int, float]]
+        host, path, parser name, size and modification time of each file
+    """
+    conditions: List[str] = []
+    params: List = []
+
+    for term in query.split():
+        key, _, value = term.partition(":")
+        age = _AGE.fullmatch(term)
+
+        if key == "host" and value:
+            conditions.append("host = ?")
+            params.append(value)
+        elif key == "parser" and value:
+            conditions.append("parser LIKE ?")
+            params.append(f"%{value}%")
+        elif term.startswith("/") or (key == "under" and value):
+            prefix = (value if key == "under" else term).rstrip("/") + "/"
+            conditions.append("substr(path, 1, ?) = ?")
+            params.extend((len(prefix), prefix))
+        elif age:
+            conditions.append("mtime >= ?")
+            params.append(
+                time() - float(age[1]) * _AGE_UNITS[age[2].lower()]
+            )
+        elif any(c in term for c in "*?["):
+            conditions.append("fnmatch(name, ?)")
+            params.append(term)
+        else:
+            conditions.append("(name LIKE ? OR parser LIKE ?)")
+            params.extend((f"%{term}%", f"%{term}%"))
+
+    sql = "SELECT host, path, parser, size, mtime FROM files"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY mtime DESC LIMIT ?"
+
+    with _connect() as db:
+        db.create_function("fnmatch", 2, fnmatch, deterministic=True)
+        return db.execute(sql, params + [limit]).fetchall()
+
+
+class IndexCrawler(threading.Thread):
+    """Daemon thread periodically re-crawling all configured hosts.
+
+    Parameters
+    ----------
+    interval: int
+        seconds between two crawls
+    on_update: Optional[Callable[[str, List[str]], None]]
+        called with host and its roots after the host is indexed
+    """
+
+    def __init__(self, interval: int = INDEX_INTERVAL,
+                 on_update: Optional[_ON_UPDATE] = None):
+        super().__init__(name="index-crawler", daemon=True)
+        self._interval = interval
+        self._on_update = on_update
+        self._stop_event = threading.Event()
+
+    def run(self):
+        log.info("index crawler started")
+        while not self._stop_event.is_set():
+            try:
+                update_all(self._on_update)
+            except Exception as e:
+                log.exception(f"index crawl failed: {e}")
+            self._stop_event.wait(self._interval)
+
+    def stop(self):
+        """Signal the crawler to exit after current crawl."""
+        self._stop_event.set()
+
+
+_crawler: Optional[IndexCrawler] = None
+_lock_file: Optional[IO] = None
+
+
+def start_crawler(interval: int = INDEX_INTERVAL,
+                  on_update: Optional[_ON_UPDATE] = None
+                  ) -> Optional[IndexCrawler]:
+    """Start index crawler, only one crawler runs on the machine."""
+    global _crawler, _lock_file
+
+    if _lock_file is None:
+        INDEXER_LOCK.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(INDEXER_LOCK, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            log.debug("index crawler is running in another process")
+            return _crawler
+        _lock_file = lock_file
+
+    if not _crawler or not _crawler.is_alive():
+        _crawler = IndexCrawler(interval=interval, on_update=on_update)
+        _crawler.start()
+
+    return _crawler
+
+
+def input_parser():
+
+    p = argparse.ArgumentParser(
+        description="Index simulation output files on configured hosts",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    p.add_argument("-s", "--search", default=None,
+                   help="search the index instead of crawling, e.g. "
+                   "'colvar 24h /scratch/me'")
+
+    return vars(p.parse_args())
+
+
+def main():
+    args = input_parser()
+
+    if args["search"] is not None:
+        for host, path, parser, size, mtime in search(args["search"]):
+            print(f"{host}@{path} {parser} {size}")
+    else:
+        logging.basicConfig(level=logging.INFO)
+        update_all()
+
+
+if __name__ == "__main__":
+    main()
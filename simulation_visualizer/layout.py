@@ -1,23 +1,45 @@
+from functools import lru_cache
 from socket import gethostname
+from typing import Dict, List
 from uuid import uuid4
 
 from dash import dcc
 from dash import html
 from dash_extensions import Download
-from ssh_utilities import Connection
+from flask import has_request_context
 
-from simulation_visualizer.parser import DataExtractor
+from simulation_visualizer.parser import FileParser
+from simulation_visualizer.parsers import load_parsers
 from simulation_visualizer.text import PLUGINS_INTRO, URL_SHARING, USAGE
 
-HOSTS = [{"label": h, "value": h} for h in Connection.get_available_hosts()]
-HOSTS.append(
-    {"label": f"{gethostname().lower()}-local", "value": gethostname().lower()}
-)
-PARSERS = {str(p.name): p.description for p in DataExtractor("", "", "").parsers}
+
+@lru_cache(maxsize=None)
+def get_hosts() -> List[Dict[str, str]]:
+    """Hosts from ssh config, read on first page load instead of import."""
+    from ssh_utilities import Connection
+
+    hosts = [{"label": h, "value": h} for h in Connection.get_available_hosts()]
+    hosts.append(
+        {"label": f"{gethostname().lower()}-local", "value": gethostname().lower()}
+    )
+    return hosts
+
+
+def get_parsers() -> Dict[str, str]:
+    load_parsers()
+    return {str(p.name): p.description for p in FileParser.parsers}
 
 
 def serve_layout():
     session_id = str(uuid4())
+    if has_request_context():
+        hosts = get_hosts()
+        parsers = get_parsers()
+    else:
+        # dash calls the layout function once at assignment to validate the
+        # component ids, do not read ssh config and parsers at import then
+        hosts = []
+        parsers = {}
 
     plot = [
         dcc.Loading(
@@ -54,7 +76,7 @@ def serve_layout():
                         html.Label("Select host PC"),
                         dcc.Dropdown(
                             id="input-host",
-                            options=HOSTS,
+                            options=hosts,
                             value="kohn",
                         ),
                     ],
@@ -78,7 +100,27 @@ def serve_layout():
         ),
         html.Div(id="show-path"),
         html.Button(id="submit-button", n_clicks=0, children="Submit"),
+        html.Button(id="bookmark-button", children="Toggle bookmark"),
         html.Div(id="show-filesize"),
+        html.Details(
+            [
+                html.Summary("Bookmarked files"),
+                html.Ul(id="bookmark-list", children=[]),
+            ]
+        ),
+        html.Details(
+            [
+                html.Summary("Search indexed files"),
+                dcc.Input(
+                    id="index-query",
+                    type="text",
+                    debounce=True,
+                    placeholder="colvar 24h /scratch/me",
+                    style={"width": "100%"},
+                ),
+                html.Ul(id="index-results", children=[]),
+            ]
+        ),
         html.Hr(),
         html.H3(children="Graph controls"),
         html.Div(
@@ -156,6 +198,48 @@ def serve_layout():
                                 )
                             ],
                         ),
+                        html.Label("Read part of file"),
+                        html.Div(
+                            [
+                                dcc.Dropdown(
+                                    id="read-mode",
+                                    options=[
+                                        {"label": "whole file", "value": "all"},
+                                        {"label": "last rows", "value": "rows"},
+                                        {"label": "last MB", "value": "mb"},
+                                        {
+                                            "label": "last time units",
+                                            "value": "time",
+                                        },
+                                    ],
+                                    value="all",
+                                    clearable=False,
+                                ),
+                                dcc.Input(
+                                    id="read-window",
+                                    type="number",
+                                    min=0,
+                                    placeholder="window size",
+                                    style={"width": "100%"},
+                                ),
+                                dcc.Input(
+                                    id="read-stride",
+                                    type="number",
+                                    min=1,
+                                    step=1,
+                                    placeholder="read every n-th row",
+                                    style={"width": "100%"},
+                                ),
+                                dcc.Input(
+                                    id="read-sample",
+                                    type="number",
+                                    min=0,
+                                    max=1,
+                                    placeholder="random fraction of rows",
+                                    style={"width": "100%"},
+                                ),
+                            ]
+                        ),
                         html.Button(
                             id="plot-button-state", n_clicks=0, children="Plot"
                         ),
@@ -187,7 +271,11 @@ def serve_layout():
         ),
         html.Hr(),
         html.P(
-            children=f"Currently available parsers are: " f"{', '.join(PARSERS.keys())}"
+            children=f"Currently available parsers are: " f"{', '.join(parsers.keys())}"
+        ),
+        html.P(
+            children=f"Session id: {session_id}",
+            style={"font-size": "small", "color": "grey"},
         ),
         html.Div(id="addressbar-sw", children=True, style={"display": "none"}),
     ]
@@ -219,7 +307,7 @@ def serve_layout():
                                             ),
                                         ]
                                     )
-                                    for name, desc in PARSERS.items()
+                                    for name, desc in parsers.items()
                                 ]
                             ),
                         ],
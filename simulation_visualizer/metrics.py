@@ -0,0 +1,194 @@
+"""Per request stage timing exported in prometheus text format.
+
+Stages (ssh connect, parser detection, transfer, parse, cache lookup, figure
+build, serialization) are recorded in histograms labeled by stage, parser
+and host. Callback duration and response size are labeled by callback name.
+
+The server runs in several processes so prometheus_client multiprocess mode
+is used. All processes of the server must write to the same directory,
+PROMETHEUS_MULTIPROC_DIR, by default MULTIPROC_DIR. The server start empties
+it by `reset_multiproc_dir` and gunicorn marks exited workers dead by
+`worker_exit`, see `gunicorn_conf`. When prometheus_client is not installed
+all metrics are no-ops.
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+from functools import wraps
+from getpass import getuser
+from pathlib import Path
+from tempfile import gettempdir
+from time import perf_counter
+from typing import Callable, Iterator, Tuple
+
+log = logging.getLogger(__name__)
+
+MULTIPROC_ENV = "PROMETHEUS_MULTIPROC_DIR"
+# shared by all processes of the server, not created per process
+MULTIPROC_DIR = Path(gettempdir()) / f"sim_visualizer_metrics_{getuser()}"
+
+# must be set before prometheus_client import
+os.environ.setdefault(MULTIPROC_ENV, str(MULTIPROC_DIR))
+os.makedirs(os.environ[MULTIPROC_ENV], exist_ok=True)
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry,
+                                   Counter, Histogram, generate_latest)
+    from prometheus_client.multiprocess import (MultiProcessCollector,
+                                                mark_process_dead)
+except ImportError:
+    log.warning("prometheus_client is not installed, metrics are disabled")
+    PROMETHEUS = False
+else:
+    PROMETHEUS = True
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+                60, 120, 300)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+
+class _NoMetric:
+    """Stand-in for prometheus metric when the library is not available."""
+
+    def labels(self, *args, **kwargs) -> "_NoMetric":
+        return self
+
+    def observe(self, value: float):
+        pass
+
+    def inc(self, value: float = 1):
+        pass
+
+
+if PROMETHEUS:
+    STAGE_SECONDS = Histogram(
+        "sim_visualizer_stage_seconds", "Duration of request stages",
+        ["stage", "parser", "host"], buckets=TIME_BUCKETS
+    )
+    CALLBACK_SECONDS = Histogram(
+        "sim_visualizer_callback_seconds", "Duration of dash callbacks",
+        ["callback"], buckets=TIME_BUCKETS
+    )
+    RESPONSE_BYTES = Histogram(
+        "sim_visualizer_response_bytes", "Size of callback responses",
+        ["callback"], buckets=SIZE_BUCKETS
+    )
+    TRANSFER_BYTES = Counter(
+        "sim_visualizer_transfer_bytes", "Bytes transferred from hosts",
+        ["parser", "host"]
+    )
+    CACHE_REQUESTS = Counter(
+        "sim_visualizer_cache_requests", "Dataframe cache lookups",
+        ["result"]
+    )
+else:
+    STAGE_SECONDS = CALLBACK_SECONDS = RESPONSE_BYTES = _NoMetric()
+    TRANSFER_BYTES = CACHE_REQUESTS = _NoMetric()
+
+
+@contextmanager
+def stage(name: str, parser: str = "", host: str = "") -> Iterator[None]:
+    """Time one stage of request processing.
+
+    Parameters
+    ----------
+    name: str
+        stage name e.g. ssh_connect, parse, figure_build
+    parser: str
+        name of the parser involved, if any
+    host: str
+        name of the host involved, if any
+    """
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name, parser, host).observe(perf_counter() - t0)
+
+
+def count_transfer(nbytes: int, parser: str = "", host: str = ""):
+    """Record bytes transferred from remote host."""
+    TRANSFER_BYTES.labels(parser, host).inc(nbytes)
+
+
+def count_cache(hit: bool):
+    """Record dataframe cache hit or miss."""
+    CACHE_REQUESTS.labels("hit" if hit else "miss").inc()
+
+
+def instrument_callback(func: Callable) -> Callable:
+    """Time dash callback and mark its end so serialization can be timed.
+
+    Must be applied below the dash callback decorator.
+    """
+    from flask import g
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.callback_name = func.__name__
+        t0 = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            g.callback_end = perf_counter()
+            CALLBACK_SECONDS.labels(func.__name__).observe(
+                g.callback_end - t0
+            )
+
+    return wrapper
+
+
+def _after_request(response):
+    """Record serialization time and response size of callback requests."""
+    from flask import g
+
+    name = g.pop("callback_name", None)
+    if name:
+        STAGE_SECONDS.labels("serialization", "", "").observe(
+            perf_counter() - g.pop("callback_end")
+        )
+        RESPONSE_BYTES.labels(name).observe(
+            response.content_length or len(response.get_data())
+        )
+    return response
+
+
+def metrics_view() -> Tuple[bytes, int, dict]:
+    """Flask view returning metrics of all server processes."""
+    if not PROMETHEUS:
+        return b"prometheus_client is not installed", 501, {}
+
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+
+
+def reset_multiproc_dir():
+    """Remove metrics of previous server runs.
+
+    Must be called once when the server starts, before its worker processes
+    record anything.
+    """
+    for db in Path(os.environ[MULTIPROC_ENV]).glob("*.db"):
+        db.unlink()
+
+
+def worker_exit(pid: int):
+    """Mark exited worker process dead, its live metrics are dropped."""
+    if PROMETHEUS:
+        mark_process_dead(pid)
+
+
+def init_app(server, protect: Callable[[Callable], Callable] = lambda f: f):
+    """Register /metrics endpoint and response hooks on flask server.
+
+    Parameters
+    ----------
+    server: flask.Flask
+        flask server
+    protect: Callable
+        decorator protecting the view e.g. with authentication
+    """
+    server.after_request(_after_request)
+    server.add_url_rule("/metrics", "metrics", protect(metrics_view))
@@ -1,13 +1,18 @@
 import abc
 import concurrent.futures as cf
 import logging
+import re
 from contextlib import contextmanager
+from contextvars import copy_context
+from fnmatch import fnmatch
+from io import StringIO
+from itertools import chain, islice
 from pathlib import Path
-from socket import gethostname
+from random import Random
 from tempfile import TemporaryDirectory
-from typing import IO, TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+from typing import (IO, TYPE_CHECKING, Any, Dict, Iterable, Iterator, List,
+                    Optional, Tuple, Union)
 
-from ssh_utilities import Connection
 from typing_extensions import Literal
 
 try:
@@ -15,8 +20,11 @@ try:
 except ImportError:
     from typing_extensions import final, TypedDict
 
+from .metrics import count_transfer, stage
 from .parsers import load_parsers
-from .utils import timeit
+from .profiling import profiled
+from .transfer import PARALLEL_MIN_BYTES, ParallelDownload, sftp_factory
+from .utils import is_local, open_mapped, open_text, ranged_file, timeit
 
 if TYPE_CHECKING:
     from re import Pattern
@@ -31,7 +39,16 @@ if TYPE_CHECKING:
 
 log = logging.getLogger(__name__)
 
-MAX_PARSE_ATTEMPTS: int = 5
+# failed ranges of parallel transfers are retried on their own, so whole
+# file is read again only a few times
+MAX_PARSE_ATTEMPTS: int = 2
+# random row sampling is seeded so the same file always gives the same rows
+SAMPLE_SEED: int = 0
+# default number of rows in one chunk yielded by `iter_chunks`
+CHUNK_ROWS: int = 100000
+# data lines start with a number, anything else is header or message
+NUMERIC_LINE = re.compile(r"\s*[-+.]?\d")
+
 
 class ParserMount(type):
     """Registers new Parsers."""
@@ -71,7 +88,22 @@ class FileParser(metaclass=ParserMount):
 
     name: str = "GENERIC"
     description: str = "Generic parser Class"
+    # shell patterns of names the parsed files usually have, used to decide
+    # which files are worth prefetching, not to select the parser
+    filenames: Tuple[str, ...] = ()
     header: "Pattern"
+    # dtypes of data columns by label or position, the rest is float64,
+    # parse engines use them instead of inferring types
+    dtypes: Dict[Union[int, str], str] = {}
+    # preferred parse engine, see `engines` module
+    engine: Optional[str] = None
+    # where data lines are for the remote aggregation agent: regular
+    # expression of line after which they start (None for file start),
+    # number of lines skipped after it and prefix of line that ends them,
+    # lines not starting with a number are skipped, files of parsers
+    # without layout are always transferred and the bookmark watcher parses
+    # them whole on every change
+    agent_layout: Optional[Tuple[Optional[str], int, Optional[str]]] = None
     parsers: List["FileParser"]
     session_id: str
 
@@ -81,32 +113,65 @@ class FileParser(metaclass=ParserMount):
     def _file_opener(cls, host, path, fileobj: Optional[IO] = None,
                      copy_method: bool = False) -> IO:
 
-        local = True if host == gethostname().lower() else False
-
         if fileobj:
             log.debug("using passed in file object")
             try:
                 yield fileobj
             finally:
                 pass
+        elif is_local(host):
+            # local files (e.g. NFS/Lustre mounts) are parsed straight from
+            # the memory map, no connection or temporary copy is needed
+            log.debug("opening memory mapped local file")
+            with open_mapped(path) as fileobj:
+                yield fileobj
         else:
+            from ssh_utilities import Connection
+
+            with stage("ssh_connect", cls.name, host):
+                conn = Connection(host, local=False, quiet=True)
+
             if copy_method:
-                with Connection(host, local=local, quiet=True) as c:
+                with conn as c:
                     with TemporaryDirectory() as td:
-                        c.shutil.copy(path, td, direction="get")
-                        with (Path(td) / Path(path).name).open("r") as fileobj:
+                        local_path = Path(td) / Path(path).name
+                        size = c.sftp.stat(path).st_size
+                        if size >= PARALLEL_MIN_BYTES:
+                            # parsing starts as soon as the first range of
+                            # the file arrives
+                            log.debug("opening parallel download")
+                            raw = ParallelDownload(sftp_factory(c.sftp), path,
+                                                   size, str(local_path))
+                            try:
+                                with stage("transfer", cls.name, host), \
+                                        open_text(raw) as fileobj:
+                                    yield fileobj
+                            finally:
+                                raw.close()
+                                count_transfer(raw.fetched, cls.name, host)
+                            return
+
+                        with stage("transfer", cls.name, host):
+                            c.shutil.copy(path, td, direction="get")
+                        count_transfer(local_path.stat().st_size, cls.name,
+                                       host)
+                        # compressed files are decompressed while read
+                        with open_mapped(str(local_path)) as fileobj:
                             try:
                                 yield fileobj
                             finally:
                                 pass
             else:
-                log.debug("opening new file object")
-                with Connection(host, local=local, quiet=True) as c:
-                    with c.builtins.open(path, "r") as fileobj:
-                        try:
-                            yield fileobj
-                        finally:
-                            pass
+                # header reads fetch only as much of the file as they need
+                log.debug("opening new ranged file object")
+                with conn as c:
+                    with c.sftp.open(path, "rb") as remote:
+                        raw = ranged_file(remote)
+                        with open_text(raw) as fileobj:
+                            try:
+                                yield fileobj
+                            finally:
+                                count_transfer(raw.fetched, cls.name, host)
 
     @final
     @classmethod
@@ -114,11 +179,13 @@ class FileParser(metaclass=ParserMount):
         cls.session_id = session_id
 
     @classmethod
-    def can_handle(cls, path: str, host: str) -> bool:
+    def can_handle(cls, path: str, host: str, fileobj: Optional[IO] = None
+                   ) -> bool:
         """Check whether this Parser can extract file.
 
         Now it is based solely on file header, override in subclass to define
-        your own behaviour.
+        your own behaviour. If fileobj is passed in, it holds the beginning
+        of the file and must be used instead of opening the file.
 
         Warnings
         --------
@@ -128,7 +195,7 @@ class FileParser(metaclass=ParserMount):
         long for load
         """
 
-        with cls._file_opener(host, path) as f:
+        with cls._file_opener(host, path, fileobj) as f:
             line = f.readline()
 
             if cls.header.match(line):
@@ -140,6 +207,47 @@ class FileParser(metaclass=ParserMount):
                             f"{Path(path).name} file type")
                 return False
 
+    @staticmethod
+    def _sample_lines(lines: Iterable[str], stride: int = 1,
+                      sample: float = 1.0, keep: int = 0) -> Iterable[str]:
+        """Keep only every stride-th line and random fraction of them.
+
+        Lines are dropped before they are tokenized, so skimming a file with
+        stride 100 costs little more than reading through it.
+
+        Parameters
+        ----------
+        lines: Iterable[str]
+            lines of the file, e.g. the file object itself
+        stride: int
+            keep every stride-th line
+        sample: float
+            fraction of lines randomly kept of those left by stride
+        keep: int
+            number of first lines that are always kept, e.g. header
+        """
+        lines = iter(lines)
+        head = list(islice(lines, keep))
+        if stride > 1:
+            lines = islice(lines, 0, None, stride)
+        if sample < 1:
+            rng = Random(SAMPLE_SEED)
+            lines = (line for line in lines if rng.random() < sample)
+        return chain(head, lines)
+
+    @classmethod
+    def _thinned(cls, lines: Union[IO, Iterable[str]], stride: int = 1,
+                 sample: float = 1.0, keep: int = 1
+                 ) -> Union[IO, Iterable[str]]:
+        """File object with only the sampled lines for pandas readers.
+
+        Returns the lines themselves if all of them should be read.
+        """
+        if stride <= 1 and sample >= 1:
+            return lines
+        return StringIO("".join(cls._sample_lines(lines, stride, sample,
+                                                  keep)))
+
     @staticmethod
     def _suggest_axis() -> "SUGGEST":
         """Get default data column index for each axis.
@@ -161,15 +269,163 @@ class FileParser(metaclass=ParserMount):
         raise NotImplementedError
 
     @abc.abstractclassmethod
-    def extract_data(cls, path: str, host: str,
-                     fileobj: Optional[IO] = None) -> "DataFrame":
-        """Return a pandas dataframe for parsed file."""
+    def extract_data(cls, path: str, host: str, fileobj: Optional[IO] = None,
+                     stride: int = 1, sample: float = 1.0) -> "DataFrame":
+        """Return a pandas dataframe for parsed file.
+
+        If stride is more than 1 only every stride-th data row is read, if
+        sample is less than 1 only this random fraction of rows is read.
+        Rows should be dropped before they are tokenized, see `_thinned`
+        and `_sample_lines`. Parsers that do not support it
+        may omit these arguments, they are passed only when used. Parsers of
+        whitespace separated tables only return `_extract_table`.
+        """
         raise NotImplementedError
 
+    @classmethod
+    def _column_dtypes(cls, names: List[str]) -> Dict[str, str]:
+        """Resolve declared dtypes to column labels."""
+        dtypes = {}
+        for column, dtype in cls.dtypes.items():
+            if isinstance(column, int):
+                if -len(names) <= column < len(names):
+                    dtypes[names[column]] = dtype
+            elif column in names:
+                dtypes[column] = dtype
+        return dtypes
+
+    @classmethod
+    def _read_table(cls, source: Union[IO, Iterable[str]], names: List[str],
+                    usecols: Optional[int] = None) -> "DataFrame":
+        """Parse data lines with the configured engine and declared dtypes."""
+        from simulation_visualizer.engines import read_table
+
+        return read_table(source, names, cls._column_dtypes(names),
+                          cls.engine, usecols)
+
+    @classmethod
+    def _read_chunks(cls, lines: Iterable[str], names: List[str],
+                     chunk_rows: int, usecols: Optional[int] = None
+                     ) -> Iterator["DataFrame"]:
+        """Parse data lines in blocks of chunk_rows with `_read_table`.
+
+        Index of each chunk continues from the previous one.
+        """
+        import pandas as pd
+
+        lines = iter(lines)
+        start = 0
+        while True:
+            block = list(islice(lines, chunk_rows))
+            if not block:
+                break
+
+            df = cls._read_table(block, names, usecols)
+            df.index = pd.RangeIndex(start, start + len(df))
+            yield df
+            start += len(df)
+
+    @classmethod
+    def _data_lines(cls, path: str, host: str, f: IO
+                    ) -> Tuple[List[str], Iterable[str]]:
+        """Read header from opened file and get the data lines after it.
+
+        Default reads header from the file start and returns the rest of
+        the file. Override in subclass if the data do not follow the header
+        right away.
+        """
+        return cls.extract_header(path, host, f)[0], f
+
+    @classmethod
+    def _extract_table(cls, path: str, host: str,
+                       fileobj: Optional[IO] = None, stride: int = 1,
+                       sample: float = 1.0) -> "DataFrame":
+        """`extract_data` of files with whitespace separated data table.
+
+        Lines found by `_data_lines` are thinned and read by `_read_table`.
+        """
+        with cls._file_opener(host, path, fileobj, copy_method=True) as f:
+            header, lines = cls._data_lines(path, host, f)
+            return cls._read_table(cls._thinned(lines, stride, sample, keep=0),
+                                   header)
+
+    @classmethod
+    def _iter_table(cls, path: str, host: str, chunk_rows: int = CHUNK_ROWS,
+                    fileobj: Optional[IO] = None, stride: int = 1,
+                    sample: float = 1.0) -> Iterator["DataFrame"]:
+        """`iter_chunks` counterpart of `_extract_table`."""
+        with cls._file_opener(host, path, fileobj, copy_method=True) as f:
+            header, lines = cls._data_lines(path, host, f)
+            yield from cls._read_chunks(
+                cls._sample_lines(lines, stride, sample), header, chunk_rows
+            )
+
+    @classmethod
+    def iter_chunks(cls, path: str, host: str, chunk_rows: int = CHUNK_ROWS,
+                    fileobj: Optional[IO] = None, stride: int = 1,
+                    sample: float = 1.0) -> Iterator["DataFrame"]:
+        """Parse file in chunks of at most chunk_rows rows.
+
+        Consumers that process the data in streaming fashion, e.g. export,
+        then never hold the whole parsed file in memory. Chunks have the
+        same columns as `extract_data` output and their index continues
+        from the previous chunk.
+
+        Default implementation slices the complete dataframe, override in
+        subclass with native chunked reading.
+        """
+        df = cls.extract_data(path, host, fileobj, stride=stride,
+                              sample=sample)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+    @classmethod
+    def parse_lines(cls, fileobj: IO, header: List[str]) -> "DataFrame":
+        """Parse data lines cut out of the file, e.g. a window at its end.
+
+        Result must have the same columns and dtypes as `extract_data`
+        output. Default implementation keeps lines that start with a number
+        and reads them as whitespace separated columns labeled by header.
+        Override in subclass if the data lines have different layout.
+
+        Parameters
+        ----------
+        fileobj: IO
+            text stream with data lines, header is not included
+        header: List[str]
+            column labels from `extract_header`
+        """
+        return cls._read_table(
+            [line for line in fileobj if NUMERIC_LINE.match(line)], header
+        )
+
     def __str__(self):
         return f"<Parser {self.name}>"
 
 
+def known_output_file(path: str) -> bool:
+    """Check if file name matches typical names of any parser's files."""
+    load_parsers()
+    name = Path(path).name
+    return any(fnmatch(name, pattern)
+               for parser in FileParser.parsers for pattern in parser.filenames)
+
+
+def find_parser(name: str) -> FileParser:
+    """Get parser class by its name.
+
+    Raises
+    ------
+    KeyError
+        if no parser of this name is loaded
+    """
+    load_parsers()
+    for parser in FileParser.parsers:
+        if parser.name == name:
+            return parser
+    raise KeyError(f"parser {name} is not available")
+
+
 class DataExtractor:
     """Class taking care of reading file from remote.
 
@@ -181,39 +437,126 @@ class DataExtractor:
         server name string
     session_id: str
         unique session id string for each user
+    parser: Optional[str]
+        name of parser already known to handle the file, e.g. from probe,
+        if passed only this parser is used and detection is skipped
+
+    Attributes
+    ----------
+    detected: Optional[str]
+        name of the parser that extracted the file
     """
 
     parsers: List[FileParser]
+    detected: Optional[str]
 
-    def __init__(self, path: str, host: str, session_id: str) -> None:
+    def __init__(self, path: str, host: str, session_id: str,
+                 parser: Optional[str] = None) -> None:
 
         load_parsers()
-        self.parsers = FileParser.parsers
+        self.parsers = [p for p in FileParser.parsers
+                        if parser is None or p.name == parser]
         log.debug(f"got parsers: {', '.join([str(p) for p in self.parsers])}")
 
         self._path = path
         self._host = host
         self._session_id = session_id
+        self._known = parser is not None and bool(self.parsers)
+        if not self.parsers:
+            log.warning(f"parser {parser} is not available, trying all")
+            self.parsers = FileParser.parsers
+        self.detected = None
+        self._kwargs: Dict[str, Any] = {}
+
+    def extract(self, stride: int = 1, sample: float = 1.0
+                ) -> Union["DataFrame", Exception]:
+        """Parse file, optionally only every stride-th or sampled rows."""
+        # old parsers need not accept the arguments if they are not used
+        self._kwargs = {}
+        if stride > 1:
+            self._kwargs["stride"] = stride
+        if sample < 1:
+            self._kwargs["sample"] = sample
 
-    def extract(self) -> Union["DataFrame", Exception]:
         with timeit("file read"):
             return self._get_async("data")
 
     def header(self) -> Union[Tuple[List[str], "SUGGEST"], Exception]:
         return self._get_async("header")
 
+    def iter_chunks(self, chunk_rows: int = CHUNK_ROWS, stride: int = 1,
+                    sample: float = 1.0) -> Iterator["DataFrame"]:
+        """Parse file in chunks with the first parser that can handle it.
+
+        Parsers are tried one after another, not concurrently as in
+        `extract`, as only one of them may stream the file.
+
+        Raises
+        ------
+        ValueError
+            if none of the parsers can handle the file
+        """
+        for parser in self.parsers:
+            if self._known or parser.can_handle(self._path, self._host):
+                break
+        else:
+            raise ValueError(f"None of the parsers recognized {self._path}")
+
+        self.detected = parser.name
+        parser.set_session_id(self._session_id)
+        with stage("parse", parser.name, self._host):
+            yield from parser.iter_chunks(self._path, self._host, chunk_rows,
+                                          stride=stride, sample=sample)
+
+    def header_from(self, head: str
+                    ) -> Union[Tuple[List[str], "SUGGEST"], Exception]:
+        """Detect parser and extract header from already read file start.
+
+        Parsers are tried one by one on in-memory copy, so no connection is
+        opened.
+
+        Parameters
+        ----------
+        head: str
+            beginning of the file, e.g. from `utils.probe_file`
+        """
+        error = ValueError(f"None of the parsers recognized {self._path}")
+        for parser in self.parsers:
+            try:
+                if not (self._known or parser.can_handle(
+                        self._path, self._host, StringIO(head))):
+                    continue
+                with profiled(self._session_id,
+                              f"{parser.__name__}.extract_header"):
+                    header = parser.extract_header(self._path, self._host,
+                                                   StringIO(head))
+            except Exception as e:
+                # parsers overriding can_handle may not accept file object
+                log.debug(f"{parser} could not read header from file start: "
+                          f"{e}")
+                error = e
+            else:
+                self.detected = parser.name
+                return header
+
+        return error
+
     def _get_async(self, what: Literal["data", "header"]
                    ) -> Union["DataFrame", Tuple[List[str], "SUGGEST"],
                               Exception]:
 
         with cf.ThreadPoolExecutor(max_workers=len(self.parsers)) as executor:
             future_to_df = {
-                executor.submit(self._get_one, p, what): p for p in self.parsers
+                # each thread gets its own copy of the context, it carries
+                # the id of the profiled request
+                executor.submit(copy_context().run, self._get_one, p, what): p
+                for p in self.parsers
             }
             for future in cf.as_completed(future_to_df):
 
                 data, error = future.result()
                 if error is None:
+                    self.detected = future_to_df[future].name
                     executor.shutdown(wait=False)
                     return data
             else:
@@ -228,7 +571,13 @@ class DataExtractor:
 
         log.debug(f"trying {what} parser: {parser}")
 
-        if not parser.can_handle(self._path, self._host):
+        if self._known:
+            handles = True
+        else:
+            with stage("parser_detection", parser.name, self._host):
+                handles = parser.can_handle(self._path, self._host)
+
+        if not handles:
             return None, Exception
         else:
             parser.set_session_id(self._session_id)
@@ -237,11 +586,19 @@ class DataExtractor:
         for i in range(1, MAX_PARSE_ATTEMPTS + 1):
 
             try:
-                data = getattr(parser, f"extract_{what}", None)(self._path,
-                                                                self._host)
+                with stage("parse" if what == "data" else what, parser.name,
+                           self._host), \
+                        profiled(self._session_id,
+                                 f"{parser.__name__}.extract_{what}"):
+                    data = getattr(parser, f"extract_{what}", None)(
+                        self._path, self._host,
+                        **(self._kwargs if what == "data" else {})
+                    )
             except FileNotFoundError as e:
+                # reading again will not help
                 log.warning(e)
                 error = e
+                break
             except Exception as e:
                 log.exception(e)
                 error = e
@@ -249,7 +606,6 @@ class DataExtractor:
                 log.debug(f"{what} parsed successfully: {self._path} "
                           f"after {i} attempts")
                 return data, None
-        else:
-            log.warning(f"{what} parser {parser} "
-                        f"failed to extract {self._path}")
-            return None, error
+
+        log.warning(f"{what} parser {parser} failed to extract {self._path}")
+        return None, error
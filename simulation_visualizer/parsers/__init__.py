@@ -4,12 +4,51 @@ from pathlib import Path
 
 log = logging.getLogger(__name__)
 
+# plugins installed by other packages register under this entry point group
+ENTRY_POINT_GROUP = "simulation_visualizer.parsers"
+
+_loaded_mtime = None
+
+
+def _load_entry_points():
+
+    try:
+        from importlib.metadata import entry_points  # python >=3.8 version
+    except ImportError:
+        log.debug("importlib.metadata is not available, skipping entry points")
+        return
+
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        eps = eps.select(group=ENTRY_POINT_GROUP)
+    else:
+        eps = eps.get(ENTRY_POINT_GROUP, [])
+
+    for ep in eps:
+        try:
+            ep.load()
+        except ImportError as e:
+            log.warning(f"failed to load plugin entry point {ep.name}: {e}")
+
 
 def load_parsers():
+    """Import all parser plugins so they register with FileParser.
+
+    Plugins are discovered in this package directory and through
+    `simulation_visualizer.parsers` entry points. The discovery runs only once,
+    later calls just check if the package directory has changed so plugins
+    added to running server are still loaded on the fly.
+    """
+    global _loaded_mtime
+
+    plugin_dir = Path(__file__).parent
+    mtime = plugin_dir.stat().st_mtime
+    if mtime == _loaded_mtime:
+        return
 
     log.debug("loading parsers")
 
-    for module in Path(__file__).parent.glob("*"):
+    for module in plugin_dir.glob("*"):
         if module.stem == "__init__" or module.suffix not in (".py", ".pyc"):
             continue
 
@@ -20,7 +59,12 @@ def load_parsers():
                         f"not ready for production. Once ready, remove "
                         f"ImportError exception raise statement")
 
+    if _loaded_mtime is None:
+        _load_entry_points()
+
+    _loaded_mtime = mtime
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
-    load_parsers()
\ No newline at end of file
+    load_parsers()
@@ -1,15 +1,65 @@
+import io
+import mmap
 import re
-from typing import IO, TYPE_CHECKING, List, Optional, Tuple
+from contextlib import contextmanager
+from itertools import islice
+from typing import (IO, TYPE_CHECKING, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple, Union)
 
-import pandas as pd
-from simulation_visualizer.parser import FileParser
+from simulation_visualizer.parser import CHUNK_ROWS, NUMERIC_LINE, FileParser
 
 if TYPE_CHECKING:
+    from numpy import ndarray
+    from pandas import DataFrame
+
     from simulation_visualizer.parser import SUGGEST
 
+# step and the six deviation columns, per-atom forces follow when the
+# 'atomic' keyword is set
+DEVI_COLUMNS: int = 7
+# leading bytes of a line that surely hold the deviation columns, longer
+# lines are only scanned for the newline, never decoded or tokenized
+PREFIX_BYTES: int = 512
+
+_BUFFER = Union[mmap.mmap, bytes]
+
+
+@contextmanager
+def _mapped(f: IO) -> Iterator[Optional[_BUFFER]]:
+    """Memory map of the file behind text file object, if it has one."""
+    raw = getattr(getattr(f, "buffer", None), "raw", None)
+    if hasattr(raw, "mmap"):
+        # file opened through utils.open_mapped
+        yield raw.mmap
+        return
+
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        yield None
+    else:
+        with mm:
+            yield mm
+
+
+def _data_spans(buf: _BUFFER) -> Iterator[Tuple[int, int, bytes]]:
+    """Start, end and leading bytes of each data line, comments are skipped."""
+    size = len(buf)
+    start = 0
+    while start < size:
+        end = buf.find(b"\n", start)
+        if end < 0:
+            end = size
+        head = buf[start:min(end, start + PREFIX_BYTES)]
+        if head.strip() and not head.lstrip().startswith(b"#"):
+            yield start, end, head
+        start = end + 1
+
+
 class DeepMDModelDeviationParserV1(FileParser):
 
     name = "DeepMD-model_deviation-v1"
+    filenames = ("model_devi.out",)
     header = re.compile(
         r"#\s*step\s*max_devi_e\s*min_devi_e\s*avg_devi_e\s*max_devi_f\s*"
         r"min_devi_f\s*avg_devi_f", re.I
@@ -23,6 +73,9 @@ class DeepMDModelDeviationParserV1(FileParser):
         "acting on each atom, these are not read!. Works with DeepMD v1"
     )
 
+    dtypes = {0: "int64"}
+    agent_layout = (None, 0, None)
+
     @staticmethod
     def _suggest_axis() -> "SUGGEST":
         return {"x": [0], "y": [1, 3, 4, 6], "z": [-1]}
@@ -39,20 +92,171 @@ class DeepMDModelDeviationParserV1(FileParser):
             else:
                 raise ValueError("Unsupported header format")
 
+    @staticmethod
+    def _prefix_lines(buf: _BUFFER) -> Iterator[str]:
+        """Data lines cut after the deviation columns."""
+        for start, end, head in _data_spans(buf):
+            fields = head.split(None, DEVI_COLUMNS)
+            if len(fields) <= DEVI_COLUMNS and end - start > PREFIX_BYTES:
+                # unusually wide fields, the prefix was too short
+                fields = buf[start:end].split(None, DEVI_COLUMNS)
+            yield b" ".join(fields[:DEVI_COLUMNS]).decode() + "\n"
+
+    @staticmethod
+    def _cut_lines(lines: Iterable[str]) -> Iterator[str]:
+        """Text data lines cut after the deviation columns.
+
+        Per-atom columns are split off as one string, never tokenized.
+        """
+        for line in lines:
+            if NUMERIC_LINE.match(line):
+                fields = line.split(None, DEVI_COLUMNS)
+                yield " ".join(fields[:DEVI_COLUMNS]) + "\n"
+
     @classmethod
-    def extract_data(cls, path: str, host: str,
-                     fileobj: Optional[IO] = None) -> pd.DataFrame:
+    def _atomic_lines(cls, buf: Optional[_BUFFER], f: IO
+                      ) -> Optional[Iterator[str]]:
+        """Line prefixes if the file has per-atom columns, else None.
+
+        Mapped files are scanned for line prefixes. Streams that cannot be
+        mapped, e.g. parallel downloads or decompressed files, are cut line
+        by line, their first data line is peeked and the stream rewound.
+        """
+        if buf is not None:
+            span = next(_data_spans(buf), None)
+            first = span[2] if span else b""
+            lines = cls._prefix_lines(buf)
+        else:
+            try:
+                start = f.tell()
+                first = f.readline()
+                while first and not NUMERIC_LINE.match(first):
+                    first = f.readline()
+                f.seek(start)
+            except (OSError, io.UnsupportedOperation):
+                return None
+            lines = cls._cut_lines(f)
+
+        if len(first.split(None, DEVI_COLUMNS)) > DEVI_COLUMNS:
+            return lines
+        return None
+
+    @classmethod
+    def extract_data(cls, path: str, host: str, fileobj: Optional[IO] = None,
+                     stride: int = 1, sample: float = 1.0) -> "DataFrame":
 
         with cls._file_opener(host, path, fileobj, copy_method=True) as f:
 
             header = cls.extract_header(host, path, f)[0]
-            f.seek(0)
 
-            df = pd.read_table(f, sep=r"\s+", header=0, names=header,
-                               comment="#", usecols=range(7))
+            with _mapped(f) as buf:
+                lines = cls._atomic_lines(buf, f)
+                if lines is not None:
+                    # per-atom columns are never tokenized
+                    df = cls._read_table(
+                        cls._sample_lines(lines, stride, sample),
+                        header[:DEVI_COLUMNS]
+                    )
+                else:
+                    df = cls._read_table(
+                        cls._thinned(f, stride, sample, keep=0), header,
+                        usecols=DEVI_COLUMNS
+                    )
 
         return df
 
+    @classmethod
+    def parse_lines(cls, fileobj: IO, header: List[str]) -> "DataFrame":
+        # per-atom columns are cut off before tokenizing, as in extract_data
+        return cls._read_table(cls._cut_lines(fileobj), header[:DEVI_COLUMNS])
+
+    @classmethod
+    def iter_chunks(cls, path: str, host: str, chunk_rows: int = CHUNK_ROWS,
+                    fileobj: Optional[IO] = None, stride: int = 1,
+                    sample: float = 1.0) -> Iterator["DataFrame"]:
+
+        with cls._file_opener(host, path, fileobj, copy_method=True) as f:
+
+            header = cls.extract_header(host, path, f)[0]
+
+            with _mapped(f) as buf:
+                lines = cls._atomic_lines(buf, f)
+                if lines is None:
+                    yield from cls._read_chunks(
+                        cls._thinned(f, stride, sample, keep=0), header,
+                        chunk_rows, usecols=DEVI_COLUMNS
+                    )
+                else:
+                    yield from cls._read_chunks(
+                        cls._sample_lines(lines, stride, sample),
+                        header[:DEVI_COLUMNS], chunk_rows
+                    )
+
+    @classmethod
+    def extract_atomic(cls, path: str, host: str, frames: Sequence[int],
+                       fileobj: Optional[IO] = None) -> "ndarray":
+        """Read per-atom force components of selected frames only.
+
+        The file is memory mapped and only lines of the requested frames are
+        parsed, so a few frames can be inspected even in files with
+        thousands of atoms.
+
+        Parameters
+        ----------
+        path: str
+            path to file
+        host: str
+            server name
+        frames: Sequence[int]
+            row positions of the frames, as in index of `extract_data` output
+            read without stride and sampling
+        fileobj: Optional[IO]
+            already opened file
+
+        Returns
+        -------
+        ndarray
+            array of shape (len(frames), 3N) with force components, rows in
+            order of frames
+
+        Raises
+        ------
+        IndexError
+            if some frame is not in the file
+        """
+        import numpy as np
+
+        wanted = sorted(set(frames))
+        if wanted and wanted[0] < 0:
+            raise IndexError(f"frame {wanted[0]} is out of range")
+        rows = {}
+
+        with cls._file_opener(host, path, fileobj, copy_method=True) as f:
+            with _mapped(f) as buf:
+                if buf is not None:
+                    lines = _data_spans(buf)
+                else:
+                    # stream is read line by line, never held whole
+                    f.seek(0)
+                    lines = (line for line in f if NUMERIC_LINE.match(line))
+
+                position = 0
+                for frame in wanted:
+                    # frames are sorted so the file is scanned only once
+                    found = next(islice(lines, frame - position, None), None)
+                    if found is None:
+                        break
+                    position = frame + 1
+                    line = found if buf is None else buf[found[0]:found[1]]
+                    rows[frame] = np.array(line.split()[DEVI_COLUMNS:],
+                                           dtype=np.float64)
+
+        missing = [f for f in wanted if f not in rows]
+        if missing:
+            raise IndexError(f"frames {missing} are not in file {path}")
+
+        return np.stack([rows[f] for f in frames])
+
 
 class DeepMDModelDeviationParserV2(DeepMDModelDeviationParserV1):
 
@@ -1,16 +1,18 @@
 import re
-from typing import IO, TYPE_CHECKING, List, Optional, Tuple
+from typing import IO, TYPE_CHECKING, Iterator, List, Optional, Tuple
 
-import pandas as pd
-from simulation_visualizer.parser import FileParser
+from simulation_visualizer.parser import CHUNK_ROWS, FileParser
 
 if TYPE_CHECKING:
+    from pandas import DataFrame
+
     from simulation_visualizer.parser import SUGGEST
 
 
 class DeepMDTrainParserV1(FileParser):
 
     name = "DeepMD-lcurve-v1"
+    filenames = ("lcurve.out",)
     header = re.compile(
         r"#\s*batch\s*l2_tst\s*l2_trn\s*l2_e_tst\s*l2_e_trn\s*"
         r"l2_f_tst  l2_f_trn\s*l2_v_tst\s*l2_v_trn\s*lr", re.I
@@ -22,9 +24,12 @@ class DeepMDTrainParserV1(FileParser):
         "and virials for train and test set."
     )
 
+    dtypes = {0: "int64"}
+    agent_layout = (None, 0, None)
+
     @staticmethod
     def _suggest_axis() -> "SUGGEST":
-        return {"x": [0], "y": [2, 3 ,4, 5, 6, 7], "z": [-1]}
+        return {"x": [0], "y": [1, 2, 3, 4, 5, 6], "z": [-1]}
 
     @classmethod
     def extract_header(cls, path: str, host: str, fileobj: Optional[IO] = None
@@ -34,18 +39,23 @@ class DeepMDTrainParserV1(FileParser):
             line = f.readline()
 
             if cls.header.match(line):
-                return line.split(), cls._suggest_axis()
+                # comment sign is not a column label
+                return re.sub(r"#\s*", "", line).split(), cls._suggest_axis()
             else:
                 raise ValueError("Unsupported header format")
 
     @classmethod
-    def extract_data(cls, path: str, host: str,
-                     fileobj: Optional[IO] = None) -> pd.DataFrame:
+    def extract_data(cls, path: str, host: str, fileobj: Optional[IO] = None,
+                     stride: int = 1, sample: float = 1.0) -> "DataFrame":
+        # data lines follow the header line
+        return cls._extract_table(path, host, fileobj, stride, sample)
 
-        with cls._file_opener(host, path, fileobj, copy_method=True) as f:
-            df = pd.read_table(f, sep=r"\s+")
-
-        return df
+    @classmethod
+    def iter_chunks(cls, path: str, host: str, chunk_rows: int = CHUNK_ROWS,
+                    fileobj: Optional[IO] = None, stride: int = 1,
+                    sample: float = 1.0) -> Iterator["DataFrame"]:
+        return cls._iter_table(path, host, chunk_rows, fileobj, stride,
+                               sample)
 
 
 class DeepMDTrainParserV2(DeepMDTrainParserV1):
@@ -64,7 +74,7 @@ class DeepMDTrainParserV2(DeepMDTrainParserV1):
 
     @staticmethod
     def _suggest_axis() -> "SUGGEST":
-        return {"x": [0], "y": [2, 3 ,4, 5, 6, 7], "z": [-1]}
+        return {"x": [0], "y": [1, 2, 3, 4, 5, 6], "z": [-1]}
 
 
 if __name__ == "__main__":
@@ -4,9 +4,11 @@ raise ImportError("Module not yet ready for production")
 import re
 from typing import IO, TYPE_CHECKING, List, Optional, Tuple
 
-import pandas as pd
-
+# heavy libraries should be imported only inside the methods that need them
+# so they do not slow down app start, import them here only for type checking
 if TYPE_CHECKING:
+    from pandas import DataFrame
+
     from simulation_visualizer.parser import SUGGEST
 
 # add FileParser to path by manipulating sys path if you are not working
@@ -16,6 +18,10 @@ if TYPE_CHECKING:
 from simulation_visualizer.parser import FileParser
 
 
+# parsers can also live in a separate package, then register the module under
+# 'simulation_visualizer.parsers' entry point group in its setup.py:
+# entry_points={"simulation_visualizer.parsers": ["example = my_pkg.example"]}
+
 # all plugin parsers must be subclasses of FileParser and override its two
 # abstract methods, extract_header() and extract_data() overiding other
 # methods is optional
@@ -28,21 +34,35 @@ class ExampleParser(FileParser):
     # if this parser is suitable for suplied type of file
     header = re.compile(r"#!\s*FIELDS\s*", re.I)
 
+    # usual names of the files, suggestion server prefetches headers of files
+    # matching these shell patterns, optional
+    filenames = ("example.out",)
+
     # short description ofh the parser
     description = (
         "Here should be some consise description of the parser which will be "
         "displayed in webpage."
     )
 
+    # dtypes of columns by position or label, undeclared columns are
+    # float64, optional
+    dtypes = {0: "int64"}
+    # preferred parse engine: "pandas", "pyarrow" or "numpy", environment
+    # variable SIM_VISUALIZER_ENGINE takes precedence, optional
+    engine = None
+
     # Or you can always override can_handle method for this subclass and define
     # your own criteria, but the header method should suffice for most cases
     # and has the advantage of being fast, any criteria you define must be
     # unique and filter only the types of files this class is able to parse
     @classmethod
-    def can_handle(cls, path: str, host: str) -> bool:
+    def can_handle(cls, path: str, host: str, fileobj: Optional[IO] = None
+                   ) -> bool:
         # here should follow some of your custom criteria if you don't
         # want to use the header method defined in base
         # this should run as fast as possible, keep that in mind!
+        # when fileobj is passed it holds the file beginning, use it instead
+        # of opening the file
         return False
 
     # suggest which label should be preset for which axis. Does not have to be
@@ -83,20 +103,32 @@ class ExampleParser(FileParser):
     # You can even access all other available parsers through cls.parsers
     # attribute as this class inherits ParserMount metaclass!!!
     @classmethod
-    def extract_data(cls, path: str, host: str,
-                     fileobj: Optional[IO] = None) -> pd.DataFrame:
+    def extract_data(cls, path: str, host: str, fileobj: Optional[IO] = None,
+                     stride: int = 1, sample: float = 1.0) -> "DataFrame":
 
         # the copy method is significntly faster for larger files
         with cls._file_opener(host, path, fileobj, copy_method=True) as f:
 
             header = cls.extract_header(host, path, f)[0]
-            f.seek(0)
 
-            df = pd.read_table(f, sep=r"\s+", header=0, names=header,
-                               comment="#")
+            # _read_table parses the rest of the file with the configured
+            # engine (pandas, pyarrow or numpy) and dtypes declared below
+            df = cls._read_table(cls._thinned(f, stride, sample, keep=0),
+                                 header)
 
         return df
 
+    # files with whitespace separated table after the header can simply
+    # return cls._extract_table(path, host, fileobj, stride, sample), override
+    # _data_lines() if the table does not follow the header right away
+
+    # optionally override iter_chunks() to parse the file in chunks of rows,
+    # e.g. with pandas chunksize argument, so streaming consumers like csv
+    # export never hold the whole file in memory, the default implementation
+    # slices dataframe returned by extract_data(), for tables return
+    # cls._iter_table(path, host, chunk_rows, fileobj, stride, sample)
+
+
 # test your plugin before deployment
 if __name__ == "__main__":
 
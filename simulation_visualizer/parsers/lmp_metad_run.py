@@ -1,18 +1,19 @@
 import re
-import warnings
-from typing import IO, TYPE_CHECKING, List, Optional, Tuple
+from typing import (IO, TYPE_CHECKING, Iterable, Iterator, List, Optional,
+                    Tuple)
 
-import numpy as np
-import pandas as pd
-from simulation_visualizer.parser import FileParser
+from simulation_visualizer.parser import CHUNK_ROWS, NUMERIC_LINE, FileParser
 
 if TYPE_CHECKING:
+    from pandas import DataFrame
+
     from simulation_visualizer.parser import SUGGEST
 
 
 class LammpsMetaDParser(FileParser):
 
     name = "LAMMPS-MetaD"
+    filenames = ("log.lammps", "md.out")
     header = re.compile(r"LAMMPS\s*\(\S*\s*\S*\s*\S*\)")
     description = (
         "Extracts data from LAMMPS log file. This is not a fixes format and "
@@ -22,6 +23,9 @@ class LammpsMetaDParser(FileParser):
         "output of hte first one will be extracted. 'thermo_style' must be "
         "set to custom and 'thermo_modify' cannot be multiline."
     )
+    dtypes = {0: "int64"}
+    # thermo output of the first run, its header follows the memory line
+    agent_layout = ("Per MPI rank memory allocation", 1, "Loop time")
 
     @classmethod
     def extract_header(cls, path: str, host: str, fileobj: Optional[IO] = None
@@ -45,32 +49,50 @@ class LammpsMetaDParser(FileParser):
         return header, cls._suggest_axis()
 
     @classmethod
-    def extract_data(cls, path: str, host: str,
-                     fileobj: Optional[IO] = None) -> pd.DataFrame:
+    def _data_lines(cls, path: str, host: str, f: IO
+                    ) -> Tuple[List[str], Iterable[str]]:
+        """Read header and move file to the start of thermo output."""
+        header = cls.extract_header(path, host, f)[0]
+
+        # continue to search fro start of thermo output
+        for line in f:
+            if "Per MPI rank memory allocation" in line:
+                # now file iterator is set to start of thermo output
+                f.readline()
+                break
+        else:
+            raise ValueError(f"couldn't find start of thermo output "
+                             f"in lammps file: {path}")
+
+        return header, cls._thermo_lines(f)
 
-        with cls._file_opener(host, path, fileobj, copy_method=True) as f:
+    @classmethod
+    def _thermo_lines(cls, f: IO) -> Iterator[str]:
+        """Numeric thermo output lines of the first run."""
+        for line in f:
+            if line.startswith("Loop time"):
+                break
+            # skips warnings and other messages mixed in the thermo output
+            if NUMERIC_LINE.match(line):
+                yield line
 
-            header = cls.extract_header(host, path, f)[0]
+    @classmethod
+    def extract_data(cls, path: str, host: str, fileobj: Optional[IO] = None,
+                     stride: int = 1, sample: float = 1.0) -> "DataFrame":
+        return cls._extract_table(path, host, fileobj, stride, sample)
+
+    @classmethod
+    def parse_lines(cls, fileobj: IO, header: List[str]) -> "DataFrame":
+        # window at the file end might also hold the run summary
+        return cls._read_table(cls._thermo_lines(fileobj), header)
+
+    @classmethod
+    def iter_chunks(cls, path: str, host: str, chunk_rows: int = CHUNK_ROWS,
+                    fileobj: Optional[IO] = None, stride: int = 1,
+                    sample: float = 1.0) -> Iterator["DataFrame"]:
+        return cls._iter_table(path, host, chunk_rows, fileobj, stride,
+                               sample)
 
-            # continue to search fro start of thermo output
-            for line in f:
-                if "Per MPI rank memory allocation" in line:
-                    # now file iterator is set to start of thermo output
-                    f.readline()
-                    break
-            else:
-                raise ValueError(f"couldn't find start of thermo output "
-                                 f"in lammps file: {path}")
-
-            # load to numpy array
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                data = np.genfromtxt(f, comments="#", invalid_raise=False)
-                        
-            # convert to dataframe
-            df = pd.DataFrame(data=data, columns=header)
-
-        return df
 
 if __name__ == "__main__":
 
@@ -1,22 +1,25 @@
 import re
-from typing import IO, TYPE_CHECKING, List, Optional, Tuple
+from typing import IO, TYPE_CHECKING, Iterator, List, Optional, Tuple
 
-import pandas as pd
-from simulation_visualizer.parser import FileParser
+from simulation_visualizer.parser import CHUNK_ROWS, FileParser
 
 if TYPE_CHECKING:
+    from pandas import DataFrame
+
     from simulation_visualizer.parser import SUGGEST
 
 
 class PlumedMetaDParser(FileParser):
 
     name = "Plumed-COLVAR"
+    filenames = ("COLVAR*",)
     header = re.compile(r"#!\s*FIELDS\s*", re.I)
     description = (
         "Extracts data from PLUMED COLVAR file. The file is rather easy to "
         "parse. First column contains time and the successive ones contain "
         "user defined quantities. The headed labels the columns accordingly."
     )
+    agent_layout = (None, 0, None)
 
     @classmethod
     def extract_header(cls, path: str, host: str, fileobj: Optional[IO] = None
@@ -34,18 +37,17 @@ class PlumedMetaDParser(FileParser):
                 raise ValueError("Unsupported header format")
 
     @classmethod
-    def extract_data(cls, path: str, host: str,
-                     fileobj: Optional[IO] = None) -> pd.DataFrame:
-
-        with cls._file_opener(host, path, fileobj, copy_method=True) as f:
+    def extract_data(cls, path: str, host: str, fileobj: Optional[IO] = None,
+                     stride: int = 1, sample: float = 1.0) -> "DataFrame":
+        return cls._extract_table(path, host, fileobj, stride, sample)
 
-            header = cls.extract_header(host, path, f)[0]
-            f.seek(0)
-
-            df = pd.read_table(f, sep=r"\s+", header=0, names=header,
-                               comment="#")
+    @classmethod
+    def iter_chunks(cls, path: str, host: str, chunk_rows: int = CHUNK_ROWS,
+                    fileobj: Optional[IO] = None, stride: int = 1,
+                    sample: float = 1.0) -> Iterator["DataFrame"]:
+        return cls._iter_table(path, host, chunk_rows, fileobj, stride,
+                               sample)
 
-        return df
 
 if __name__ == "__main__":
 
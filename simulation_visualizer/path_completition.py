@@ -1,11 +1,19 @@
 import logging
-from socket import gethostname
-from typing import TYPE_CHECKING, Dict, List, Union
-
-from ssh_utilities import Connection
-
-from simulation_visualizer.suggestion_server.client import \
-    connect_to_suggestion_server
+import os
+import shlex
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import PurePosixPath
+from stat import S_ISDIR, S_ISLNK
+from time import monotonic
+from typing import (TYPE_CHECKING, Any, Dict, Iterator, List, Optional,
+                    Tuple, Union)
+
+from simulation_visualizer.suggestion_server.client import (
+    SocketClient, connect_to_suggestion_server, drop_client)
+from simulation_visualizer.utils import is_local
 
 if TYPE_CHECKING:
     from pathlib import Path
@@ -13,46 +21,345 @@ if TYPE_CHECKING:
     from ssh_utilities import LocalConnection, SSHConnection
     _CONN = Union[LocalConnection, SSHConnection]
 
+# path (directories end with slash), is directory, size, modification time
+_ENTRY = Tuple[str, bool, int, float]
+
 
 log = logging.getLogger(__name__)
 
+# maximum number of simultaneously open connections to one host
+POOL_SIZE: int = 4
+# directory listings older than this are fetched again
+LISTING_TTL: float = 10
+# maximum number of cached directory listings
+LISTING_CACHE_SIZE: int = 2000
+# lists directory with type, size and mtime of entries in one remote call,
+# symlinks are followed, entries are separated by null character
+LIST_COMMAND = ("find -L {path} -mindepth 1 -maxdepth 1 -printf "
+                "'%y\\t%s\\t%T@\\t%p\\0'")
+
+
+class ConnectionPool:
+    """Pool of connections to hosts shared by concurrently running threads.
+
+    Parameters
+    ----------
+    size: int
+        maximum number of connections to one host
+    """
+
+    def __init__(self, size: int = POOL_SIZE):
+        self._size = size
+        self._idle: Dict[str, List["_CONN"]] = defaultdict(list)
+        self._open: Dict[str, int] = defaultdict(int)
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def connection(self, host: str) -> Iterator["_CONN"]:
+        """Borrow connection to host, blocks when all are in use."""
+        host = host.lower()
+
+        with self._cond:
+            while not self._idle[host] and self._open[host] >= self._size:
+                self._cond.wait()
+            if self._idle[host]:
+                c = self._idle[host].pop()
+            else:
+                c = None
+                self._open[host] += 1
+
+        try:
+            if c is None:
+                from ssh_utilities import Connection
+
+                log.info(f"connecting to server {host}")
+                c = Connection(host, local=is_local(host), quiet=True)
+            yield c
+        except Exception:
+            # connection might be broken, do not return it to pool
+            self._discard(host, c)
+            raise
+        else:
+            with self._cond:
+                self._idle[host].append(c)
+                self._cond.notify()
+
+    def _discard(self, host: str, c: Optional["_CONN"]):
+        if c is not None:
+            try:
+                c.close()
+            except Exception as e:
+                log.debug(f"error closing connection to {host}: {e}")
+        with self._cond:
+            self._open[host] -= 1
+            self._cond.notify()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._cond:
+            for host, conns in self._idle.items():
+                for c in conns:
+                    c.close()
+                self._open[host] -= len(conns)
+                conns.clear()
+
+
+class ListingCache:
+    """Directory listings cache with time to live and LRU eviction.
+
+    Listing is a list of directory entries or None if the path is not a
+    directory. Concurrent requests for the same listing wait
+    for the first one instead of listing the directory again.
+
+    Parameters
+    ----------
+    ttl: float
+        listing time to live in seconds
+    size: int
+        maximum number of cached listings
+    """
+
+    def __init__(self, ttl: float = LISTING_TTL,
+                 size: int = LISTING_CACHE_SIZE):
+        self._ttl = ttl
+        self._size = size
+        # (host, path) -> (time of listing, listing)
+        self._items: OrderedDict = OrderedDict()
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str, path: str, list_dir) -> Optional[List[Any]]:
+        """Get cached listing or list the directory with `list_dir`."""
+        key = (host.lower(), path)
+
+        with self._lock:
+            item = self._items.get(key)
+            if item and monotonic() - item[0] < self._ttl:
+                self._items.move_to_end(key)
+                return item[1]
+
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            listing = list_dir(host, path)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(listing)
+            with self._lock:
+                self._items[key] = (monotonic(), listing)
+                self._items.move_to_end(key)
+                while len(self._items) > self._size:
+                    self._items.popitem(last=False)
+            return listing
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def has(self, host: str, path: str) -> bool:
+        """Check if fresh listing is cached."""
+        with self._lock:
+            item = self._items.get((host.lower(), path))
+        return bool(item) and monotonic() - item[0] < self._ttl
+
+    def invalidate(self, host: str, path: str = "/"):
+        """Drop cached listings of path and all its subdirectories."""
+        host = host.lower()
+        path = path.rstrip("/") or "/"
+        with self._lock:
+            for key in list(self._items):
+                h, p = key
+                if h == host and (p == path or p.startswith(
+                    path if path.endswith("/") else f"{path}/"
+                )):
+                    del self._items[key]
+
 
 class Completion:
-    """Class providing completions that are dependent on remote access."""
+    """Class providing completions that are dependent on remote access.
 
-    def __init__(self):
+    Connections and directory listings are shared by all threads using the
+    same instance so it can serve many clients at once.
+
+    Parameters
+    ----------
+    pool: Optional[ConnectionPool]
+        connection pool, new one is created if not passed
+    listings: Optional[ListingCache]
+        directory listings cache, new one is created if not passed
+    """
+
+    def __init__(self, pool: Optional[ConnectionPool] = None,
+                 listings: Optional[ListingCache] = None):
 
         log.debug("initalized completion class")
 
-        self._c = None
+        self._pool = pool if pool else ConnectionPool()
+        self._listings = listings if listings else ListingCache()
+
+    @staticmethod
+    def _entry(path: str, is_dir: bool, size: int, mtime: float) -> "_ENTRY":
+        return (f"{path.rstrip('/')}/" if is_dir else path, is_dir, size, mtime)
+
+    def _list_local(self, path: str) -> Optional[List["_ENTRY"]]:
+
+        entries = []
+        try:
+            with os.scandir(path) as it:
+                for e in it:
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        # broken symlink
+                        st = e.stat(follow_symlinks=False)
+                    entries.append(self._entry(e.path, S_ISDIR(st.st_mode),
+                                               st.st_size, st.st_mtime))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return None
+
+        return entries
+
+    def _list_remote(self, c: "_CONN", path: str) -> Optional[List["_ENTRY"]]:
+
+        # one round trip for the whole directory
+        result = c.subprocess.run(
+            LIST_COMMAND.format(path=shlex.quote(path)), suppress_out=True,
+            quiet=True, capture_output=True, encoding="utf-8"
+        )
+        if result.returncode == 0:
+            entries = []
+            for line in result.stdout.split("\0"):
+                if line:
+                    kind, size, mtime, p = line.split("\t", 3)
+                    entries.append(self._entry(p, kind == "d", int(size),
+                                               float(mtime)))
+            return entries
+
+        # find without -printf or inaccessible path, sftp returns attributes
+        # of all entries in one call too, only symlinks need extra stat
+        log.debug(f"find failed: {result.stderr.strip()}, trying sftp")
+        try:
+            attrs = c.sftp.listdir_attr(path)
+        except OSError:
+            return None
+
+        entries = []
+        for a in attrs:
+            p = f"{path.rstrip('/')}/{a.filename}"
+            if S_ISLNK(a.st_mode):
+                try:
+                    a = c.sftp.stat(p)
+                except OSError:
+                    pass
+            entries.append(self._entry(p, S_ISDIR(a.st_mode), a.st_size,
+                                       a.st_mtime))
+        return entries
+
+    def _list_dir(self, host: str, path: str) -> Optional[List["_ENTRY"]]:
+
+        log.debug(f"listing {host}@{path}")
+        if is_local(host):
+            entries = self._list_local(path)
+        else:
+            with self._pool.connection(host) as c:
+                entries = self._list_remote(c, path)
 
-    def c(self, host: str) -> "_CONN":
-        """Holds ssh connection object.
+        return sorted(entries) if entries is not None else None
+
+    def list_dir(self, host: str, path: str) -> Optional[List["_ENTRY"]]:
+        """List directory, served from cache when possible.
 
         Parameters
         ----------
-        host : str
-            server name
+        host: str
+            host name
+        path: str
+            directory path
 
         Returns
         -------
-        Connection
-            initialized SSHConnection object
+        Optional[List[Tuple[str, bool, int, float]]]
+            sorted directory entries - path (directories end with slash),
+            is directory, size and modification time, None if path is not
+            a directory
         """
-        local = True if host == gethostname().lower() else False
-        log.debug(f"local: {local}, hostname: {gethostname()}")
-        # open connection to host
-        if not self._c:
-            log.info(f"connecting to server {host}")
-            self._c = Connection(host.lower(), local=local, quiet=True)
-        # if host changed establish new connection
-        elif self._c.server_name != host.upper():
-            log.info(f"changing connection from server: {self._c.server_name} "
-                     f"to {host.upper()}")
-            self._c.close()
-            self._c = Connection(host.lower(), local=local, quiet=True)
-
-        return self._c
+        return self._listings.get(host, path, self._list_dir)
+
+    def invalidate(self, host: str, input_path: str = "/"):
+        """Forget cached listings of path and its subdirectories."""
+        self._listings.invalidate(host, input_path)
+
+    def close(self):
+        """Close pooled connections."""
+        self._pool.close()
+
+    def is_cached(self, host: str, input_path: str) -> bool:
+        """Check if completion of input path can be served from cache."""
+        input_path = input_path.strip()
+        if not input_path:
+            return True
+
+        path = PurePosixPath(input_path)
+        return self._listings.has(
+            host, str(path if input_path.endswith("/") else path.parent)
+        )
+
+    def get_entries(self, host: str, input_path: str) -> List["_ENTRY"]:
+        """Suggest dirs and files with their size and modification time.
+
+        Parameters
+        ----------
+        host: str
+            host name
+        input_path : str
+            partialy completed path
+
+        Returns
+        -------
+        List[Tuple[str, bool, int, float]]
+            possible paths based on alredy parsed input, see `list_dir`
+        """
+        input_path = input_path.strip()
+
+        if not input_path:
+            return [("/home/", True, 0, 0.0)]
+
+        # decide from the cached listing of parent, so typing in one
+        # directory does not need any remote access
+        path = PurePosixPath(input_path)
+        if not input_path.endswith("/"):
+            siblings = self.list_dir(host, str(path.parent))
+            entries = {e[0]: e for e in siblings or []}
+            if str(path) in entries:
+                log.debug(f"path is file, returning ...")
+                return [entries[str(path)]]
+            elif f"{path}/" not in entries:
+                if siblings is not None:
+                    # user is typing a name in the same directory
+                    return [e for e in siblings if e[0].startswith(str(path))]
+                path = path.parent
+
+        while True:
+            log.debug(f"checking path: {path}")
+            entries = self.list_dir(host, str(path))
+            if entries is not None:
+                break
+            elif path == path.parent:
+                log.warning("got to the bottom of directory tree")
+                entries = []
+                break
+            else:
+                path = path.parent
+                log.debug(f"got path parent: {path}")
+
+        return entries
 
     def get_dirs(self, host: str, input_path: str) -> List[str]:
         """Suggest dirs on remote server to submit to.
@@ -63,53 +370,54 @@ class Completion:
             host name
         input_path : str
             partialy completed path
-        kwargs: dict
-            dictionary of autocompleter arguments
 
         Returns
         -------
         List[str]
             sequence of possible directories based on alredy parsed input
         """
-        input_path = input_path.strip()
+        return [e[0] for e in self.get_entries(host, input_path)]
 
-        if not input_path:
-            return ["/home/"]
 
-        path = self.c(host).pathlib.Path(input_path)
-        log.debug(f"got base path: {path}")
+_serverless: Optional[Completion] = None
 
-        if path.is_file():
-            log.debug(f"path is file, returning ...")
-            return [str(path)]
 
-        while True:
+def serverless_completion() -> Completion:
+    """Completion instance of this process used when server is unavailable."""
+    global _serverless
+
+    if _serverless is None:
+        _serverless = Completion()
+    return _serverless
 
-            log.debug(f"checking path: {path}, is dir: {path.is_dir()}")
-            if path.is_dir():
-                dirs_files = [d for d in self.c(host).pathlib.Path(path).glob("*")]
-                log.debug(f"got dir contents: {dirs_files}")
-                break
-            else:
-                parent = path.parent
-                if path == parent:
-                    log.warning("got to the bottom of directory tree")
-                    dirs_files = [d for d in parent.glob("*")]
-                    break
-                else:
-                    path = parent
-                    log.debug(f"got path parent: {path}")
-
-        log.debug("filtering dirs and files")
-        paths = []
-        for d in dirs_files:
-            if d.is_dir():
-                paths.append(f"{d}/")
-            else:
-                paths.append(str(d))
 
-        log.debug("sorting and returning")
-        return sorted(paths)
+def invalidate_listings(host: str, path: str, unique_socket_address: "Path"):
+    """Forget cached listings of path in suggestion server and this process.
+
+    Server is not started just to drop its cache, if it is not running it
+    has nothing cached.
+
+    Parameters
+    ----------
+    host : str
+        name of the host server
+    path : str
+        directory whose listing and listings of its subdirectories are dropped
+    unique_socket_address: str
+        suggestion server socket address
+    """
+    serverless_completion().invalidate(host, path)
+
+    try:
+        client = SocketClient(str(unique_socket_address))
+    except OSError:
+        return
+    try:
+        client.request("invalidate", host=host, input_path=path)
+    except OSError as e:
+        log.warning(f"could not invalidate listings of {host}@{path}: {e}")
+    finally:
+        client.close()
 
 
 class Suggest:
@@ -126,8 +434,8 @@ class Suggest:
     def __init__(self, function_name: str):
         self.function = function_name
 
-    def __call__(self, host: str, filename: str, unique_socket_address: "Path"
-                 ) -> List[str]:
+    def __call__(self, host: str, filename: str, unique_socket_address: "Path",
+                 session_id: str = "") -> Any:
         """Proxy for autocompleter methods.
 
         Parameters
@@ -138,12 +446,16 @@ class Suggest:
             parsed part of the path being currently completed
         unique_socket_address: str
             server <-> client communication socket address, location must be
-            writable. Each user must have his own server
+            writable. The server is shared by all sessions
+        session_id: str
+            unique user session id, each session keeps its own persistent
+            connection to the server
 
         Returns
         -------
-        List[str]
-            [description]
+        Any
+            output of the requested Completion method, None if the request
+            was superseded by newer request of the same session
         """
         kwargs: Dict[str, str] = {}
         kwargs["host"] = host
@@ -152,29 +464,29 @@ class Suggest:
         log.debug(f"built autocomplete function arguments: {kwargs}")
         log.debug(f"requesting function: {self.function}")
 
-        # first try to get the answer from suggestion server
-        try:
-            client = connect_to_suggestion_server(
-                log_level=logging.DEBUG,
-                unique_socket_address=unique_socket_address
-            )
-        except TimeoutError:
-            log.debug("switching to serverless suggestion engine")
-            return getattr(Completion(), self.function, None)(**kwargs)
-        else:
+        # first try to get the answer from suggestion server, persistent
+        # connection might have been closed by server in the meantime so
+        # try once more with new one
+        for _ in range(2):
             try:
-                # raise OSError
-                client.write((self.function, kwargs))
-                result = client.read()
-
+                client = connect_to_suggestion_server(
+                    log_level=logging.DEBUG,
+                    unique_socket_address=unique_socket_address,
+                    session_id=session_id
+                )
+                return client.request(self.function, session_id, **kwargs)
+            except TimeoutError:
+                drop_client(unique_socket_address, session_id)
+                break
+            except ConnectionError as e:
+                log.debug(f"connection to suggestion server broken: {e}")
+                drop_client(unique_socket_address, session_id)
             # if suggestion server method fails, revert to direct mode
             except OSError as e:
                 log.warning(f"encountered exception when retrieving "
                             f"data from server {e}")
+                drop_client(unique_socket_address, session_id)
+                break
 
-                log.debug("switching to serverless suggestion engine")
-                result = getattr(Completion(), self.function, None)(**kwargs)
-            else:
-                client.close()
-            finally:
-                return result
+        log.debug("switching to serverless suggestion engine")
+        return getattr(serverless_completion(), self.function)(**kwargs)
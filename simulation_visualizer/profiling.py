@@ -0,0 +1,249 @@
+"""On-demand profiling of dash callbacks and parsers.
+
+Admin can switch profiling on for one user session, either for all its
+requests or only for the next one. Profiled code runs under cProfile and
+tracemalloc, the stats and top memory allocations are saved to files named
+by request id and can be downloaded from the admin page.
+
+The switch is stored in a file so it is seen by all server processes. Id of
+the request being profiled is kept in a context variable, parsers running in
+worker threads must be submitted with a copy of the caller's context.
+"""
+
+import cProfile
+import html
+import io
+import json
+import logging
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+from uuid import uuid4
+
+from simulation_visualizer.utils import get_admins
+
+log = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(__file__).parent / "data" / "profiles"
+_ENABLED_DIR = PROFILE_DIR / "enabled"
+TOP_ALLOCATIONS: int = 30
+TOP_FUNCTIONS: int = 50
+SESSION_INPUT = "session-id.children"
+# id shared by all profiles saved while serving one request
+_REQUEST_ID: ContextVar[Optional[str]] = ContextVar("profiling_request_id",
+                                                    default=None)
+
+
+def enable(session_id: str, mode: str = "session"):
+    """Switch profiling on for session.
+
+    Parameters
+    ----------
+    session_id: str
+        unique user session id
+    mode: str
+        'session' profiles all requests, 'request' only the next one
+    """
+    if mode not in ("session", "request"):
+        raise ValueError(f"unknown profiling mode: {mode}")
+
+    _ENABLED_DIR.mkdir(parents=True, exist_ok=True)
+    (_ENABLED_DIR / Path(session_id).name).write_text(
+        json.dumps({"mode": mode})
+    )
+    log.info(f"profiling of session {session_id} enabled, mode: {mode}")
+
+
+def disable(session_id: str):
+    """Switch profiling off for session."""
+    try:
+        (_ENABLED_DIR / Path(session_id).name).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _config(session_id: Optional[str]) -> Optional[dict]:
+
+    if not session_id:
+        return None
+    try:
+        return json.loads((_ENABLED_DIR / Path(session_id).name).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _save(request_id: str, label: str, profiler: cProfile.Profile,
+          snapshot: Optional[tracemalloc.Snapshot]):
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"{request_id}-{label}"
+
+    profiler.dump_stats(str(PROFILE_DIR / f"{name}.prof"))
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    if snapshot:
+        stream.write(f"\nTop {TOP_ALLOCATIONS} memory allocations\n\n")
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            stream.write(f"{stat}\n")
+
+    (PROFILE_DIR / f"{name}.txt").write_text(stream.getvalue())
+    log.info(f"saved profile {name}")
+
+
+@contextmanager
+def profiled(session_id: Optional[str], label: str) -> Iterator[None]:
+    """Profile enclosed code if profiling is enabled for the session.
+
+    cProfile only sees the calling thread, so code running in worker threads
+    must be wrapped separately.
+    """
+    config = _config(session_id)
+
+    if not config:
+        yield
+        return
+
+    request_id = _REQUEST_ID.get() or uuid4().hex[:12]
+
+    # tracemalloc is process wide, leave it running if someone else started
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        # tracing might have been stopped by the caller in the meantime
+        snapshot = tracemalloc.take_snapshot() \
+            if tracemalloc.is_tracing() else None
+        if started:
+            tracemalloc.stop()
+        _save(request_id, label, profiler, snapshot)
+
+
+def profile_callback(func: Callable) -> Callable:
+    """Profile dash callback when enabled for the session triggering it.
+
+    Session id is taken from the callback inputs. Must be applied below the
+    dash callback decorator.
+    """
+    import dash
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        session_id = dash.callback_context.inputs.get(SESSION_INPUT)
+        config = _config(session_id)
+
+        if not config:
+            return func(*args, **kwargs)
+
+        # parsers running in threads of this request share its request id
+        token = _REQUEST_ID.set(uuid4().hex[:12])
+        try:
+            with profiled(session_id, func.__name__):
+                return func(*args, **kwargs)
+        finally:
+            _REQUEST_ID.reset(token)
+            if config["mode"] == "request":
+                disable(session_id)
+
+    return wrapper
+
+
+def _is_admin() -> bool:
+    from flask import request
+
+    return bool(request.authorization and
+                request.authorization.username in get_admins())
+
+
+def _same_origin() -> bool:
+    from urllib.parse import urlsplit
+
+    from flask import request
+
+    # browsers send basic auth credentials with cross site forms too
+    origin = request.headers.get("Origin") or request.headers.get("Referer")
+    return not origin or urlsplit(origin).netloc == request.host
+
+
+def admin_view():
+    """Admin page listing saved profiles, also switches profiling on/off.
+
+    The switch changes server state so it is only accepted in POST requests.
+    """
+    from flask import request
+
+    if not _is_admin():
+        return "Only admins can access profiles", 403
+
+    if request.method == "POST":
+        if not _same_origin():
+            return "Cross site request refused", 403
+        session_id = request.form.get("session")
+        action = request.form.get("action")
+        if session_id and action == "disable":
+            disable(session_id)
+        elif session_id and action:
+            try:
+                enable(session_id, action)
+            except ValueError as e:
+                return str(e), 400
+
+    enabled = sorted(p.name for p in _ENABLED_DIR.glob("*")) \
+        if _ENABLED_DIR.is_dir() else []
+    profiles = sorted(PROFILE_DIR.glob("*.*"),
+                      key=lambda p: p.stat().st_mtime, reverse=True)
+
+    rows = "".join(
+        f'<li><a href="profiles/{html.escape(p.name)}">'
+        f'{html.escape(p.name)}</a></li>'
+        for p in profiles
+    )
+    return (
+        "<h1>Profiling</h1>"
+        "<form method='post'>Session id: <input name='session'> "
+        "<select name='action'>"
+        "<option value='session'>profile all requests</option>"
+        "<option value='request'>profile next request</option>"
+        "<option value='disable'>disable</option>"
+        "</select> <input type='submit'></form>"
+        f"<p>Profiled sessions: {html.escape(', '.join(enabled)) or '-'}</p>"
+        f"<h2>Saved profiles</h2><ul>{rows}</ul>"
+    )
+
+
+def download_view(name: str):
+    """Download one saved profile."""
+    from flask import send_from_directory
+
+    if not _is_admin():
+        return "Only admins can access profiles", 403
+
+    return send_from_directory(str(PROFILE_DIR), name, as_attachment=True)
+
+
+def init_app(server, protect: Callable[[Callable], Callable] = lambda f: f):
+    """Register admin profiling pages on flask server.
+
+    Parameters
+    ----------
+    server: flask.Flask
+        flask server
+    protect: Callable
+        decorator protecting the views e.g. with authentication
+    """
+    server.add_url_rule("/admin/profiles", "admin_profiles",
+                        protect(admin_view), methods=["GET", "POST"])
+    server.add_url_rule("/admin/profiles/<name>", "admin_profile_download",
+                        protect(download_view))
@@ -0,0 +1,344 @@
+"""Zero-copy hand-off of parsed dataframes between server processes.
+
+Numeric columns of a parsed dataframe are published once as memory-mapped
+.npy files in shared memory (/dev/shm when available) under a directory
+named by file fingerprint. Any worker can then attach the arrays and wrap
+them in a read-only dataframe without unpickling its own copy.
+
+Each entry has a lock file, every process using the entry holds shared lock
+on it so the kernel keeps the reference count and releases it even when the
+process dies. Entries expire after their timeout like cache items, and an
+entry is dropped as soon as a newer one of the same group, e.g. the same
+file with a new fingerprint, is published. Others are evicted in least
+recently used order when the shared directory grows over its budget or the
+free space runs low. Entries still locked by some process are never
+removed.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from getpass import getuser
+from pathlib import Path
+from shutil import rmtree
+from tempfile import gettempdir, mkdtemp
+from threading import Lock
+from time import time
+from typing import IO, TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+log = logging.getLogger(__name__)
+
+SHARED_DIR = Path("/dev/shm" if os.path.isdir("/dev/shm") else gettempdir()) / \
+    f"sim_visualizer_{getuser()}"
+# fraction of the shared file system that published arrays may occupy
+SHARED_LIMIT: float = 0.5
+# evict entries until at least this fraction of file system is free
+MIN_FREE: float = 0.1
+# smaller dataframes are not worth it and stay in the ordinary cache
+MIN_SHARED_BYTES: int = 1024 ** 2
+# number of entries each process keeps attached
+MAX_ATTACHED: int = 8
+
+_META = "meta.json"
+_LOCK = "lock"
+
+# process local attachments, key -> (dataframe, held lock file, expiry)
+_attached: "OrderedDict[str, Tuple[DataFrame, IO, float]]" = OrderedDict()
+_attached_lock = Lock()
+
+
+def _entry_dir(key: str) -> Path:
+    return SHARED_DIR / hashlib.sha1(key.encode()).hexdigest()
+
+
+def _entry_size(entry: Path) -> int:
+    try:
+        return sum(f.stat().st_size for f in entry.iterdir())
+    except OSError:
+        # removed in the meantime by other process
+        return 0
+
+
+def _meta(entry: Path) -> Optional[dict]:
+    try:
+        return json.loads((entry / _META).read_text())
+    except (OSError, ValueError):
+        # not an entry, unfinished or removed in the meantime
+        return None
+
+
+def _expired(expires: float) -> bool:
+    return bool(expires) and expires < time()
+
+
+def _can_share(df: "DataFrame") -> bool:
+    """Only plain numeric columns with string names can be shared."""
+    from pandas import RangeIndex
+
+    return (
+        df.memory_usage(index=False).sum() >= MIN_SHARED_BYTES and
+        df.columns.is_unique and
+        all(isinstance(c, str) for c in df.columns) and
+        all(dt.kind in "biuf" for dt in df.dtypes) and
+        (isinstance(df.index, RangeIndex) or df.index.dtype.kind in "biuf")
+    )
+
+
+def publish(key: str, df: "DataFrame", timeout: int = 0,
+            group: Optional[str] = None) -> bool:
+    """Publish dataframe columns to shared memory.
+
+    Parameters
+    ----------
+    key: str
+        file fingerprint e.g. from `data_cache.cache_key`
+    df: DataFrame
+        parsed data
+    timeout: int
+        entry expires after this many seconds, 0 means never
+    group: Optional[str]
+        entries of the same group supersede each other, only the last
+        published one is kept
+
+    Returns
+    -------
+    bool
+        True if the dataframe is available in shared memory, False if it
+        cannot be shared and must be cached by other means
+    """
+    import numpy as np
+    from pandas import RangeIndex
+
+    if not _can_share(df):
+        return False
+
+    entry = _entry_dir(key)
+    if exists(key):
+        return True
+
+    nbytes = int(df.memory_usage(index=True).sum())
+    tmp = None
+    try:
+        SHARED_DIR.mkdir(parents=True, exist_ok=True)
+        evict(reserve=nbytes)
+
+        # write to temporary directory first so readers never see partial
+        # data, its name is unique even among threads of one process
+        tmp = Path(mkdtemp(prefix=f"{entry.name}.", suffix=".tmp",
+                           dir=SHARED_DIR))
+
+        # columns of the same dtype are stored in one 2D array so they can
+        # be wrapped in one pandas block without copying
+        groups: List[Dict] = []
+        for i, (dtype, columns) in enumerate(
+            df.columns.groupby(df.dtypes).items()
+        ):
+            columns = list(columns)
+            arr = np.lib.format.open_memmap(
+                str(tmp / f"{i}.npy"), mode="w+", dtype=dtype,
+                shape=(len(columns), len(df))
+            )
+            for j, c in enumerate(columns):
+                arr[j] = df[c].to_numpy()
+            arr.flush()
+            del arr
+            groups.append({"file": f"{i}.npy", "columns": columns})
+
+        if isinstance(df.index, RangeIndex):
+            index = {"start": df.index.start, "step": df.index.step}
+        else:
+            np.save(str(tmp / "index.npy"), df.index.to_numpy())
+            index = None
+
+        (tmp / _LOCK).touch()
+        (tmp / _META).write_text(json.dumps({
+            "key": key, "columns": list(df.columns), "groups": groups,
+            "index": index, "rows": len(df), "group": group,
+            "expires": time() + timeout if timeout else 0, "created": time()
+        }))
+
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # other process was faster or an expired entry is still in use
+            rmtree(tmp, ignore_errors=True)
+            return exists(key)
+    except OSError as e:
+        log.warning(f"could not publish {key} to shared memory: {e}")
+        if tmp is not None:
+            rmtree(tmp, ignore_errors=True)
+        return False
+
+    log.debug(f"published {key} to shared memory, {nbytes} bytes")
+    # drop the superseded entry right away
+    evict()
+    return True
+
+
+def _load(entry: Path) -> Tuple["DataFrame", float]:
+    import numpy as np
+    from pandas import DataFrame, RangeIndex
+
+    meta = json.loads((entry / _META).read_text())
+    if _expired(meta.get("expires", 0)):
+        raise ValueError("entry has expired")
+
+    if meta["index"]:
+        start, step = meta["index"]["start"], meta["index"]["step"]
+        index = RangeIndex(start, start + step * meta["rows"], step)
+    else:
+        index = np.load(str(entry / "index.npy"), mmap_mode="r")
+
+    arrays = {}
+    for group in meta["groups"]:
+        arr = np.asarray(np.load(str(entry / group["file"]), mmap_mode="r"))
+        if len(meta["groups"]) == 1:
+            return DataFrame(arr.T, columns=group["columns"], index=index,
+                             copy=False), meta.get("expires", 0)
+        arrays.update(zip(group["columns"], arr))
+
+    # mixed dtypes, each column wraps its row of the mapped array, pandas
+    # does not consolidate them to blocks, so nothing is copied
+    return DataFrame({c: arrays[c] for c in meta["columns"]}, index=index,
+                     copy=False), meta.get("expires", 0)
+
+
+def exists(key: str) -> bool:
+    """Check if key is published and not expired without attaching it."""
+    meta = _meta(_entry_dir(key))
+    return meta is not None and not _expired(meta.get("expires", 0))
+
+
+def attach(key: str) -> Optional["DataFrame"]:
+    """Get dataframe from shared memory without copying the data.
+
+    The returned dataframe is read-only. The entry stays referenced by this
+    process until it drops out of the MAX_ATTACHED most recently used ones
+    or expires.
+
+    Returns
+    -------
+    Optional[DataFrame]
+        None if the key has not been published or has expired
+    """
+    with _attached_lock:
+        if key in _attached:
+            df, lock_file, expires = _attached[key]
+            if not _expired(expires):
+                _attached.move_to_end(key)
+                return df
+            del _attached[key]
+            lock_file.close()
+
+        entry = _entry_dir(key)
+        try:
+            lock_file = open(entry / _LOCK)
+        except FileNotFoundError:
+            return None
+
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            # entry might have been evicted before we got the lock
+            df, expires = _load(entry)
+            os.utime(entry / _META)
+        except (OSError, ValueError) as e:
+            lock_file.close()
+            log.debug(f"could not attach {key}: {e}")
+            return None
+
+        _attached[key] = (df, lock_file, expires)
+        while len(_attached) > MAX_ATTACHED:
+            _, (_, old_lock, _) = _attached.popitem(last=False)
+            old_lock.close()
+
+    return df
+
+
+def release(key: str):
+    """Drop reference of this process to shared entry."""
+    with _attached_lock:
+        _, lock_file, _ = _attached.pop(key, (None, None, None))
+    if lock_file:
+        lock_file.close()
+
+
+def _remove(entry: Path) -> bool:
+    """Remove entry if no process references it."""
+    try:
+        with open(entry / _LOCK) as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # remove meta first so nobody attaches half deleted entry
+            (entry / _META).unlink()
+            rmtree(entry, ignore_errors=True)
+    except OSError:
+        return False
+    return True
+
+
+def evict(reserve: int = 0):
+    """Remove expired and superseded entries, then evict least recently used
+    ones under memory pressure. Entries referenced by some process are kept.
+
+    Parameters
+    ----------
+    reserve: int
+        number of bytes that are about to be published
+    """
+    if not SHARED_DIR.is_dir():
+        return
+
+    fs = os.statvfs(SHARED_DIR)
+    total = fs.f_blocks * fs.f_frsize
+    free = fs.f_bavail * fs.f_frsize - reserve
+
+    entries = []
+    latest: Dict[str, float] = {}
+    for entry in SHARED_DIR.iterdir():
+        # entries being written by other threads or processes
+        if entry.suffix == ".tmp":
+            continue
+        meta = _meta(entry)
+        try:
+            used_at = (entry / _META).stat().st_mtime
+        except OSError:
+            continue
+        if meta is None:
+            continue
+        entries.append((used_at, entry, meta))
+        if meta.get("group"):
+            latest[meta["group"]] = max(latest.get(meta["group"], 0),
+                                        meta.get("created", 0))
+
+    kept = []
+    for used_at, entry, meta in entries:
+        superseded = meta.get("group") and \
+            meta.get("created", 0) < latest[meta["group"]]
+        if (superseded or _expired(meta.get("expires", 0))) and \
+                _remove(entry):
+            log.debug(f"removed stale {entry.name} from shared memory")
+        else:
+            kept.append((used_at, entry))
+    entries = kept
+    used = sum(_entry_size(e) for _, e in entries) + reserve
+
+    for _, entry in sorted(entries):
+        if used <= SHARED_LIMIT * total and free >= MIN_FREE * total:
+            break
+        size = _entry_size(entry)
+        if _remove(entry):
+            log.debug(f"evicted {entry.name} from shared memory")
+            used -= size
+            free += size
+
+
+def clear():
+    """Remove all unreferenced entries."""
+    if SHARED_DIR.is_dir():
+        for entry in SHARED_DIR.iterdir():
+            _remove(entry)
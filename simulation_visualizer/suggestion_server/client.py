@@ -1,26 +1,48 @@
+import fcntl
+import itertools
 import logging
 import os
-import pickle
+import select
 import socket
-import struct
 import subprocess
-import time
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import TYPE_CHECKING, TypeVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from ..utils import get_python
-
-if TYPE_CHECKING:
-    Picklable = TypeVar("Picklable")
+from .protocol import READY_MESSAGE, FrameReader, pack
 
 DEFAULT_SOCK_ADDR = "/tmp/socket_suggestion_server_plot.s"
-CONNECTION_TIMEOUT = 0.001
+CONNECTION_TIMEOUT: float = 1
+# maximum time to wait for server answer
+RESPONSE_TIMEOUT: float = 60
+# maximum time to wait for newly spawned server to start listening
+SERVER_START_TIMEOUT: float = 10
+# maximum number of persistent connections kept by one process
+MAX_CLIENTS: int = 32
 
 log = logging.getLogger(__name__)
 
 
 class SocketClient:
-    """Client side implementation of basic sequential socket server."""
+    """Persistent client of the suggestion server.
+
+    Requests are sent in frames tagged by request id so several of them can
+    be sent at once and their answers collected afterwards.
+
+    Parameters
+    ----------
+    address: str
+        server socket address
+
+    Raises
+    ------
+    ConnectionRefusedError
+        if server is not running
+    TimeoutError
+        if connection could not be established in time
+    """
 
     def __init__(self, address: str):
 
@@ -32,63 +54,98 @@ class SocketClient:
         self.sock.settimeout(CONNECTION_TIMEOUT)
         try:
             self.sock.connect(address)
-        except FileNotFoundError:
+        except (FileNotFoundError, ConnectionRefusedError):
+            self.sock.close()
             raise ConnectionRefusedError("could not connect to suggestion server")
         except socket.timeout:
+            self.sock.close()
             raise TimeoutError("could not connect to socket in specified time")
-        else:
-            log.debug("succesfully connected to server")
-        finally:
-            self.sock.settimeout(None)
 
-    def write(self, data: "Picklable"):
-        """Send data to server.
+        log.debug("succesfully connected to server")
+        self.sock.settimeout(RESPONSE_TIMEOUT)
+        self._reader = FrameReader(self.sock)
+        self._ids = itertools.count()
+        self._send_lock = threading.Lock()
+        # answers read by one thread for requests of other threads
+        self._answers: Dict[int, Any] = {}
+        self._reading = False
+        self._error: Optional[Exception] = None
+        self._cond = threading.Condition()
+
+    def _collect(self, ids: List[int]) -> Dict[int, Any]:
+        """Wait for answers, one waiting thread at a time reads the socket."""
+        with self._cond:
+            while not all(i in self._answers for i in ids):
+                if self._error:
+                    raise ConnectionResetError(
+                        f"connection to suggestion server failed: "
+                        f"{self._error}"
+                    )
+                elif self._reading:
+                    self._cond.wait()
+                    continue
+
+                self._reading = True
+                self._cond.release()
+                try:
+                    request_id, payload = self._reader.read()
+                except Exception as e:
+                    self._error = e
+                    raise
+                finally:
+                    self._cond.acquire()
+                    self._reading = False
+                    self._cond.notify_all()
+
+                self._answers[request_id] = payload
+
+            return {i: self._answers.pop(i) for i in ids}
+
+    def pipeline(self, requests: Sequence[Tuple[str, Dict[str, Any]]],
+                 session_id: str = "") -> List[Any]:
+        """Send several requests at once and wait for all answers.
+
+        Can be called from several threads at once.
 
         Parameters
         ----------
-        data : Picklable
-            any python data structure that is picklable
-        """
-        log.debug(f"sending data from sercer to client: {data}")
-
-        # first pickle data and get bytes length
-        data_bytes = pickle.dumps(data)
-        length = struct.pack("i", len(data_bytes))
-
-        # send number of bytes that the other side is to receive
-        self.sock.send(length)
-
-        # send the actual message
-        self.sock.send(data_bytes)
-
-    def read(self) -> "Picklable":
-        """Read message from server.
+        requests: Sequence[Tuple[str, Dict[str, Any]]]
+            pairs of function name and its keyword arguments
+        session_id: str
+            if passed, server answers None to requests superseded by newer
+            requests of the same session
 
         Returns
         -------
-        Picklable
-            any picklable data type send by server
-        """
-        # first receive number of bytes that will follow, unpack returns a
-        # one-tuple
-        log.debug("receiving data length")
-        length = struct.unpack("i", self.sock.recv(4))[0]
+        List[Any]
+            answers in the order of requests
 
-        log.debug(f"data length is: {length}")
-        log.debug("receiving actual data")
+        Raises
+        ------
+        OSError
+            if connection fails or server could not answer some request
+        """
+        session = [session_id] if session_id else []
+        with self._send_lock:
+            ids = [next(self._ids) & 0xFFFFFFFF for _ in requests]
+            self.sock.sendall(b"".join(
+                pack(i, [function, kwargs, *session])
+                for i, (function, kwargs) in zip(ids, requests)
+            ))
 
-        # now load actual data
-        output = b""
-        while True:
-            output += self.sock.recv(4096)
-            if len(output) >= length:
-                break
+        answers = self._collect(ids)
 
-        data = pickle.loads(output)
+        results = []
+        for i in ids:
+            if "error" in answers[i]:
+                raise OSError(f"suggestion server error: {answers[i]['error']}")
+            results.append(answers[i]["ok"])
 
-        log.debug(f"got data: {data}")
+        return results
 
-        return data
+    def request(self, function: str, session_id: str = "", **kwargs) -> Any:
+        """Call one function on server and wait for the answer."""
+        return self.pipeline([(function, kwargs)], session_id)[0]
 
     def close(self):
         """Close client side socket connection."""
@@ -96,10 +153,28 @@ class SocketClient:
         self.sock.close()
 
 
+# persistent connections of this process, (pid, address, session) -> client
+_clients: "OrderedDict[Tuple[int, str, str], SocketClient]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def drop_client(unique_socket_address: Path, session_id: str = ""):
+    """Close persistent connection e.g. after it has failed."""
+    with _clients_lock:
+        client = _clients.pop(
+            (os.getpid(), str(unique_socket_address), session_id), None
+        )
+    if client:
+        client.close()
+
+
 def connect_to_suggestion_server(
-    *, log_level: int, unique_socket_address: Path
+    *, log_level: int, unique_socket_address: Path, session_id: str = ""
 ) -> "SocketClient":
-    """Establis connection to server providing autocomplete suggestions.
+    """Get persistent connection to server providing autocomplete suggestions.
+
+    Each session keeps its own connection which is reused by all its
+    requests. Server is started if it is not running.
 
     Parametrers
     -----------
@@ -108,6 +183,8 @@ def connect_to_suggestion_server(
     unique_socket_address: Path
         server <-> client communication socket address, location must be
         writable
+    session_id: str
+        unique user session id
 
     Returns
     -------
@@ -117,36 +194,39 @@ def connect_to_suggestion_server(
     Raises
     ------
     TimeoutError
-        if connection attempt has timed out three times
+        if server could not be reached
     """
-    started = False
-    timeout_counter = 0
+    # connections must not be shared with forked processes
+    key = (os.getpid(), str(unique_socket_address), session_id)
+
+    with _clients_lock:
+        if key in _clients:
+            _clients.move_to_end(key)
+            return _clients[key]
 
     log.debug(f"logging for server is set to: {log_level}")
 
-    while True:
+    try:
+        client = SocketClient(str(unique_socket_address))
+    except ConnectionRefusedError:
+        log.warning("server not running, starting...")
+        start_server(log_level, unique_socket_address)
         try:
-            cl = SocketClient(str(unique_socket_address))
+            client = SocketClient(str(unique_socket_address))
         except ConnectionRefusedError:
-            log.warn("connection refused")
-            if not started:
-                log.warn("server not running, starting...")
-                start_server(log_level, unique_socket_address)
-                started = True
-        except TimeoutError:
-            log.warn("connection to socket server timed out")
-            if timeout_counter > 3:
-                raise TimeoutError(
-                    "three attempts to connect to suggestion server have timed out"
-                )
-            else:
-                timeout_counter += 1
-        else:
-            return cl
+            raise TimeoutError("could not connect to suggestion server")
+
+    with _clients_lock:
+        _clients[key] = client
+        while len(_clients) > MAX_CLIENTS:
+            _, old = _clients.popitem(last=False)
+            old.close()
+
+    return client
 
 
 def start_server(log_level: int, unique_socket_address: Path):
-    """Start socket server.
+    """Start socket server and wait until it accepts connections.
 
     Parametrers
     -----------
@@ -155,22 +235,43 @@ def start_server(log_level: int, unique_socket_address: Path):
     unique_socket_address: Path
         server <-> client communication socket address, location must be
         writable
+
+    Raises
+    ------
+    TimeoutError
+        if server did not start in time
     """
-    # delete socket file
-    log.debug("removing socket file")
-    try:
-        os.unlink(unique_socket_address)
-    except FileNotFoundError:
-        pass
-
-    # start server
-    log.debug("spawnig server process")
-    subprocess.Popen(
-        [str(get_python()), "server.py", str(unique_socket_address), str(log_level)],
-        cwd=os.path.dirname(__file__),
-    )
-
-    # with until server creates socket file
-    log.debug("waiting until server creates socket file")
-    while not unique_socket_address.exists():
-        time.sleep(CONNECTION_TIMEOUT)
+    # server is shared, make sure only one process starts it
+    with open(f"{unique_socket_address}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            SocketClient(str(unique_socket_address)).close()
+        except (ConnectionRefusedError, TimeoutError):
+            pass
+        else:
+            log.debug("server was started by other process")
+            return
+
+        # delete socket file
+        log.debug("removing socket file")
+        try:
+            os.unlink(unique_socket_address)
+        except FileNotFoundError:
+            pass
+
+        # start server
+        log.debug("spawnig server process")
+        server = subprocess.Popen(
+            [str(get_python()), "server.py", str(unique_socket_address),
+             str(log_level)],
+            cwd=os.path.dirname(__file__), stdout=subprocess.PIPE,
+        )
+
+        # server announces on stdout that it is listening
+        log.debug("waiting until server is ready")
+        ready, _, _ = select.select([server.stdout], [], [],
+                                    SERVER_START_TIMEOUT)
+        message = server.stdout.readline() if ready else b""
+        server.stdout.close()
+        if message != READY_MESSAGE:
+            raise TimeoutError("suggestion server did not start in time")
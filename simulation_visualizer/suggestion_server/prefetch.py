@@ -0,0 +1,113 @@
+"""Speculative prefetch of what the user is likely to open next.
+
+After answering a completion, listings of the suggested subdirectories are
+fetched into the listing cache and headers of suggested files with known
+output names (COLVAR, lcurve.out, log.lammps, ...) are parsed into the
+cache shared with the app, so descending into a directory or submitting a
+file is answered from cache.
+
+Prefetching runs in its own small thread pool with bounded number of
+pending jobs so it never delays interactive requests.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+from typing import TYPE_CHECKING, Hashable, List, Sequence, Set
+
+from simulation_visualizer.parser import known_output_file
+
+if TYPE_CHECKING:
+    from flask_caching.backends.base import BaseCache
+
+    from simulation_visualizer.path_completition import _ENTRY, Completion
+
+log = logging.getLogger(__name__)
+
+# maximum number of subdirectory listings prefetched after one completion
+PREFETCH_DIRS: int = 8
+# maximum number of file headers prefetched after one completion
+PREFETCH_HEADERS: int = 4
+PREFETCH_THREADS: int = 2
+# new jobs are dropped when this many are waiting or running
+MAX_PENDING: int = 32
+PREFETCH_SESSION = "prefetch"
+
+
+class Prefetcher:
+    """Prefetch listings and headers in background.
+
+    Parameters
+    ----------
+    completion: Completion
+        completion whose listing cache is populated
+    """
+
+    def __init__(self, completion: "Completion"):
+        self._completion = completion
+        self._executor = ThreadPoolExecutor(PREFETCH_THREADS)
+        self._pending: Set[Hashable] = set()
+        self._lock = threading.Lock()
+        self._cache = None
+
+    @property
+    def cache(self) -> "BaseCache":
+        """Cache shared with the app, created on first use."""
+        if self._cache is None:
+            from simulation_visualizer.cache_backends import get_cache_backend
+
+            self._cache = get_cache_backend()
+        return self._cache
+
+    def schedule(self, host: str, entries: Sequence["_ENTRY"]):
+        """Prefetch likely next steps after user was offered entries.
+
+        Parameters
+        ----------
+        host: str
+            host name
+        entries: Sequence[Tuple[str, bool, int, float]]
+            entries suggested to the user
+        """
+        dirs = [e[0] for e in entries if e[1]][:PREFETCH_DIRS]
+        files = [e[0] for e in entries
+                 if not e[1] and known_output_file(e[0])][:PREFETCH_HEADERS]
+
+        for d in dirs:
+            # same key completion uses for the listing
+            path = str(PurePosixPath(d))
+            self._submit(("dir", host, path), self._completion.list_dir,
+                         host, path)
+        if files:
+            self._submit(("headers", host, tuple(files)), self._headers, host,
+                         files)
+
+    def _submit(self, key: Hashable, function, *args):
+
+        with self._lock:
+            if key in self._pending or len(self._pending) >= MAX_PENDING:
+                return
+            self._pending.add(key)
+
+        def done(future):
+            with self._lock:
+                self._pending.discard(key)
+            if future.exception():
+                log.debug(f"prefetch {key} failed: {future.exception()}")
+
+        self._executor.submit(function, *args).add_done_callback(done)
+
+    def _headers(self, host: str, files: List[str]):
+
+        from simulation_visualizer.data_cache import get_header
+        from simulation_visualizer.utils import stat_files
+
+        # one batched stat for all files, cache is keyed by fingerprint
+        for path, stat in stat_files(host, files).items():
+            log.debug(f"prefetching header of {host}@{path}")
+            get_header(self.cache, path, host, PREFETCH_SESSION, stat=stat)
+
+    def close(self):
+        """Stop prefetching, waiting jobs are dropped."""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,98 @@
+"""Framed wire protocol of the suggestion server.
+
+Each message is one frame: 8 byte header with request id and payload length
+(both unsigned 32 bit, network byte order) followed by compact JSON payload.
+Request payload is ``[function, kwargs]`` or ``[function, kwargs, session]``
+where session id is used to supersede older requests of the same session.
+Response payload is ``{"ok": result}`` or ``{"error": message}`` and carries
+the id of request it answers, so the client can send several requests
+without waiting and the server can answer them in any order. Superseded
+requests are answered with ``{"ok": null}``.
+"""
+
+import json
+import socket
+import struct
+from typing import Any, Tuple
+
+HEADER = struct.Struct("!II")
+# refuse frames bigger than this, protects against garbage on the socket
+MAX_FRAME: int = 64 * 1024 ** 2
+# initial size of receive buffer, it grows as needed
+BUFFER_SIZE: int = 64 * 1024
+# line that server writes to stdout when it is ready to accept connections
+READY_MESSAGE = b"ready\n"
+
+
+class ProtocolError(OSError):
+    """Raised when the other side sends malformed frame."""
+
+
+def encode(payload: Any) -> bytes:
+    """Serialize payload to compact JSON."""
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def decode(data: bytes) -> Any:
+    """Deserialize JSON payload."""
+    return json.loads(data)
+
+
+def pack(request_id: int, payload: Any) -> bytes:
+    """Build one frame, header and payload are sent in one call."""
+    data = encode(payload)
+    return HEADER.pack(request_id, len(data)) + data
+
+
+def unpack_header(header: bytes) -> Tuple[int, int]:
+    """Get request id and payload length from frame header.
+
+    Raises
+    ------
+    ProtocolError
+        if payload is too big
+    """
+    request_id, length = HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ProtocolError(f"frame of {length} bytes exceeds maximum size")
+    return request_id, length
+
+
+class FrameReader:
+    """Read frames from blocking socket into preallocated buffer.
+
+    Parameters
+    ----------
+    sock: socket.socket
+        connected socket
+    """
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self._buffer = bytearray(BUFFER_SIZE)
+
+    def _recv_exactly(self, n: int) -> memoryview:
+        if n > len(self._buffer):
+            self._buffer = bytearray(max(n, 2 * len(self._buffer)))
+
+        view = memoryview(self._buffer)
+        received = 0
+        while received < n:
+            chunk = self._sock.recv_into(view[received:n], n - received)
+            if chunk == 0:
+                raise ConnectionResetError("connection closed by other side")
+            received += chunk
+        return view[:n]
+
+    def read(self) -> Tuple[int, Any]:
+        """Read one frame.
+
+        Returns
+        -------
+        Tuple[int, Any]
+            request id and decoded payload
+        """
+        request_id, length = unpack_header(
+            bytes(self._recv_exactly(HEADER.size))
+        )
+        return request_id, decode(bytes(self._recv_exactly(length)))
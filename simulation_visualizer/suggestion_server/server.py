@@ -5,111 +5,196 @@ connection which takes long to establish, so this duty is passed to server
 which establishes connections as needed and holds them running in the
 background so they do not have to be opened anew. When suggestions
 are finished server quietly exits after timeout.
+
+One asyncio server serves all browser sessions concurrently. Blocking
+completion calls run in a thread pool and share a per-host connection pool
+and a cache of directory listings, so most keystrokes are answered without
+any remote access. Listings of suggested subdirectories and headers of
+suggested output files are prefetched in background.
 """
 
+import asyncio
 import atexit
+import itertools
 import logging
-import pickle
-import socket
-import struct
+import os
 import sys
-from os import remove
-from typing import TYPE_CHECKING, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
 
 from simulation_visualizer.path_completition import Completion
-
-SERVER_WAITING_CLIENTS: int = 5
-SOCK_SERVER_TIMEOUT: int = 30
-
-if TYPE_CHECKING:
-    Picklable = TypeVar("Picklable")
+from simulation_visualizer.suggestion_server.prefetch import Prefetcher
+from simulation_visualizer.suggestion_server.protocol import (
+    HEADER, READY_MESSAGE, ProtocolError, decode, pack, unpack_header
+)
+
+SERVER_WAITING_CLIENTS: int = 64
+SOCK_SERVER_TIMEOUT: int = 300
+# number of completion calls running at once
+SERVER_THREADS: int = 16
+# requests needing remote listing wait this long for newer request of the
+# same session before they are started
+DEBOUNCE_DELAY: float = 0.15
+# requests that are superseded by newer requests of the same session
+DEBOUNCED = ("get_entries", "get_dirs")
 
 log = logging.getLogger("simulation_visualizer.suggestion_server")
 logging.getLogger("paramiko").setLevel(logging.WARNING)
 logging.getLogger("ssh_utilities").setLevel(logging.WARNING)
 
 
-class SocketServer:
-    """Server side implementation of basic seqntuial socket server."""
-
-    def __init__(self, address) -> None:
-
-        # AF_UNIX are unix file-like sockets that bind to a file, this is fast
-        # enough for our purposes
-        log.debug("creating socket")
-        self.s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-
-        log.debug(f"binding addres to: {address}")
-        self.s.bind(address)
-
-        log.debug(f"max requests: {SERVER_WAITING_CLIENTS}")
-        self.s.listen(SERVER_WAITING_CLIENTS)
+class SuggestionServer:
+    """Asyncio server answering requests of many clients at once.
 
-        log.debug(f"set to accept connections")
-        self.sock, _ = self.s.accept()
-
-        log.debug("started suggestion server")
-
-    def write(self, data: "Picklable"):
-        """Send data to client.
+    Parameters
+    ----------
+    address: str
+        server socket address (filename)
+    """
 
-        Parameters
-        ----------
-        data : Picklable
-            any python data structure that is picklable
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self.completion = Completion()
+        self.executor = ThreadPoolExecutor(SERVER_THREADS)
+        self.prefetcher = Prefetcher(self.completion)
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._last_active = 0.0
+        # session id -> generation of its latest request
+        self._latest: Dict[str, int] = {}
+        self._generation = itertools.count()
+
+    async def read(self, reader: asyncio.StreamReader) -> Tuple[int, Any]:
+        """Read one request frame from client.
+
+        Raises
+        ------
+        asyncio.IncompleteReadError
+            if client has disconnected
         """
-        log.debug(f"sending data from sercer to client: {data}")
-
-        # first pickle data and get bytes length
-        data_bytes = pickle.dumps(data)
-        length = struct.pack("i", len(data_bytes))
-
-        # send number of bytes that the other side is to receive
-        self.sock.send(length)
+        request_id, length = unpack_header(
+            await reader.readexactly(HEADER.size)
+        )
+        return request_id, decode(await reader.readexactly(length))
+
+    async def answer(self, writer: asyncio.StreamWriter, request_id: int,
+                     function: str, kwargs: Dict[str, Any],
+                     session: Optional[str] = None):
+        """Run one request and send its answer framed with request id.
+
+        Requests of a session that are superseded by newer ones are not
+        started if they need remote access, and their results are dropped
+        if they finish late. Listings they fetched stay cached.
+        """
+        log.debug(f"requested function: {function}({kwargs})")
 
-        # send the actual message
-        self.sock.send(data_bytes)
+        generation = None
+        if session and function in DEBOUNCED:
+            generation = self._latest[session] = next(self._generation)
 
-    def read(self) -> "Picklable":
-        """Read from message from client.
+        def superseded() -> bool:
+            return generation is not None and \
+                self._latest.get(session) != generation
 
-        Returns
-        -------
-        Picklable
-            any picklable data type send by client
-        """
-        # first receive number of bytes that will follow, unpack returns a
-        # one-tuple
-        log.debug("receiving data length")
-        r = self.sock.recv(4)
-
-        if len(r) == 0:
-            self.s.settimeout(SOCK_SERVER_TIMEOUT)
-            self.sock, _ = self.s.accept()
-            log.warning("read zero length byte, client has disconnected")
-            return self.read()
+        if function == "ping":
+            response = {"ok": "pong"}
         else:
-            length = struct.unpack("i", r)[0]
-            log.debug(f"data length is: {length}")
+            loop = asyncio.get_event_loop()
+            try:
+                f = getattr(self.completion, function)
+                if generation is not None and \
+                        not self.completion.is_cached(**kwargs):
+                    await asyncio.sleep(DEBOUNCE_DELAY)
+                if superseded():
+                    log.debug(f"{function}({kwargs}) superseded, skipping")
+                    response = {"ok": None}
+                else:
+                    result = await loop.run_in_executor(
+                        self.executor, partial(f, **kwargs)
+                    )
+                    response = {"ok": None if superseded() else result}
+                    if function == "get_entries" and result:
+                        self.prefetcher.schedule(kwargs["host"], result)
+            except Exception as e:
+                log.exception(f"{function} failed")
+                # client falls back to serverless mode
+                response = {"error": f"{function} failed: {e}"}
+
+        if generation is not None and not superseded():
+            del self._latest[session]
+
+        # whole frame is written at once so answers do not interleave
+        writer.write(pack(request_id, response))
+        await writer.drain()
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter):
+        """Answer requests of one client until it disconnects.
+
+        Requests are not awaited one by one so pipelined requests of the
+        client run concurrently.
+        """
+        self._clients.add(writer)
+        log.debug(f"client connected, {len(self._clients)} clients")
 
-        log.debug("receiving actual data")
-        # now load actual data
-        output = b""
-        while True:
-            output += self.sock.recv(4096)
-            if len(output) >= length:
-                break
+        tasks: Set[asyncio.Future] = set()
+        try:
+            while True:
+                try:
+                    request_id, (function, kwargs, *session) = \
+                        await self.read(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    log.debug("client has disconnected")
+                    break
+                except (ProtocolError, ValueError, TypeError) as e:
+                    log.warning(f"malformed request, disconnecting: {e}")
+                    break
+
+                task = asyncio.ensure_future(
+                    self.answer(writer, request_id, function, kwargs,
+                                *session)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            self._clients.discard(writer)
+            self._last_active = asyncio.get_event_loop().time()
+
+    async def serve(self):
+        """Serve clients, exit after timeout without any connected client."""
+        server = await asyncio.start_unix_server(
+            self.handle_client, path=self.address,
+            backlog=SERVER_WAITING_CLIENTS
+        )
+        log.debug("started suggestion server")
 
-        data = pickle.loads(output)
+        # tell the spawning process we are listening, nothing else may be
+        # written to stdout afterwards
+        sys.stdout.buffer.write(READY_MESSAGE)
+        sys.stdout.flush()
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        os.close(devnull)
 
-        log.debug(f"got data: {data}")
+        loop = asyncio.get_event_loop()
+        self._last_active = loop.time()
+        while (self._clients or
+               loop.time() - self._last_active < SOCK_SERVER_TIMEOUT):
+            await asyncio.sleep(SOCK_SERVER_TIMEOUT / 10)
 
-        return data
+        log.debug("no clients, exiting")
+        server.close()
+        await server.wait_closed()
 
     def close(self):
-        """Close server side socket connection."""
-        log.debug("exiting")
-        self.sock.close()
+        """Release connections and threads."""
+        self.executor.shutdown(wait=False)
+        self.prefetcher.close()
+        self.completion.close()
 
 
 def server(address: str, log_level: str):
@@ -122,42 +207,25 @@ def server(address: str, log_level: str):
     log_level: str
         logging level
     """
-    function: str
-    kwargs: dict
-
-    #set_log_handles(log_level, log_file="server.log")
-    # ! this is error prone when some changes are implemented
-    log_id = address.replace("/tmp/user-", "").replace("-suggestion_server", "")
-
     logging.basicConfig(
-        filename=f"../logs/suggestion_server-{log_id}.log",
+        filename=f"../logs/suggestion_server-{Path(address).name}.log",
         level=int(log_level), filemode="w",
         format="[%(asctime)s] %(levelname)-7s ""%(name)-45s %(message)s"
     )
 
-    server = SocketServer(address)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    suggestion_server = SuggestionServer(address)
     # remove socket file when exiting
-    atexit.register(remove, address)
-    cp = Completion()
+    atexit.register(os.remove, address)
 
     log.debug("entering loop")
-
-    while True:
-
-        # read client request
-        try:
-            function, kwargs = server.read()
-        except socket.timeout:
-            server.close()
-            return
-        else:
-            # get appropriate method
-            f = getattr(cp, function, None)
-            log.debug(f"found function: {f}")
-
-            # get method output, and send it back to client
-            log.debug("sending answer to client")
-            server.write(f(**kwargs))
+    try:
+        loop.run_until_complete(suggestion_server.serve())
+    finally:
+        suggestion_server.close()
+        loop.close()
 
 
 if __name__ == "__main__":
@@ -47,10 +47,31 @@ USAGE = [
      "downloaded from server and than sent to your browser so please be "
      "patient. For files up to ~100MB it should be a matter of seconds. Each "
      "loaded pandas dataframe is cached by dash server for 10 minutes so "
-     "ploting again in this window will be faster as data does not have to be "
-     "downloaded again, but you will not see the most up-to-date file!"),
+     "ploting again will be faster as data does not have to be downloaded "
+     "again. The cache is invalidated as soon as the file changes, so "
+     "plotting a few seconds later always shows the rows appended since. Very long files are thinned "
+     "out before plotting, the download contains all data unless only "
+     "every n-th or sampled rows are read, see below."),
+    html.Br(),
+    ("To follow a running simulation select 'last rows', 'last MB' or "
+     "'last time units' in 'Read part of file' and set the window size. Only "
+     "the end of file is then read and parsed, time is taken from the first "
+     "data column. Long files can be skimmed by reading only every n-th row "
+     "or a random fraction of rows, the other rows are skipped while "
+     "parsing. These options apply to both plot and download."),
     html.Br(),
     ("6. After plotting you can save the file to your PC by clicking the "
      "download button. You can select either CSV file or interactive plotly "
-     "html file. Download can be also used without ploting the file in web-ui")
+     "html file. Download can be also used without ploting the file in web-ui"),
+    html.Br(),
+    ("7. Files you check often can be bookmarked with the 'Toggle bookmark' "
+     "button. Bookmarked files are watched in the background and kept parsed "
+     "in cache so plotting them is always fast, only rows appended since the "
+     "last check are parsed. Click a bookmark in the list to load it."),
+    html.Br(),
+    ("8. Simulation outputs under directories configured by the admin are "
+     "indexed periodically. Search them in 'Search indexed files', e.g. "
+     "'colvar 24h /scratch/me' lists COLVAR files modified in the last 24 "
+     "hours under /scratch/me. Terms 'host:<name>' and 'parser:<name>' "
+     "narrow the search further.")
 ]
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""Parallel multi-stream transfer of large remote files.
+
+One SFTP channel over a high latency link is limited by its flow control
+window far below the available bandwidth. Large files are therefore split
+to byte ranges fetched concurrently, each stream over its own SFTP channel
+of the existing ssh connection. Ranges are written to their place in a
+local temporary file as they arrive and the parser reads them in order as
+soon as they are complete, so parsing overlaps with the transfer.
+
+A range that fails is retried over a new channel, the ranges already
+transferred are kept. Number of streams and range size are set by
+SIM_VISUALIZER_STREAMS and SIM_VISUALIZER_CHUNK (in MB) environment
+variables or `--streams` and `--chunk` options.
+"""
+
+import io
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+STREAMS_ENV = "SIM_VISUALIZER_STREAMS"
+CHUNK_ENV = "SIM_VISUALIZER_CHUNK"
+DEFAULT_STREAMS: int = 4
+# range size in MB
+DEFAULT_CHUNK: int = 8
+# smaller files are copied over one channel
+PARALLEL_MIN_BYTES: int = 32 * 1024 ** 2
+# number of tries to fetch one range before the transfer fails
+RANGE_ATTEMPTS: int = 3
+
+
+def transfer_options() -> Tuple[int, int]:
+    """Number of concurrent streams and range size in bytes."""
+    streams = int(os.environ.get(STREAMS_ENV) or DEFAULT_STREAMS)
+    chunk = float(os.environ.get(CHUNK_ENV) or DEFAULT_CHUNK)
+    return max(streams, 1), max(int(chunk * 1024 ** 2), 1)
+
+
+def sftp_factory(sftp) -> Callable:
+    """Function opening new SFTP channels over the connection of sftp.
+
+    Parameters
+    ----------
+    sftp: paramiko.SFTPClient
+        open SFTP client of the ssh connection
+    """
+    import paramiko
+
+    transport = sftp.get_channel().get_transport()
+    return lambda: paramiko.SFTPClient.from_transport(transport)
+
+
+class ParallelDownload(io.RawIOBase):
+    """Read-only raw stream of remote file fetched by concurrent streams.
+
+    Ranges are handed to the streams in file order, so the file start
+    arrives first. Reads block until the range they need is transferred.
+
+    Parameters
+    ----------
+    sftp_factory: Callable[[], paramiko.SFTPClient]
+        opens new SFTP channel, called once by each stream and again when
+        its range has to be retried
+    path: str
+        path to the remote file
+    size: int
+        file size
+    local_path: str
+        temporary file the ranges are written to
+    streams: Optional[int]
+        number of concurrent streams, by default from `transfer_options`
+    chunk: Optional[int]
+        range size in bytes, by default from `transfer_options`
+    """
+
+    def __init__(self, sftp_factory: Callable, path: str, size: int,
+                 local_path: str, streams: Optional[int] = None,
+                 chunk: Optional[int] = None) -> None:
+        default_streams, default_chunk = transfer_options()
+        self._factory = sftp_factory
+        self._path = path
+        self._size = size
+        self._chunk = chunk or default_chunk
+        self._ranges: List[Tuple[int, int]] = [
+            (o, min(self._chunk, size - o))
+            for o in range(0, size, self._chunk)
+        ]
+        self._done = [threading.Event() for _ in self._ranges]
+        self._errors: Dict[int, Exception] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pos = 0
+        self._fetched = 0
+
+        self._file = open(local_path, "w+b")
+        self._file.truncate(size)
+
+        self._threads = [
+            threading.Thread(target=self._stream, daemon=True,
+                             name=f"transfer-{i}")
+            for i in range(min(streams or default_streams,
+                               len(self._ranges)))
+        ]
+        for t in self._threads:
+            t.start()
+
+    @property
+    def fetched(self) -> int:
+        """Number of bytes transferred so far."""
+        return self._fetched
+
+    def _take(self) -> Optional[int]:
+        with self._lock:
+            if self._stop.is_set() or self._next >= len(self._ranges):
+                return None
+            self._next += 1
+            return self._next - 1
+
+    def _stream(self):
+        sftp = remote = None
+        try:
+            while True:
+                i = self._take()
+                if i is None:
+                    break
+
+                offset, size = self._ranges[i]
+                for attempt in range(1, RANGE_ATTEMPTS + 1):
+                    try:
+                        if remote is None:
+                            sftp = self._factory()
+                            remote = sftp.open(self._path, "rb")
+                        data = b"".join(remote.readv([(offset, size)]))
+                        if len(data) != size:
+                            raise EOFError(f"got {len(data)} of {size} "
+                                           f"bytes, file was truncated")
+                        os.pwrite(self._file.fileno(), data, offset)
+                    except Exception as e:
+                        log.warning(f"range {offset}-{offset + size} of "
+                                    f"{self._path} failed, attempt "
+                                    f"{attempt}: {e}")
+                        self._errors[i] = e
+                        # channel might be broken, retry over new one
+                        sftp, remote = self._close(sftp, remote)
+                    else:
+                        self._errors.pop(i, None)
+                        with self._lock:
+                            self._fetched += size
+                        break
+                else:
+                    # the read fails on this range, rest is not needed
+                    self._stop.set()
+                self._done[i].set()
+        finally:
+            self._close(sftp, remote)
+
+    @staticmethod
+    def _close(sftp, remote) -> Tuple[None, None]:
+        for channel in (remote, sftp):
+            try:
+                if channel is not None:
+                    channel.close()
+            except Exception:
+                pass
+        return None, None
+
+    def wait(self):
+        """Block until the whole file is transferred.
+
+        Raises
+        ------
+        OSError
+            if some range could not be transferred
+        """
+        for i, done in enumerate(self._done):
+            done.wait()
+            if i in self._errors:
+                raise OSError(f"could not transfer {self._path} after "
+                              f"{RANGE_ATTEMPTS} attempts") from self._errors[i]
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._pos >= self._size:
+            return 0
+
+        i = self._pos // self._chunk
+        self._done[i].wait()
+        if i in self._errors:
+            raise OSError(f"could not transfer {self._path} after "
+                          f"{RANGE_ATTEMPTS} attempts") from self._errors[i]
+
+        offset, size = self._ranges[i]
+        n = min(len(b), offset + size - self._pos)
+        data = os.pread(self._file.fileno(), n, self._pos)
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            # streams finish the range they are fetching and exit
+            self._stop.set()
+            for t in self._threads:
+                t.join()
+            self._file.close()
+        super().close()
@@ -1,25 +1,378 @@
 import argparse
+import base64
+import io
 import logging
+import mmap
 import os
+import shlex
 from contextlib import contextmanager
 from pathlib import Path
 from socket import gethostname
 from time import time
-from typing import Dict
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-from ssh_utilities import Connection
+from simulation_visualizer.compression import (MAGIC_BYTES, decompress_head,
+                                               detect, open_decompressed)
+from simulation_visualizer.metrics import stage
 
 log = logging.getLogger(__name__)
 
+# bytes read from the file start when probing it, enough for most headers
+PROBE_BYTES: int = 64 * 1024
+# first block fetched by ranged reads, each following block is twice as big
+HEAD_BLOCK: int = 64 * 1024
+MAX_HEAD_BLOCK: int = 4 * 1024 ** 2
+
+
+def is_local(host: str) -> bool:
+    """Check if host is the machine this app is running on."""
+    return host == gethostname().lower()
+
 
 def get_file_size(path: str, host: str) -> float:
 
-    local = True if host == gethostname().lower() else False
+    if is_local(host):
+        return os.stat(path).st_size
 
-    with Connection(host, local=local, quiet=True) as c:
+    from ssh_utilities import Connection
+
+    with Connection(host, local=False, quiet=True) as c:
         return c.os.stat(path).st_size
 
 
+def stat_files(host: str, paths: List[str], inode: bool = False
+               ) -> Dict[str, Tuple]:
+    """Get size and modification time of many files in one batch.
+
+    For remote hosts only one `stat` command is run for all the paths.
+    Files that do not exist or cannot be accessed are left out.
+
+    Parameters
+    ----------
+    host: str
+        server name
+    paths: List[str]
+        paths to files on the host
+    inode: bool
+        also get inode numbers, e.g. to tell replaced files
+
+    Returns
+    -------
+    Dict[str, Tuple]
+        path -> (size in bytes, modification time), inode number is
+        appended if requested
+    """
+    stats = {}
+
+    if not paths:
+        return stats
+
+    if is_local(host):
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                log.warning(f"could not stat {path}: {e}")
+            else:
+                stats[path] = (st.st_size, st.st_mtime) + (
+                    (st.st_ino,) if inode else ()
+                )
+        return stats
+
+    from ssh_utilities import Connection
+
+    command = ["stat", "-L", "-c", shlex.quote("%s %Y %i %n"), "--"]
+    command.extend(shlex.quote(p) for p in paths)
+
+    with stage("ssh_connect", host=host):
+        conn = Connection(host, local=False, quiet=True)
+
+    with conn as c:
+        output = c.subprocess.run(command, suppress_out=True, quiet=True,
+                                  capture_output=True,
+                                  encoding="utf-8").stdout
+
+    for line in output.splitlines():
+        size, mtime, ino, path = line.split(" ", 3)
+        stats[path] = (int(size), float(mtime)) + (
+            (int(ino),) if inode else ()
+        )
+
+    return stats
+
+
+def probe_file(host: str, path: str, nbytes: int = PROBE_BYTES
+               ) -> Tuple[Tuple[int, float], int, str, Optional[str]]:
+    """Get file fingerprint and its beginning in one round trip.
+
+    For remote hosts `stat` and `head` are chained in one command. Beginning
+    of compressed file is decompressed.
+
+    Parameters
+    ----------
+    host: str
+        server name
+    path: str
+        path to file on the host
+    nbytes: int
+        number of bytes read from the file start
+
+    Returns
+    -------
+    Tuple[Tuple[int, float], int, str, Optional[str]]
+        (size, modification time) as returned by `stat_files`, inode number,
+        the first `nbytes` of the file decoded as text and name of file
+        compression or None
+
+    Raises
+    ------
+    FileNotFoundError
+        if file does not exist, is a directory or cannot be accessed
+    """
+    if is_local(host):
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                head = f.read(nbytes)
+        except OSError as e:
+            raise FileNotFoundError(f"Cannot access {host}@{path}") from e
+        stat, inode = (st.st_size, st.st_mtime), st.st_ino
+        return (stat, inode) + _decode_head(head)
+
+    from ssh_utilities import Connection
+
+    q = shlex.quote(path)
+    # file start is base64 encoded so compressed files survive text output,
+    # the pipe exit status is that of base64 so file is checked beforehand
+    command = (f"test -f {q} && test -r {q} && "
+               f"stat -L -c '%s %Y %i' -- {q} && "
+               f"head -c {nbytes} -- {q} | base64")
+
+    with stage("ssh_connect", host=host):
+        conn = Connection(host, local=False, quiet=True)
+
+    with conn as c:
+        result = c.subprocess.run(command, suppress_out=True, quiet=True,
+                                  capture_output=True, encoding="utf-8",
+                                  errors="replace")
+
+    if result.returncode:
+        raise FileNotFoundError(f"Cannot access {host}@{path}")
+
+    stat, _, head = result.stdout.partition("\n")
+    size, mtime, inode = stat.split()
+    return ((int(size), float(mtime)), int(inode)) + _decode_head(
+        base64.b64decode(head)
+    )
+
+
+def _decode_head(head: bytes) -> Tuple[str, Optional[str]]:
+    """Decompress file start if needed and decode it as text."""
+    kind = detect(head)
+    if kind:
+        head = decompress_head(head, kind)
+    return head.decode("utf-8", "replace"), kind
+
+
+def read_range(host: str, path: str, offset: int, size: int) -> bytes:
+    """Read part of file, remote files are read with one pipelined request.
+
+    Parameters
+    ----------
+    host: str
+        server name
+    path: str
+        path to file on the host
+    offset: int
+        position of the first byte
+    size: int
+        number of bytes to read, less is returned at the end of file
+    """
+    if is_local(host):
+        with open(path, "rb") as f:
+            return os.pread(f.fileno(), size, offset)
+
+    from ssh_utilities import Connection
+
+    with stage("ssh_connect", host=host):
+        conn = Connection(host, local=False, quiet=True)
+
+    with conn as c:
+        with c.sftp.open(path, "rb") as remote:
+            size = max(min(size, remote.stat().st_size - offset), 0)
+            return b"".join(remote.readv([(offset, size)])) if size else b""
+
+
+class MappedFile(io.RawIOBase):
+    """Read-only raw stream reading directly from memory mapped file.
+
+    Parameters
+    ----------
+    mm: mmap.mmap
+        memory mapped file, the underlying buffer is accessible through
+        `mmap` attribute
+    """
+
+    def __init__(self, mm: mmap.mmap) -> None:
+        self.mmap = mm
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self.mmap.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self.mmap.seek(offset, whence)
+        return self.mmap.tell()
+
+    def tell(self) -> int:
+        return self.mmap.tell()
+
+
+class RangedFile(io.RawIOBase):
+    """Read-only raw stream fetching file start in expanding blocks.
+
+    The first read fetches HEAD_BLOCK bytes, only when the reader gets past
+    them the next, twice as big block is fetched. Reading the header of a
+    big file thus costs the same as of a small one.
+
+    Parameters
+    ----------
+    read_range: Callable[[int, int], bytes]
+        function returning `size` bytes of the file starting at `offset`
+    size: int
+        file size, reads are never requested past it
+    """
+
+    def __init__(self, read_range: Callable[[int, int], bytes],
+                 size: int) -> None:
+        self._read_range = read_range
+        self._size = size
+        self._data = bytearray()
+        self._pos = 0
+        self._block = HEAD_BLOCK
+
+    @property
+    def fetched(self) -> int:
+        """Number of bytes fetched so far."""
+        return len(self._data)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def _fetch(self, end: int):
+        while len(self._data) < min(end, self._size):
+            size = min(self._block, self._size - len(self._data))
+            chunk = self._read_range(len(self._data), size)
+            if not chunk:
+                # file was truncated in the meantime
+                self._size = len(self._data)
+                break
+            self._data += chunk
+            self._block = min(2 * self._block, MAX_HEAD_BLOCK)
+
+    def readinto(self, b) -> int:
+        self._fetch(self._pos + len(b))
+        data = self._data[self._pos:self._pos + len(b)]
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def ranged_file(remote: IO) -> RangedFile:
+    """Raw stream reading remote sftp file in expanding blocks.
+
+    Each block is requested with one pipelined `readv` call so it costs one
+    round trip, the rest of the file is never read ahead.
+
+    Parameters
+    ----------
+    remote: paramiko.SFTPFile
+        file opened in binary mode
+    """
+    def read_range(offset: int, size: int) -> bytes:
+        return b"".join(remote.readv([(offset, size)]))
+
+    return RangedFile(read_range, remote.stat().st_size)
+
+
+@contextmanager
+def open_text(raw: IO, path: Optional[str] = None) -> Iterator[IO]:
+    """Open raw binary stream in text mode, decompress it if compressed.
+
+    Parameters
+    ----------
+    raw: IO
+        raw binary stream positioned at file start
+    path: Optional[str]
+        local path of the file, compressed local files are decompressed by
+        command line tool in separate process if it is installed
+
+    Yields
+    ------
+    IO
+        text mode file object
+    """
+    buffered = io.BufferedReader(raw)
+    kind = detect(buffered.peek(MAGIC_BYTES)[:MAGIC_BYTES])
+
+    if kind:
+        with open_decompressed(buffered, kind, path) as text:
+            yield text
+    else:
+        with io.TextIOWrapper(buffered, encoding="utf-8",
+                              errors="replace") as text:
+            yield text
+
+
+@contextmanager
+def open_mapped(path: str) -> Iterator[IO]:
+    """Open local file in text mode through memory map, without any copy.
+
+    Empty files cannot be memory mapped so they are opened normally.
+    Compressed files are decompressed on the fly.
+
+    Parameters
+    ----------
+    path: str
+        path to local file
+
+    Yields
+    ------
+    IO
+        text mode file object
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            with io.TextIOWrapper(f) as text:
+                yield text
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with open_text(MappedFile(mm), path) as text:
+                yield text
+
+
 def sizeof_fmt(num: float, suffix: str = 'B') -> str:
     for unit in ('', 'K', 'M', 'G', 'T', 'P', 'E', 'Z'):
         if abs(num) < 1024.0:
@@ -37,7 +390,7 @@ def timeit(what: str):
         log.debug(f"{what} execution time: {time() - t0:.2f}s")
 
 
-def input_parser() -> Dict[str, int]:
+def input_parser() -> Dict[str, Any]:
 
     p = argparse.ArgumentParser(
         description="Dash server app for plotting progress of simulations",
@@ -54,6 +407,35 @@ def input_parser() -> Dict[str, int]:
                    "user as one with invalid certificate")
     p.add_argument("-p", "--port", default="8050", type=str,
                    help="specify port for the dashboard")
+    p.add_argument("-s", "--server", default="dev",
+                   choices=("dev", "gunicorn", "waitress"),
+                   help="server to run the app in, 'dev' is the flask debug "
+                   "server, use gunicorn or waitress in production")
+    p.add_argument("-w", "--workers", default=4, type=int,
+                   help="number of worker processes, only for gunicorn")
+    p.add_argument("-t", "--threads", default=8, type=int,
+                   help="number of threads in each worker process")
+    p.add_argument("--certfile", default=None, type=str,
+                   help="ssl certificate file for production server")
+    p.add_argument("--keyfile", default=None, type=str,
+                   help="ssl key file for production server")
+    p.add_argument("-c", "--cache", default=None, type=str,
+                   help="cache backend shared by workers: 'sqlite', "
+                   "'sqlite:///path/to.db', 'redis://host:port/db' or "
+                   "'filesystem', overrides SIM_VISUALIZER_CACHE")
+    p.add_argument("--engine", default=None,
+                   choices=("pandas", "pyarrow", "numpy"),
+                   help="engine parsing data tables, unavailable engine "
+                   "falls back to pandas, overrides SIM_VISUALIZER_ENGINE")
+    p.add_argument("--agent", default=False, action="store_true",
+                   help="average plotted columns of big remote files on "
+                   "their host, needs numpy there, sets SIM_VISUALIZER_AGENT")
+    p.add_argument("--streams", default=None, type=int,
+                   help="number of concurrent streams transferring big "
+                   "remote files, overrides SIM_VISUALIZER_STREAMS")
+    p.add_argument("--chunk", default=None, type=float,
+                   help="size of byte range in MB fetched by one transfer "
+                   "stream, overrides SIM_VISUALIZER_CHUNK")
 
     return vars(p.parse_args())
 
@@ -64,6 +446,15 @@ def get_auth() -> Dict[str, str]:
     return {line.split(":")[0]: line.split(":")[1] for line in text}
 
 
+def get_admins() -> List[str]:
+    """Read names of users with access to admin pages, one per line."""
+    try:
+        text = (Path(__file__).parent / "data/admins.txt").read_text()
+    except FileNotFoundError:
+        return []
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
 def get_python() -> Path:
     """Get path of python executable.
 
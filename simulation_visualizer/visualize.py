@@ -1,25 +1,35 @@
 import logging
 import re
-from atexit import register as register_exit_hook
+from datetime import datetime
+from getpass import getuser
 from pathlib import Path
-from shutil import rmtree
-from tempfile import mkdtemp
+from tempfile import gettempdir
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
 import dash
 import dash_auth
-import plotly.express as px
-import plotly.graph_objects as go
 from dash import html
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 from flask_caching import Cache
 from typing_extensions import Literal
 
+from simulation_visualizer.cache_backends import get_cache_config
+from simulation_visualizer.data_cache import (build_pyramid, export_csv,
+                                              get_aggregated, get_df,
+                                              get_pyramid, get_tail,
+                                              pick_level, probe)
+from simulation_visualizer.indexer import search, start_crawler
 from simulation_visualizer.layout import serve_layout
-from simulation_visualizer.parser import DataExtractor
-from simulation_visualizer.path_completition import Suggest
-from simulation_visualizer.utils import get_auth, get_file_size, sizeof_fmt
+from simulation_visualizer.metrics import init_app as init_metrics
+from simulation_visualizer.metrics import instrument_callback, stage
+from simulation_visualizer.profiling import init_app as init_profiling
+from simulation_visualizer.profiling import profile_callback
+from simulation_visualizer.path_completition import (Suggest,
+                                                      invalidate_listings)
+from simulation_visualizer.utils import get_auth, sizeof_fmt
+from simulation_visualizer.watcher import (load_bookmarks, start_watcher,
+                                           toggle_bookmark)
 
 if TYPE_CHECKING:
     _DS = Dict[str, str]
@@ -30,20 +40,17 @@ log = logging.getLogger(f"simulation_visualizer.{__name__}")
 
 EXTERNAL_STYLESHEETS = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
 
-CACHEFILE = mkdtemp(prefix="sim_visualizer_cache_")
-CACHE_CONFIG = {
-    "CACHE_TYPE": "filesystem",
-    "CACHE_DIR": CACHEFILE,
-    "CACHE_DEFAULT_TIMEOUT": 60,
-    #'CACHE_TYPE': 'redis',
-    #'CACHE_REDIS_URL': os.environ.get('REDIS_URL', 'redis://localhost:6379')
-}
-SUGGESTION_SOCKET = "/tmp/user-{}-suggestion_server"
+# backend is selected by SIM_VISUALIZER_CACHE environment variable, it is
+# shared by all worker processes
+CACHE_CONFIG = get_cache_config()
+# one suggestion server is shared by all sessions
+SUGGESTION_SOCKET = Path(gettempdir()) / f"sim_visualizer-{getuser()}-suggestion_server"
 USER_LIST = get_auth()
 # expected address is: https://simulate.duckdns.org.visualize
 APACHE_URL_SUBDIR = "visualize"
-
-register_exit_hook(rmtree, CACHEFILE)
+# plots drawing each row as a point, others count or bin the rows so they
+# would be distorted by the bin means computed by the agent
+AGENT_PLOT_TYPES = ("line", "scatter", "line_3d", "scatter_3d")
 
 app = dash.Dash(
     __name__,
@@ -55,9 +62,10 @@ auth = dash_auth.BasicAuth(app, USER_LIST)
 cache = Cache()
 cache.init_app(app.server, config=CACHE_CONFIG)
 app.layout = serve_layout
+init_metrics(app.server, protect=auth.auth_wrapper)
+init_profiling(app.server, protect=auth.auth_wrapper)
 
 
-# TODO implement every n-th row save and plot
 @app.callback(
     Output("download", "data"),
     [Input("download-button", "n_clicks"), Input("session-id", "children")],
@@ -70,9 +78,15 @@ app.layout = serve_layout
         State("dimensionality-state", "value"),
         State("plot-type", "value"),
         State("download-type", "value"),
+        State("read-mode", "value"),
+        State("read-window", "value"),
+        State("read-stride", "value"),
+        State("read-sample", "value"),
     ],
     prevent_initial_call=True,
 )
+@instrument_callback
+@profile_callback
 def download_data(
     _,
     session_id: str,
@@ -84,11 +98,31 @@ def download_data(
     dimension: Literal["2D", "3D"],
     plot_type: str,
     download_type: str,
+    read_mode: str,
+    read_window: Optional[float],
+    read_stride: Optional[int],
+    read_sample: Optional[float],
 ) -> Dict[str, str]:
 
     log.info(f"requested download type is: {download_type}")
 
-    df = df_cache(path, host, session_id)
+    stride, sample = _read_options(read_stride, read_sample)
+    tail = read_mode != "all" and read_window
+
+    if download_type == "csv" and not tail:
+        # file that was not parsed yet is streamed to csv chunk by chunk
+        return {
+            "content": export_csv(cache, path, host, session_id, stride,
+                                  sample),
+            "filename": "data.csv",
+            "mimetype": "text/csv",
+        }
+
+    if tail:
+        df = get_tail(cache, path, host, session_id, read_mode, read_window,
+                      stride, sample)
+    else:
+        df = df_cache(path, host, session_id, stride, sample)
 
     if download_type == "csv":
         return {
@@ -97,9 +131,11 @@ def download_data(
             "mimetype": "text/csv",
         }
     elif download_type == "html":
-        fig = get_fig(
-            df, x_select, y_select, z_select, plot_type, dimension, host, path
-        )
+        with stage("figure_build", host=host):
+            fig = get_fig(
+                df, x_select, y_select, z_select, plot_type, dimension, host,
+                path
+            )
         return {
             "content": fig.to_html(include_plotlyjs="cdn"),
             "filename": "data.html",
@@ -122,9 +158,15 @@ def download_data(
         State("input-path", "value"),
         State("dimensionality-state", "value"),
         State("plot-type", "value"),
+        State("read-mode", "value"),
+        State("read-window", "value"),
+        State("read-stride", "value"),
+        State("read-sample", "value"),
     ],
     prevent_initial_call=True,
 )
+@instrument_callback
+@profile_callback
 def update_figure(
     _,
     session_id: str,
@@ -135,32 +177,138 @@ def update_figure(
     path: str,
     dimension: Literal["2D", "3D"],
     plot_type: str,
+    read_mode: str,
+    read_window: Optional[float],
+    read_stride: Optional[int],
+    read_sample: Optional[float],
 ) -> Tuple[Any, str]:
 
     if not path:
         raise PreventUpdate()
 
-    df = df_cache(path, host, session_id)
-
-    if not isinstance(df, Exception):
-
-        fig = get_fig(
-            df, x_select, y_select, z_select, plot_type, dimension, host, path
-        )
+    # tail windows are parsed separately from the whole file
+    stride, sample = _read_options(read_stride, read_sample)
+    if read_mode != "all" and read_window:
+        pyramid = get_tail(cache, path, host, session_id, read_mode,
+                           read_window, stride, sample)
+        if not isinstance(pyramid, Exception):
+            pyramid = build_pyramid(pyramid)
+    else:
+        pyramid = None
+        # averaged by agent on the remote host, only for point-wise plots
+        if stride == 1 and sample == 1 and plot_type in AGENT_PLOT_TYPES:
+            columns = [x_select]
+            for select in (y_select, z_select if dimension == "3D" else []):
+                columns.extend(select if isinstance(select, list)
+                               else [select])
+            aggregated = get_aggregated(cache, path, host, session_id,
+                                        columns)
+            if aggregated is not None:
+                pyramid = [aggregated]
+
+        if pyramid is None:
+            pyramid = get_pyramid(cache, path, host, session_id,
+                                  stride=stride, sample=sample)
+
+    if not isinstance(pyramid, Exception):
+
+        # plot only as many points as the browser can handle
+        with stage("figure_build", host=host):
+            fig = get_fig(
+                pick_level(pyramid), x_select, y_select, z_select, plot_type,
+                dimension, host, path
+            )
         warning = ""
     else:
         fig = dash.no_update
-        warning = f"Couln't read {host}@{path}.\nError: {df}"
+        warning = f"Couln't read {host}@{path}.\nError: {pyramid}"
 
     log.debug("figure ready, sending to user session")
     return fig, fig, warning
 
 
-@cache.memoize(timeout=600)
-def df_cache(path: str, host: str, session_id: str):
-    log.debug("dataframe not cached yet")
-    print("dataframe not cached yet")
-    return DataExtractor(path, host, session_id).extract()
+def df_cache(path: str, host: str, session_id: str, stride: int = 1,
+             sample: float = 1.0):
+    return get_df(cache, path, host, session_id, stride=stride,
+                  sample=sample)
+
+
+def _read_options(stride: Optional[int], sample: Optional[float]
+                  ) -> Tuple[int, float]:
+    """Sanitize stride and sample fraction inputs, empty means all rows."""
+    stride = max(int(stride or 1), 1)
+    sample = min(float(sample), 1.0) if sample and sample > 0 else 1.0
+    return stride, sample
+
+
+def start_bookmark_watcher():
+    """Start background thread keeping bookmarked files parsed in cache."""
+    return start_watcher(cache)
+
+
+def start_index_crawler():
+    """Start background thread periodically indexing configured hosts."""
+    return start_crawler(on_update=_crawled)
+
+
+def _crawled(host: str, roots: List[str]):
+    """Crawled roots were just walked, drop their stale path suggestions."""
+    for root in roots:
+        invalidate_listings(host, root, SUGGESTION_SOCKET)
+
+
+def _invalidate_parent(host: str, path: str):
+    """Drop listing of the file directory so suggestions show its new state."""
+    invalidate_listings(host, str(Path(path).parent), SUGGESTION_SOCKET)
+
+
+@app.callback(
+    Output("bookmark-list", "children"),
+    [Input("bookmark-button", "n_clicks")],
+    [State("input-host", "value"), State("input-path", "value")],
+    prevent_initial_call=False,
+)
+def update_bookmarks(n_clicks: Optional[int], host: str, path: str):
+
+    if n_clicks and host and path:
+        toggle_bookmark(host, path)
+        _invalidate_parent(host, path)
+
+    # links use the url sharing mechanism to load the bookmarked file, the
+    # prefix is kept so they work behind apache too
+    return [
+        html.Li(html.A(f"{h}@{p}", href=_file_link(h, p)))
+        for h, p in load_bookmarks()
+    ]
+
+
+def _file_link(host: str, path: str) -> str:
+    """Link loading file through the url sharing mechanism."""
+    return f"{app.get_relative_path(path)}#{host}"
+
+
+@app.callback(
+    Output("index-results", "children"),
+    [Input("index-query", "value")],
+)
+def search_index(query: Optional[str]):
+
+    if not query:
+        raise PreventUpdate
+
+    results = search(query)
+    if not results:
+        return [html.Li("No indexed files match the query")]
+
+    # same links as bookmarks, they use the url sharing mechanism
+    return [
+        html.Li([
+            html.A(f"{h}@{p}", href=_file_link(h, p)),
+            f" ({parser}, {sizeof_fmt(size)}, "
+            f"{datetime.fromtimestamp(mtime):%Y-%m-%d %H:%M})"
+        ])
+        for h, p, parser, size, mtime in results
+    ]
 
 
 def get_fig(
@@ -174,6 +322,10 @@ def get_fig(
     path: str,
 ) -> Any:
 
+    # plotly express is slow to import, load it only when it is needed
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     # surface cannot be done with plotly express
     if plot_type == "surface":
         fig = go.Figure(data=[go.Surface(z=df.values)])
@@ -228,6 +380,8 @@ def get_fig(
     ],
     prevent_initial_call=True,
 )
+@instrument_callback
+@profile_callback
 def update_axis_select(
     _,
     url: str,
@@ -247,17 +401,23 @@ def update_axis_select(
     elif event_id == "url-path" and addressbar_sw:
         host, path, x_sel, y_sel, z_sel, dim = parse_url(url)
         addressbar_sw = False
+    elif event_id == "submit-button" and host and path:
+        # file was submitted, next suggestions list its
+        # directory anew and show current sizes
+        _invalidate_parent(host, path)
 
+    # one round trip for size and header, plot and download reuse the result
     try:
-        data = DataExtractor(path, host, session_id).header()
+        probed = probe(cache, path, host, session_id)
     except FileNotFoundError:
         raise PreventUpdate(
             "File does not exist or path points to dir or you "
             "have insufficient permissions to read it"
         )
+    data = probed.header
     log.debug(f"got axis options: {data}")
 
-    byte_size = get_file_size(path, host)
+    byte_size = probed.size
     filesize_msg = f"File size is: {sizeof_fmt(byte_size)}"
 
     if byte_size > 1e6:
@@ -363,6 +523,8 @@ def update_output(host: str, filename: str):
     [State("url-path", "href")],
     prevent_initial_call=False,
 )
+@instrument_callback
+@profile_callback
 def suggest_path(host: str, filename: Optional[str], session_id: str, href: str):
 
     if not filename:
@@ -371,9 +533,11 @@ def suggest_path(host: str, filename: Optional[str], session_id: str, href: str)
     log.debug(f"url pathname: {filename}")
     log.info(f"unique user session id is: {session_id}")
 
-    dirs = Suggest("get_dirs")(
-        host, filename, Path(SUGGESTION_SOCKET.format(session_id))
+    entries = Suggest("get_entries")(
+        host, filename, SUGGESTION_SOCKET, session_id
     )
+    if entries is None:
+        raise PreventUpdate("superseded by newer request")
 
     log.debug(f"url href: {href}")
 
@@ -382,7 +546,12 @@ def suggest_path(host: str, filename: Optional[str], session_id: str, href: str)
     if APACHE_URL_SUBDIR in href and not filename.startswith(f"/{APACHE_URL_SUBDIR}"):
         filename = f"/{APACHE_URL_SUBDIR}{filename}"
 
-    return [html.Option(value=d) for d in dirs], filename, f"#{host}"
+    options = [
+        html.Option(value=path) if is_dir else
+        html.Option(value=path, label=sizeof_fmt(size))
+        for path, is_dir, size, _ in entries
+    ]
+    return options, filename, f"#{host}"
 
 
 def parse_url(url: str):
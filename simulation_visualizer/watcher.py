@@ -0,0 +1,340 @@
+"""Background watcher keeping bookmarked files parsed in cache.
+
+Bookmarks are stored in a json file so they are shared by all server
+processes. The watcher polls size, modification time and inode of all
+bookmarked files with one batched command per host. Of files that grew
+only the rows appended since the last poll are read and parsed, the whole
+file is parsed again only when it shrinks, is replaced or its parser does
+not declare data layout. Plotting a bookmarked file is then always served
+from warm cache.
+"""
+
+import fcntl
+import json
+import logging
+import mmap
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from typing import (IO, TYPE_CHECKING, Dict, Iterator, List, NamedTuple,
+                    Optional, Tuple, Union)
+
+from simulation_visualizer import shared_arrays
+from simulation_visualizer.compression import MAGIC_BYTES, detect
+from simulation_visualizer.data_cache import (cache_key, has_df, lookup_df,
+                                              store_df)
+from simulation_visualizer.metrics import count_transfer, stage
+from simulation_visualizer.parser import DataExtractor, FileParser, find_parser
+from simulation_visualizer.transfer import ParallelDownload, sftp_factory
+from simulation_visualizer.utils import (MappedFile, is_local, open_text,
+                                         read_range, stat_files)
+
+if TYPE_CHECKING:
+    from flask_caching import Cache
+    from pandas import DataFrame
+
+log = logging.getLogger(__name__)
+
+BOOKMARKS_FILE = Path(__file__).parent / "data" / "bookmarks.json"
+WATCHER_LOCK = BOOKMARKS_FILE.with_suffix(".lock")
+POLL_INTERVAL: int = 30
+WATCHER_SESSION_ID = "bookmark-watcher"
+
+_lock = threading.Lock()
+
+
+class _Parsed(NamedTuple):
+    """What the watcher knows about a parsed bookmarked file."""
+
+    stat: Tuple[int, float]
+    inode: int
+    # end of the last parsed line, None if the file cannot be refreshed
+    # incrementally, e.g. compressed file
+    offset: Optional[int]
+    parser: str
+    header: List[str]
+    # data part of the file ended, appended lines are not parsed
+    finished: bool = False
+
+
+@contextmanager
+def _map_prefix(host: str, path: str, size: int
+                ) -> Iterator[Tuple[mmap.mmap, Optional[int]]]:
+    """Map the file up to its last complete line within size bytes.
+
+    Lines written while the file is parsed are thus never half read.
+    Compressed files and files without newline are mapped whole. Remote
+    files are first transferred to a temporary file, the data are never
+    held in memory.
+
+    Yields
+    ------
+    Tuple[mmap.mmap, Optional[int]]
+        the mapped data and its length, None if the file is mapped whole
+    """
+    if is_local(host):
+        with _map_local(path, size) as mapped:
+            yield mapped
+        return
+
+    from ssh_utilities import Connection
+
+    with stage("ssh_connect", host=host):
+        conn = Connection(host, local=False, quiet=True)
+
+    with conn as c, TemporaryDirectory() as td:
+        local_path = str(Path(td) / "prefix")
+        download = ParallelDownload(sftp_factory(c.sftp), path, size,
+                                    local_path)
+        try:
+            with stage("transfer", host=host):
+                download.wait()
+        finally:
+            download.close()
+            count_transfer(download.fetched, host=host)
+
+        with _map_local(local_path, size) as mapped:
+            yield mapped
+
+
+@contextmanager
+def _map_local(path: str, size: int
+               ) -> Iterator[Tuple[mmap.mmap, Optional[int]]]:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            end = _complete(mm)
+        with mmap.mmap(f.fileno(), end or size,
+                       access=mmap.ACCESS_READ) as mm:
+            yield mm, end
+
+
+def _complete(data: Union[mmap.mmap, bytes]) -> Optional[int]:
+    """Length of data up to the last newline, None if there is none or the
+    data are compressed."""
+    if detect(bytes(data[:MAGIC_BYTES])):
+        return None
+    return data.rfind(b"\n", 0) + 1 or None
+
+
+def _finished(parser: FileParser, data: Union[mmap.mmap, bytes]) -> bool:
+    """Check if the data contain line that ends parser's data part."""
+    stop = (parser.agent_layout or (None, 0, None))[2]
+    if not stop:
+        return False
+    stop = stop.encode()
+    # mmap searches from its current position by default
+    return data[:len(stop)] == stop or data.find(b"\n" + stop, 0) >= 0
+
+
+def load_bookmarks() -> List[Tuple[str, str]]:
+    """Read list of bookmarked (host, path) pairs."""
+    try:
+        return [tuple(b) for b in json.loads(BOOKMARKS_FILE.read_text())]
+    except FileNotFoundError:
+        return []
+    except ValueError as e:
+        log.warning(f"bookmarks file is corrupted: {e}")
+        return []
+
+
+def _save_bookmarks(bookmarks: List[Tuple[str, str]]):
+
+    # write to temporary file first so readers never see partial content
+    BOOKMARKS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile("w", dir=BOOKMARKS_FILE.parent,
+                            delete=False) as f:
+        json.dump(bookmarks, f)
+    os.replace(f.name, BOOKMARKS_FILE)
+
+
+def toggle_bookmark(host: str, path: str) -> bool:
+    """Add (host, path) to bookmarks or remove it if already present.
+
+    Returns
+    -------
+    bool
+        True if bookmark was added, False if it was removed
+    """
+    with _lock:
+        bookmarks = load_bookmarks()
+        if (host, path) in bookmarks:
+            bookmarks.remove((host, path))
+            added = False
+        else:
+            bookmarks.append((host, path))
+            added = True
+        _save_bookmarks(bookmarks)
+
+    log.info(f"bookmark {host}@{path} {'added' if added else 'removed'}")
+    return added
+
+
+class BookmarkWatcher(threading.Thread):
+    """Daemon thread refreshing cached data of bookmarked files.
+
+    Parameters
+    ----------
+    cache: Cache
+        flask cache instance shared with the dash app
+    interval: int
+        polling interval in seconds
+    """
+
+    def __init__(self, cache: "Cache", interval: int = POLL_INTERVAL):
+        super().__init__(name="bookmark-watcher", daemon=True)
+        self._cache = cache
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._seen: Dict[Tuple[str, str], _Parsed] = {}
+
+    def run(self):
+        log.info("bookmark watcher started")
+        while not self._stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                log.exception(f"bookmark watcher poll failed: {e}")
+            self._stop_event.wait(self._interval)
+
+    def stop(self):
+        """Signal the watcher to exit after current poll."""
+        self._stop_event.set()
+
+    def poll(self):
+        """Check all bookmarked files and refresh the changed ones."""
+        by_host: Dict[str, List[str]] = defaultdict(list)
+        for host, path in load_bookmarks():
+            by_host[host].append(path)
+
+        for host, paths in by_host.items():
+            try:
+                stats = stat_files(host, paths, inode=True)
+            except Exception as e:
+                log.warning(f"could not stat bookmarked files on {host}: {e}")
+                continue
+
+            for path, (size, mtime, inode) in stats.items():
+                self._refresh(host, path, (size, mtime), inode)
+
+    def _refresh(self, host: str, path: str, stat: Tuple[int, float],
+                 inode: int):
+
+        seen = self._seen.get((host, path))
+        if not stat[0]:
+            # nothing written yet, empty file cannot be mapped
+            return
+        # skip if the file has not changed and is still cached
+        if seen and seen.stat == stat and has_df(self._cache, path, host,
+                                                 stat):
+            return
+
+        parsed = None
+        if (seen and seen.offset is not None and seen.inode == inode and
+                seen.offset <= stat[0]):
+            parsed = self._append(host, path, seen, stat)
+        if parsed is None:
+            log.debug(f"parsing bookmarked file {host}@{path}")
+            parsed = self._parse(host, path, stat, inode)
+
+        if parsed:
+            df, self._seen[(host, path)] = parsed
+            store_df(self._cache, path, host, stat, df)
+            if seen and seen.stat != stat:
+                # let the superseded version go, attached arrays stay valid
+                shared_arrays.release(cache_key("df", path, host, seen.stat))
+                shared_arrays.evict()
+
+    def _parse(self, host: str, path: str, stat: Tuple[int, float],
+               inode: int) -> Optional[Tuple["DataFrame", _Parsed]]:
+        """Parse the whole file."""
+        extractor = DataExtractor(path, host, WATCHER_SESSION_ID)
+        header = extractor.header()
+        if isinstance(header, Exception):
+            log.warning(f"could not parse bookmarked file {host}@{path}: "
+                        f"{header}")
+            return None
+
+        parser = find_parser(extractor.detected)
+        try:
+            with stage("parse", parser.name, host), \
+                    _map_prefix(host, path, stat[0]) as (mm, offset):
+                with open_text(MappedFile(mm)) as f:
+                    df = parser.extract_data(path, host, f)
+                finished = _finished(parser, mm)
+        except Exception as e:
+            log.warning(f"could not parse bookmarked file {host}@{path}: "
+                        f"{e}")
+            return None
+
+        if parser.agent_layout is None:
+            offset = None
+        return df, _Parsed(stat, inode, offset, parser.name, header[0],
+                           finished)
+
+    def _append(self, host: str, path: str, seen: _Parsed,
+                stat: Tuple[int, float]
+                ) -> Optional[Tuple["DataFrame", _Parsed]]:
+        """Parse lines appended since the last refresh and add them to the
+        cached dataframe, None if it has to be parsed whole."""
+        import pandas as pd
+
+        df = lookup_df(self._cache, cache_key("df", path, host, seen.stat),
+                       host)
+        if df is None:
+            return None
+        if seen.finished:
+            return df, seen._replace(stat=stat)
+
+        parser = find_parser(seen.parser)
+        try:
+            data = read_range(host, path, seen.offset, stat[0] - seen.offset)
+            data = data[:data.rfind(b"\n") + 1]
+            with stage("parse", parser.name, host):
+                new = parser.parse_lines(
+                    StringIO(data.decode("utf-8", "replace")), seen.header
+                )
+        except Exception as e:
+            log.warning(f"could not parse rows appended to {host}@{path}, "
+                        f"parsing whole file: {e}")
+            return None
+
+        log.debug(f"appended {len(new)} rows to {host}@{path}")
+        if len(new):
+            df = pd.concat([df, new], ignore_index=True)
+        return df, seen._replace(stat=stat, offset=seen.offset + len(data),
+                                 finished=_finished(parser, data))
+
+
+_watcher: Optional[BookmarkWatcher] = None
+_lock_file: Optional[IO] = None
+
+
+def start_watcher(cache: "Cache", interval: int = POLL_INTERVAL
+                  ) -> Optional[BookmarkWatcher]:
+    """Start bookmark watcher, only one watcher runs on the machine.
+
+    The cache is shared by all worker processes so the first process that
+    acquires the lock file runs the watcher and holds the lock until it exits.
+    """
+    global _watcher, _lock_file
+
+    if _lock_file is None:
+        BOOKMARKS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(WATCHER_LOCK, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            log.debug("bookmark watcher is running in another process")
+            return _watcher
+        _lock_file = lock_file
+
+    if not _watcher or not _watcher.is_alive():
+        _watcher = BookmarkWatcher(cache, interval=interval)
+        _watcher.start()
+
+    return _watcher
@@ -0,0 +1,126 @@
+"""Production WSGI entry point.
+
+Can be used directly by any WSGI server, e.g.:
+
+    gunicorn --workers 4 --threads 8 --bind 0.0.0.0:8050 \\
+        -c python:simulation_visualizer.gunicorn_conf \\
+        simulation_visualizer.wsgi:application
+
+or through `visualizer --server gunicorn` which calls `serve`. All workers
+share the cache selected by SIM_VISUALIZER_CACHE environment variable and
+write metrics to one PROMETHEUS_MULTIPROC_DIR, the config hooks empty it on
+start and drop metrics of exited workers.
+
+Bookmark watcher and index crawler threads are started in the worker
+processes, never on import, which may happen in gunicorn master before it
+forks the workers. Gunicorn starts them by `post_fork` hook, other servers
+on the first request.
+"""
+
+import logging
+import os
+import threading
+from typing import Callable, Iterable, Optional
+
+from simulation_visualizer.visualize import (app, start_bookmark_watcher,
+                                              start_index_crawler)
+
+log = logging.getLogger(__name__)
+
+_started_in: Optional[int] = None
+_start_lock = threading.Lock()
+
+
+def start_background_threads():
+    """Start watcher and crawler once in this process.
+
+    Only one process on the machine wins the watcher and crawler lock, the
+    others skip them.
+    """
+    global _started_in
+
+    if _started_in == os.getpid():
+        return
+    with _start_lock:
+        if _started_in != os.getpid():
+            start_bookmark_watcher()
+            start_index_crawler()
+            _started_in = os.getpid()
+
+
+def application(environ: dict, start_response: Callable) -> Iterable[bytes]:
+    """WSGI entry point, starts background threads in serving process."""
+    start_background_threads()
+    return app.server(environ, start_response)
+
+
+def serve(server: str, host: str, port: str, workers: int, threads: int,
+          certfile: Optional[str] = None, keyfile: Optional[str] = None,
+          wsgi_app: Callable = application):
+    """Run app in production WSGI server.
+
+    Parameters
+    ----------
+    server: str
+        'gunicorn' (multi process, multi thread) or 'waitress' (one process,
+        multi thread)
+    host: str
+        address to bind to
+    port: str
+        port to bind to
+    workers: int
+        number of worker processes, ignored by waitress
+    threads: int
+        number of threads in each worker
+    certfile: Optional[str]
+        ssl certificate, only supported by gunicorn
+    keyfile: Optional[str]
+        ssl key, only supported by gunicorn
+    wsgi_app: Callable
+        WSGI application to serve
+    """
+    log.info(f"starting {server} server on {host}:{port} with {workers} "
+             f"workers and {threads} threads")
+
+    if server == "gunicorn":
+        from gunicorn.app.base import BaseApplication
+
+        from simulation_visualizer import gunicorn_conf
+
+        options = {
+            "bind": f"{host}:{port}",
+            "workers": workers,
+            "threads": threads,
+            "certfile": certfile,
+            "keyfile": keyfile,
+            "on_starting": gunicorn_conf.on_starting,
+            "post_fork": gunicorn_conf.post_fork,
+            "child_exit": gunicorn_conf.child_exit,
+        }
+
+        class GunicornApp(BaseApplication):
+
+            def load_config(self):
+                for key, value in options.items():
+                    if value is not None:
+                        self.cfg.set(key, value)
+
+            def load(self):
+                return wsgi_app
+
+        GunicornApp().run()
+
+    elif server == "waitress":
+        from waitress import serve as waitress_serve
+
+        from simulation_visualizer.metrics import reset_multiproc_dir
+
+        reset_multiproc_dir()
+
+        if certfile or keyfile:
+            log.warning("waitress does not support ssl, put it behind a "
+                        "reverse proxy for https")
+        waitress_serve(wsgi_app, host=host, port=int(port), threads=threads)
+
+    else:
+        raise ValueError(f"unsupported WSGI server: {server}")
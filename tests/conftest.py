@@ -0,0 +1,41 @@
+from pathlib import Path
+from socket import gethostname
+
+import pytest
+
+from simulation_visualizer import shared_arrays
+from simulation_visualizer.cache_backends import SQLiteCache
+from tests.generators import GENERATORS
+
+
+@pytest.fixture(autouse=True)
+def shared_dir(tmp_path: Path, monkeypatch) -> Path:
+    """Publish shared arrays to temporary directory, not to /dev/shm."""
+    directory = tmp_path / "shm"
+    monkeypatch.setattr(shared_arrays, "SHARED_DIR", directory)
+    yield directory
+    for key in list(shared_arrays._attached):
+        shared_arrays.release(key)
+
+
+@pytest.fixture
+def host() -> str:
+    """Name of this machine, files on it are read without ssh."""
+    return gethostname().lower()
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> SQLiteCache:
+    return SQLiteCache(str(tmp_path / "cache.db"), default_timeout=600)
+
+
+@pytest.fixture
+def make_file(tmp_path: Path):
+    """Write synthetic file of benchmark generator kind, return its path."""
+
+    def make(kind: str, size: int = 200 * 1024) -> Path:
+        path = tmp_path / kind
+        GENERATORS[kind](path, size)
+        return path
+
+    return make
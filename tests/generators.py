@@ -0,0 +1,127 @@
+"""Generators of synthetic data files for all supported formats.
+
+The files are written in blocks of pre-formatted rows so even multi GB files
+are generated quickly. Values are random, only the layout matters.
+"""
+
+import io
+from pathlib import Path
+from tempfile import gettempdir
+from typing import Callable, Dict, List
+
+import numpy as np
+
+BLOCK_ROWS: int = 20000
+DEFAULT_DIR = Path(gettempdir()) / "sim_visualizer_bench"
+
+_LCURVE_V1 = ("batch", "l2_tst", "l2_trn", "l2_e_tst", "l2_e_trn", "l2_f_tst",
+              "l2_f_trn", "l2_v_tst", "l2_v_trn", "lr")
+_LCURVE_V2 = ("step", "rmse_val", "rmse_trn", "rmse_e_val", "rmse_e_trn",
+              "rmse_f_val", "rmse_f_trn", "rmse_v_val", "rmse_v_trn", "lr")
+_DEVI_V1 = ("step", "max_devi_e", "min_devi_e", "avg_devi_e", "max_devi_f",
+            "min_devi_f", "avg_devi_f")
+_DEVI_V2 = ("step", "max_devi_v", "min_devi_v", "avg_devi_v", "max_devi_f",
+            "min_devi_f", "avg_devi_f")
+_THERMO = ("step", "temp", "pe", "ke", "etotal", "press", "vol")
+
+
+def _rows(n_cols: int, fmt: str = "%.6e") -> bytes:
+    """Format one block of random rows, first column is integer step."""
+    data = np.random.default_rng(0).random((BLOCK_ROWS, n_cols))
+    data[:, 0] = np.arange(BLOCK_ROWS)
+    buf = io.BytesIO()
+    np.savetxt(buf, data, fmt=["%d"] + [fmt] * (n_cols - 1))
+    return buf.getvalue()
+
+
+def _fill(path: Path, size: int, head: str, block: bytes, tail: str = ""):
+    """Write header and repeat data block until file reaches size."""
+    with path.open("wb") as f:
+        f.write(head.encode())
+        written = len(head)
+        while written < size:
+            f.write(block)
+            written += len(block)
+        f.write(tail.encode())
+
+
+def write_colvar(path: Path, size: int, n_cols: int = 6):
+    """PLUMED COLVAR file."""
+    labels = ["time"] + [f"cv{i}" for i in range(1, n_cols)]
+    _fill(path, size, f"#! FIELDS {' '.join(labels)}\n", _rows(n_cols))
+
+
+def write_lcurve_v1(path: Path, size: int):
+    """DeePMD-kit v1 lcurve.out file."""
+    # v1 header regex requires double spaces between labels
+    _fill(path, size, "# " + "  ".join(_LCURVE_V1) + "\n",
+          _rows(len(_LCURVE_V1)))
+
+
+def write_lcurve_v2(path: Path, size: int):
+    """DeePMD-kit v2 lcurve.out file."""
+    _fill(path, size, "# " + "  ".join(_LCURVE_V2) + "\n",
+          _rows(len(_LCURVE_V2)))
+
+
+def write_model_devi(path: Path, size: int, version: int = 2,
+                     atoms: int = 0):
+    """DeePMD-kit model_devi.out file, optionally with atomic 3N columns."""
+    labels = _DEVI_V1 if version == 1 else _DEVI_V2
+    _fill(path, size, "# " + " ".join(labels) + "\n",
+          _rows(len(labels) + 3 * atoms, fmt="%.4e"))
+
+
+def write_lammps_log(path: Path, size: int):
+    """LAMMPS log file with custom thermo style."""
+    head = (
+        "LAMMPS (29 Oct 2020)\n"
+        "units metal\n"
+        f"thermo_style custom {' '.join(_THERMO)}\n"
+        "thermo 100\n"
+        "run 1000000\n"
+        "Per MPI rank memory allocation (min/avg/max) = 4.1 | 4.1 | 4.1 "
+        "Mbytes\n"
+        f"{' '.join(s.capitalize() for s in _THERMO)}\n"
+    )
+    tail = "Loop time of 100.0 on 1 procs for 1000000 steps with 64 atoms\n"
+    _fill(path, size, head, _rows(len(_THERMO)), tail)
+
+
+GENERATORS: Dict[str, Callable[[Path, int], None]] = {
+    "colvar": write_colvar,
+    "lcurve_v1": write_lcurve_v1,
+    "lcurve_v2": write_lcurve_v2,
+    "model_devi_v1": lambda p, s: write_model_devi(p, s, version=1),
+    "model_devi_v2": lambda p, s: write_model_devi(p, s, version=2),
+    "model_devi_atomic": lambda p, s: write_model_devi(p, s, atoms=64),
+    "lammps_log": write_lammps_log,
+}
+
+
+def parse_size(size: str) -> int:
+    """Convert human readable size e.g. 10MB to bytes."""
+    units = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+    for unit, factor in units.items():
+        if size.upper().endswith(unit):
+            return int(float(size[:-len(unit)]) * factor)
+    return int(size)
+
+
+def generate(kind: str, size: str, directory: Path = DEFAULT_DIR) -> Path:
+    """Generate file of given kind and size, reuse it if it already exists.
+
+    Returns
+    -------
+    Path
+        path to generated file
+    """
+    path = directory / f"{kind}-{size}.dat"
+    if not path.is_file():
+        directory.mkdir(parents=True, exist_ok=True)
+        GENERATORS[kind](path, parse_size(size))
+    return path
+
+
+def available() -> List[str]:
+    return list(GENERATORS)
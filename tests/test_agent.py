@@ -0,0 +1,98 @@
+import gzip
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation_visualizer import agent, data_cache
+from simulation_visualizer.parser import DataExtractor, find_parser
+
+POINTS = 100
+
+
+def _parsed(host, path):
+    extractor = DataExtractor(str(path), host, "test")
+    return extractor.extract(), find_parser(extractor.detected).agent_layout
+
+
+def _bin_means(df, points):
+    """Reference bins, smallest power of two size giving at most points."""
+    size = 1
+    while -(-len(df) // size) > points:
+        size *= 2
+    return df.groupby(np.arange(len(df)) // size).mean().reset_index(
+        drop=True)
+
+
+@pytest.mark.parametrize("kind", ["colvar", "lcurve_v2", "lammps_log"])
+def test_bin_means_match_pandas(kind, host, make_file):
+    path = make_file(kind)
+    df, layout = _parsed(host, path)
+    columns = [0, 2]
+
+    means = agent.aggregate(host, str(path), layout, list(df.columns),
+                            columns, POINTS)
+
+    expected = _bin_means(df.iloc[:, columns].astype(np.float64), POINTS)
+    assert len(means) <= POINTS
+    pd.testing.assert_frame_equal(means, expected)
+
+
+def test_compressed_input(host, make_file, tmp_path):
+    path = make_file("colvar")
+    packed = tmp_path / "COLVAR.gz"
+    with open(path, "rb") as src, \
+            gzip.open(packed, "wb", compresslevel=1) as dst:
+        shutil.copyfileobj(src, dst)
+    df, layout = _parsed(host, path)
+    names = list(df.columns)
+
+    pd.testing.assert_frame_equal(
+        agent.aggregate(host, str(packed), layout, names, [0, 1], POINTS),
+        agent.aggregate(host, str(path), layout, names, [0, 1], POINTS)
+    )
+
+
+def test_no_data_rows(host, make_file):
+    path = make_file("colvar")
+    df, _ = _parsed(host, path)
+    # start of lammps data never appears in colvar file
+    layout = find_parser("LAMMPS-MetaD").agent_layout
+
+    with pytest.raises(agent.AgentUnavailable):
+        agent.aggregate(host, str(path), layout, list(df.columns), [0, 1])
+
+
+@pytest.fixture
+def agent_mode(monkeypatch):
+    """Use agent for the local files as if they were remote."""
+    monkeypatch.setenv(agent.AGENT_ENV, "1")
+    monkeypatch.setattr(agent, "AGENT_MIN_BYTES", 0)
+    monkeypatch.setattr(data_cache, "is_local", lambda host: False)
+
+
+def test_unavailable_agent_falls_back_to_transfer(cache, host, make_file,
+                                                  agent_mode, monkeypatch):
+    path = str(make_file("colvar"))
+    names = list(_parsed(host, path)[0].columns)
+    # remote python without numpy
+    monkeypatch.setattr(agent, "AGENT_SCRIPT",
+                        f"import sys; sys.exit({agent.UNAVAILABLE})")
+
+    assert data_cache.get_aggregated(cache, path, host, "test",
+                                     names[:2]) is None
+
+
+def test_aggregated_columns_are_cached(cache, host, make_file, agent_mode,
+                                       monkeypatch):
+    path = str(make_file("colvar"))
+    names = list(_parsed(host, path)[0].columns)
+
+    df = data_cache.get_aggregated(cache, path, host, "test", names[:2])
+    monkeypatch.setattr(agent, "AGENT_SCRIPT", "import sys; sys.exit(1)")
+
+    assert list(df.columns) == names[:2]
+    pd.testing.assert_frame_equal(
+        data_cache.get_aggregated(cache, path, host, "test", names[:2]), df
+    )
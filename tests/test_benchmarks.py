@@ -0,0 +1,49 @@
+import pytest
+
+from benchmarks import parsers as parser_benchmark
+from simulation_visualizer.parser import DataExtractor
+from tests.generators import GENERATORS, generate, parse_size
+
+DETECTED = {
+    "colvar": "Plumed-COLVAR",
+    "lcurve_v1": "DeepMD-lcurve-v1",
+    "lcurve_v2": "DeepMD-lcurve-v2",
+    "model_devi_v1": "DeepMD-model_deviation-v1",
+    "model_devi_v2": "DeepMD-model_deviation-v2",
+    "model_devi_atomic": "DeepMD-model_deviation-v2",
+    "lammps_log": "LAMMPS-MetaD",
+}
+
+
+@pytest.mark.parametrize("kind", list(GENERATORS))
+def test_generated_file_is_recognized(kind, host, make_file):
+    path = make_file(kind, size=64 * 1024)
+    extractor = DataExtractor(str(path), host, "test")
+
+    df = extractor.extract()
+
+    assert extractor.detected == DETECTED[kind]
+    assert path.stat().st_size >= 64 * 1024
+    assert len(df) and not df.isna().any().any()
+
+
+def test_parse_size():
+    assert parse_size("64KB") == 64 * 1024
+    assert parse_size("1.5mb") == int(1.5 * 1024 ** 2)
+    assert parse_size("1000") == 1000
+
+
+def test_generated_file_is_reused(tmp_path):
+    path = generate("colvar", "64KB", tmp_path)
+    path.write_text("kept\n")
+
+    assert generate("colvar", "64KB", tmp_path) == path
+    assert path.read_text() == "kept\n"
+
+
+def test_benchmark_times_handling_parser(tmp_path):
+    results = parser_benchmark.run(["colvar"], ["64KB"], tmp_path, 1, [None])
+
+    handled = [r for r in results if r["handled"]]
+    assert [r["parser"] for r in handled] == ["PlumedMetaDParser"]
+    assert handled[0]["rows"] > 0 and handled[0]["data_s"] > 0
@@ -0,0 +1,108 @@
+import multiprocessing
+import threading
+
+import numpy as np
+import pytest
+
+from simulation_visualizer import cache_backends
+from simulation_visualizer.cache_backends import SQLiteCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time seen by the cache."""
+    now = [1000.0]
+    monkeypatch.setattr(cache_backends, "time", lambda: now[0])
+    return now
+
+
+def test_items_expire(cache, clock):
+    cache.set("short", 1, timeout=10)
+    cache.set("forever", 2, timeout=0)
+    assert cache.has("short") and cache.get("short") == 1
+
+    clock[0] += 11
+    assert not cache.has("short")
+    assert cache.get("short") is None
+    assert cache.get("forever") == 2
+
+
+def test_expired_items_are_pruned(cache, clock):
+    big = np.zeros(cache_backends.INLINE_LIMIT // 4)
+    cache.set("big", big, timeout=10)
+    blobs = list(cache._blob_dir.iterdir())
+    assert len(blobs) == 1
+
+    clock[0] += 11
+    cache.set("other", 1)
+
+    # expired item is deleted on the next write together with its file
+    assert cache._db.execute("SELECT key FROM cache").fetchall() == \
+        [("other",)]
+    assert not blobs[0].exists()
+
+
+def test_threshold_drops_oldest(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), threshold=3)
+    for key in "abcd":
+        cache.set(key, key)
+    # replacing item makes it the newest
+    cache.set("b", "b2")
+    cache.set("e", "e")
+
+    assert [k for k in "abcde" if cache.has(k)] == ["b", "d", "e"]
+    assert cache.get("b") == "b2"
+
+
+def test_big_values_round_trip(cache):
+    big = np.arange(cache_backends.INLINE_LIMIT // 4, dtype=np.float64)
+    cache.set("big", big)
+
+    np.testing.assert_array_equal(cache.get("big"), big)
+    assert cache.delete("big")
+    assert not any(cache._blob_dir.iterdir())
+
+
+def _write(path, key):
+    SQLiteCache(path).set(key, {"pid": key})
+
+
+def test_shared_between_processes(cache):
+    path = str(cache._path)
+    process = multiprocessing.get_context("spawn").Process(
+        target=_write, args=(path, "child")
+    )
+    process.start()
+    process.join(60)
+
+    assert cache.get("child") == {"pid": "child"}
+
+
+def test_inline_value_replaces_blob(cache):
+    cache.set("key", np.zeros(cache_backends.INLINE_LIMIT // 4))
+    cache.set("key", 1)
+
+    assert cache.get("key") == 1
+    assert not any(cache._blob_dir.iterdir())
+
+
+def test_threads_write_same_big_key(cache):
+    values = [np.full(cache_backends.INLINE_LIMIT // 4, i, dtype=np.float64)
+              for i in range(8)]
+    barrier = threading.Barrier(len(values))
+
+    def write(value):
+        barrier.wait()
+        for _ in range(5):
+            cache.set("big", value)
+
+    threads = [threading.Thread(target=write, args=(v,)) for v in values]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # whole value of one of the writers, no leftover temporary files
+    stored = cache.get("big")
+    assert (stored == stored[0]).all() and stored[0] in range(8)
+    assert len(list(cache._blob_dir.iterdir())) == 1
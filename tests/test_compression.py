@@ -0,0 +1,109 @@
+import bz2
+import gzip
+import lzma
+import shutil
+import subprocess
+
+import pytest
+
+from simulation_visualizer import compression, data_cache
+from simulation_visualizer.compression import decompress_head, detect
+from simulation_visualizer.utils import PROBE_BYTES, open_text
+
+
+def _zstd(src, dst):
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        subprocess.run(["zstd", "-q", "-1", "-c"], stdin=s, stdout=d,
+                       check=True)
+
+
+def _stream(opener, **kwargs):
+
+    def compress(src, dst):
+        with open(src, "rb") as s, opener(dst, "wb", **kwargs) as d:
+            shutil.copyfileobj(s, d)
+
+    return compress
+
+
+COMPRESSORS = {
+    "gzip": _stream(gzip.open, compresslevel=1),
+    "bz2": _stream(bz2.open),
+    "xz": _stream(lzma.open, preset=0),
+    "zstd": _zstd,
+}
+
+
+def _has_zstandard():
+    try:
+        compression._zstandard()
+    except ImportError:
+        return False
+    return True
+
+
+@pytest.fixture(params=list(COMPRESSORS))
+def packed(request, make_file, tmp_path):
+    """Compressed colvar file and the plain original."""
+    kind = request.param
+    if kind == "zstd" and not shutil.which("zstd"):
+        pytest.skip("zstd command line tool is not installed")
+    path = make_file("colvar")
+    packed = tmp_path / f"COLVAR.{kind}"
+    COMPRESSORS[kind](path, packed)
+    return kind, packed, path
+
+
+def test_detect(packed):
+    kind, packed, path = packed
+
+    with open(packed, "rb") as f:
+        assert detect(f.read(compression.MAGIC_BYTES)) == kind
+    with open(path, "rb") as f:
+        assert detect(f.read(compression.MAGIC_BYTES)) is None
+
+
+@pytest.mark.parametrize("tool", [True, False])
+def test_open_text(packed, tool, monkeypatch):
+    kind, packed, path = packed
+    if not tool:
+        monkeypatch.setattr(compression, "_tool", lambda kind: None)
+        if kind == "zstd" and not _has_zstandard():
+            pytest.skip("zstandard package is not installed")
+
+    with open(packed, "rb", buffering=0) as raw:
+        with open_text(raw, str(packed)) as f:
+            # rewinding after the header restarts decompression
+            first = f.readline()
+            f.seek(0)
+            text = f.read()
+
+    assert text == path.read_text()
+    assert text.startswith(first)
+
+
+def test_decompress_head_of_truncated_file(packed):
+    kind, packed, path = packed
+    if kind == "bz2":
+        pytest.skip("bz2 outputs nothing before the whole block is read")
+    data = packed.read_bytes()
+
+    head = decompress_head(data[:len(data) // 2], kind)
+
+    assert head
+    assert path.read_bytes().startswith(head)
+
+
+def test_bz2_header_read_past_probed_head(make_file, tmp_path, cache, host):
+    path = make_file("colvar", size=2 * 1024 ** 2)
+    packed = tmp_path / "COLVAR.bz2"
+    COMPRESSORS["bz2"](path, packed)
+    # first block is bigger than the probed head and cannot be decompressed
+    assert not decompress_head(packed.read_bytes()[:PROBE_BYTES], "bz2")
+
+    probed = data_cache.probe(cache, str(packed), host, "test")
+
+    expected = data_cache.probe(cache, str(path), host, "test")
+    assert probed.compression == "bz2"
+    assert probed.parser == expected.parser
+    assert probed.header == expected.header
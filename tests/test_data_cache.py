@@ -0,0 +1,88 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation_visualizer import data_cache, shared_arrays
+
+
+def test_has_df_sees_shared_memory(cache, host):
+    stat = (1, 1.0)
+    df = pd.DataFrame({"time": np.arange(200000.0), "cv": np.zeros(200000)})
+    assert not data_cache.has_df(cache, "/COLVAR", host, stat)
+
+    data_cache.store_df(cache, "/COLVAR", host, stat, df)
+    # big frames go to shared memory only
+    assert not cache.has(data_cache.cache_key("df", "/COLVAR", host, stat))
+    assert data_cache.has_df(cache, "/COLVAR", host, stat)
+
+
+FORMATS = ["colvar", "lcurve_v1", "lcurve_v2", "model_devi_v1",
+           "model_devi_atomic", "lammps_log"]
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    """Read tails in blocks much smaller than the test files."""
+    monkeypatch.setattr(data_cache, "TAIL_BLOCK", 16 * 1024)
+
+
+@pytest.mark.parametrize("kind", FORMATS)
+def test_tail_rows_match_whole_file(kind, cache, host, make_file,
+                                    small_blocks):
+    path = str(make_file(kind))
+    full = data_cache.get_df(cache, path, host, "test")
+    assert not isinstance(full, Exception), full
+
+    tail = data_cache.get_tail(cache, path, host, "test", "rows", 300)
+    assert not isinstance(tail, Exception), tail
+    pd.testing.assert_frame_equal(tail.reset_index(drop=True),
+                                  full.iloc[-300:].reset_index(drop=True))
+
+
+@pytest.mark.parametrize("kind", FORMATS)
+def test_tail_time_window(kind, cache, host, make_file, small_blocks):
+    path = str(make_file(kind))
+    full = data_cache.get_df(cache, path, host, "test")
+    x = full.iloc[:, 0]
+
+    tail = data_cache.get_tail(cache, path, host, "test", "time", 1000)
+    assert not isinstance(tail, Exception), tail
+    pd.testing.assert_frame_equal(
+        tail.reset_index(drop=True),
+        full[x >= x.iloc[-1] - 1000].reset_index(drop=True)
+    )
+
+
+def test_tail_of_compressed_file(cache, host, make_file, small_blocks):
+    plain = make_file("colvar")
+    path = plain.with_suffix(".gz")
+    path.write_bytes(gzip.compress(plain.read_bytes()))
+
+    tail = data_cache.get_tail(cache, str(path), host, "test", "rows", 300)
+    full = data_cache.get_df(cache, str(plain), host, "test")
+    pd.testing.assert_frame_equal(tail, full.iloc[-300:])
+
+
+def test_tail_errors_are_returned(cache, host, make_file, small_blocks,
+                                  monkeypatch):
+    path = str(make_file("colvar"))
+
+    def fail(*args):
+        raise OSError("connection lost")
+
+    monkeypatch.setattr(data_cache, "read_range", fail)
+    tail = data_cache.get_tail(cache, path, host, "test", "rows", 10)
+    assert isinstance(tail, OSError)
+
+
+def test_redis_cache_bypasses_shared_memory(cache, host, monkeypatch):
+    monkeypatch.setenv("SIM_VISUALIZER_CACHE", "redis://localhost:6379/0")
+    df = pd.DataFrame({"time": np.arange(200000.0)})
+
+    data_cache.store_df(cache, "/COLVAR", host, (1, 1.0), df)
+
+    key = data_cache.cache_key("df", "/COLVAR", host, (1, 1.0))
+    assert not shared_arrays.exists(key)
+    pd.testing.assert_frame_equal(cache.get(key), df)
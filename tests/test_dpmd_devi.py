@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation_visualizer.parser import find_parser
+from simulation_visualizer.parsers import dpmd_devi
+
+DEVI = "DeepMD-model_deviation-v2"
+
+
+@pytest.fixture
+def atomic(make_file):
+    return str(make_file("model_devi_atomic"))
+
+
+def _full_parse(path):
+    """Reference parse tokenizing every column of the file."""
+    with open(path) as f:
+        header = f.readline().lstrip("#").split()
+        data = np.loadtxt(f)
+    return data, header
+
+
+def test_prefix_cut_matches_full_parse(atomic, host):
+    parser = find_parser(DEVI)
+    data, header = _full_parse(atomic)
+
+    df = parser.extract_data(atomic, host)
+
+    assert list(df.columns) == header
+    assert df.dtypes.iloc[0] == np.int64
+    np.testing.assert_allclose(df.to_numpy(dtype=np.float64),
+                               data[:, :dpmd_devi.DEVI_COLUMNS])
+
+
+def test_short_prefix_reads_whole_line(atomic, host, monkeypatch):
+    parser = find_parser(DEVI)
+    expected = parser.extract_data(atomic, host)
+
+    # prefix ends inside the deviation columns
+    monkeypatch.setattr(dpmd_devi, "PREFIX_BYTES", 16)
+
+    pd.testing.assert_frame_equal(parser.extract_data(atomic, host),
+                                  expected)
+
+
+def test_without_atomic_columns(make_file, host):
+    path = str(make_file("model_devi_v2"))
+    data, _ = _full_parse(path)
+
+    df = find_parser(DEVI).extract_data(path, host)
+
+    np.testing.assert_allclose(df.to_numpy(dtype=np.float64), data)
+
+
+def test_extract_atomic_matches_full_parse(atomic, host):
+    data, _ = _full_parse(atomic)
+    frames = [7, 0, len(data) - 1, 7]
+
+    forces = find_parser(DEVI).extract_atomic(atomic, host, frames)
+
+    np.testing.assert_array_equal(forces,
+                                  data[frames, dpmd_devi.DEVI_COLUMNS:])
+
+
+def test_extract_atomic_missing_frame(atomic, host):
+    data, _ = _full_parse(atomic)
+
+    with pytest.raises(IndexError):
+        find_parser(DEVI).extract_atomic(atomic, host, [0, len(data)])
@@ -0,0 +1,69 @@
+import bz2
+import gzip
+import lzma
+import shutil
+from pathlib import Path
+
+import pytest
+
+from simulation_visualizer import indexer
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """Index database and roots file in temporary directory."""
+    roots = tmp_path / "index_roots.txt"
+    monkeypatch.setattr(indexer, "INDEX_ROOTS", roots)
+    monkeypatch.setattr(indexer, "INDEX_DB", tmp_path / "index.db")
+    return roots
+
+
+def test_hosts_are_reported_after_crawl(index, host, make_file, tmp_path):
+    colvar = make_file("colvar")
+    index.write_text(f"{host} {colvar.parent}\nunreachable /data\n")
+    updated = []
+
+    indexer.update_all(lambda host, roots: updated.append((host, roots)))
+
+    # failed host is not reported, its suggestions stay cached
+    assert updated == [(host, [str(colvar.parent)])]
+
+
+def _pack(src, dst, opener, **kwargs):
+    with open(src, "rb") as s, opener(dst, "wb", **kwargs) as d:
+        shutil.copyfileobj(s, d)
+
+
+@pytest.fixture(params=["open_text", "standard library"])
+def crawl_script(request, monkeypatch):
+    """Crawl with the package importable and as on a host without it."""
+    if request.param == "standard library":
+        script = indexer.CRAWL_SCRIPT.replace("simulation_visualizer.utils",
+                                              "simulation_visualizer.missing")
+        monkeypatch.setattr(indexer, "CRAWL_SCRIPT", script)
+
+
+def test_crawl_recognizes_compressed_files(index, crawl_script, host,
+                                           make_file, tmp_path):
+    root = tmp_path / "runs"
+    (root / "a" / ".hidden").mkdir(parents=True)
+    colvar = make_file("colvar")
+    lcurve = make_file("lcurve_v2")
+    shutil.copy(colvar, root / "a" / "COLVAR")
+    shutil.copy(colvar, root / "a" / ".hidden" / "COLVAR")
+    _pack(colvar, root / "a" / "COLVAR.gz", gzip.open, compresslevel=1)
+    _pack(lcurve, root / "lcurve.out.bz2", bz2.open, compresslevel=1)
+    _pack(lcurve, root / "lcurve.out.xz", lzma.open, preset=0)
+    (root / "notes.txt").write_text("nothing to plot\n")
+    (root / "broken.gz").write_bytes(b"\x1f\x8b" + b"\x00" * 10)
+
+    assert indexer.update_index(host, [str(root)]) == 4
+
+    found = {Path(path).relative_to(root).as_posix(): parser
+             for _, path, parser, _, _ in indexer.search(str(root))}
+    assert found == {
+        "a/COLVAR": "Plumed-COLVAR",
+        "a/COLVAR.gz": "Plumed-COLVAR",
+        "lcurve.out.bz2": "DeepMD-lcurve-v2",
+        "lcurve.out.xz": "DeepMD-lcurve-v2",
+    }
@@ -0,0 +1,80 @@
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from simulation_visualizer import metrics
+
+pytestmark = pytest.mark.skipif(not metrics.PROMETHEUS,
+                                reason="prometheus_client is not installed")
+
+
+def _record(name: str):
+    from simulation_visualizer.metrics import stage
+
+    with stage(name, host="test"):
+        pass
+
+
+def test_worker_processes_share_metrics(tmp_path, monkeypatch):
+    monkeypatch.setenv(metrics.MULTIPROC_ENV, str(tmp_path))
+    (tmp_path / "histogram_1.db").write_bytes(b"stale")
+    metrics.reset_multiproc_dir()
+    assert not list(tmp_path.iterdir())
+
+    ctx = mp.get_context("spawn")
+    for name in ("first", "second"):
+        worker = ctx.Process(target=_record, args=(name,))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+        metrics.worker_exit(worker.pid)
+
+    body = metrics.metrics_view()[0].decode()
+    for name in ("first", "second"):
+        assert (f'sim_visualizer_stage_seconds_count{{host="test",'
+                f'parser="",stage="{name}"}} 1.0') in body
+
+
+def test_processes_use_the_same_directory(monkeypatch):
+    monkeypatch.delenv(metrics.MULTIPROC_ENV)
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    workers = [ctx.Process(target=_directory, args=(queue,))
+               for _ in range(2)]
+    for w in workers:
+        w.start()
+    directories = {queue.get(timeout=60) for _ in workers}
+    for w in workers:
+        w.join()
+
+    assert directories == {str(metrics.MULTIPROC_DIR)}
+
+
+def _directory(queue):
+    import simulation_visualizer.metrics  # noqa: F401
+
+    queue.put(os.environ[metrics.MULTIPROC_ENV])
+
+
+def test_main_imports_package_metrics(tmp_path):
+    # the script runs from the package directory with utils on top level
+    package = Path(metrics.__file__).parent
+    code = (
+        "import sys, utils\n"
+        "from importlib import util\n"
+        "spec = util.spec_from_file_location('visualizer_main', "
+        "'__main__.py')\n"
+        "spec.loader.exec_module(util.module_from_spec(spec))\n"
+        "assert 'metrics' not in sys.modules\n"
+    )
+    env = dict(os.environ, **{metrics.MULTIPROC_ENV: str(tmp_path)})
+    env["PYTHONPATH"] = os.pathsep.join([str(package.parent),
+                                        env.get("PYTHONPATH", "")])
+    result = subprocess.run([sys.executable, "-c", code], cwd=package,
+                            env=env, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+
+from simulation_visualizer import parsers
+from simulation_visualizer.parser import DataExtractor, find_parser
+
+FORMATS = ["colvar", "lcurve_v1", "lcurve_v2", "model_devi_v1",
+           "model_devi_atomic", "lammps_log"]
+
+
+@pytest.fixture(params=FORMATS)
+def parsed(request, host, make_file):
+    """Parser of the generated file, its path and the whole parsed file."""
+    path = str(make_file(request.param))
+    extractor = DataExtractor(path, host, "test")
+    full = extractor.extract()
+    return find_parser(extractor.detected), path, full
+
+
+def test_stride_keeps_every_nth_row(parsed, host):
+    parser, path, full = parsed
+
+    df = parser.extract_data(path, host, stride=7)
+
+    pd.testing.assert_frame_equal(df, full.iloc[::7].reset_index(drop=True))
+
+
+def test_sample_is_repeatable_subset(parsed, host):
+    parser, path, full = parsed
+
+    df = parser.extract_data(path, host, stride=2, sample=0.3)
+
+    assert 0 < len(df) < len(full) // 2
+    pd.testing.assert_frame_equal(
+        df, parser.extract_data(path, host, stride=2, sample=0.3)
+    )
+    # sampled rows are rows of the file in their original order
+    merged = full.iloc[::2].reset_index().merge(df, on=list(full.columns))
+    assert merged["index"].is_monotonic_increasing
+    assert len(merged) == len(df)
+
+
+@pytest.mark.parametrize("stride, sample", [(1, 1.0), (3, 1.0), (2, 0.5)])
+def test_chunks_match_extract_data(parsed, host, stride, sample):
+    parser, path, _ = parsed
+
+    chunks = list(parser.iter_chunks(path, host, chunk_rows=300,
+                                     stride=stride, sample=sample))
+
+    assert all(len(c) <= 300 for c in chunks)
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks),
+        parser.extract_data(path, host, stride=stride, sample=sample)
+    )
+
+
+def test_data_lines_follow_header(host, make_file):
+    parser = find_parser("LAMMPS-MetaD")
+    path = str(make_file("lammps_log"))
+
+    with open(path) as f:
+        header, lines = parser._data_lines(path, host, f)
+        first = next(iter(lines))
+
+    assert header == parser.extract_header(path, host)[0]
+    assert len(first.split()) == len(header)
+
+
+def test_parsers_are_discovered_once(monkeypatch):
+    imported = []
+    import_module = parsers.importlib.import_module
+    monkeypatch.setattr(parsers.importlib, "import_module",
+                        lambda *args: imported.append(args) or
+                        import_module(*args))
+    parsers.load_parsers()
+    imported.clear()
+
+    parsers.load_parsers()
+    assert not imported
+
+    # plugin dropped into the directory of running server changes its mtime
+    monkeypatch.setattr(parsers, "_loaded_mtime", 0.0)
+    parsers.load_parsers()
+    assert "plumed_colvar" in {name.lstrip(".") for name, _ in imported}
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import subprocess
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from simulation_visualizer import path_completition
+from simulation_visualizer.path_completition import (Completion, ListingCache,
+                                                     invalidate_listings)
+from simulation_visualizer.suggestion_server import protocol
+from simulation_visualizer.suggestion_server.server import SuggestionServer
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Suggestion server answering on a socket in its own thread."""
+    srv = SuggestionServer(str(tmp_path / "socket"))
+    loop = asyncio.new_event_loop()
+    unix = loop.run_until_complete(
+        asyncio.start_unix_server(srv.handle_client, path=srv.address)
+    )
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    yield srv
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    unix.close()
+    loop.run_until_complete(unix.wait_closed())
+    loop.close()
+    srv.close()
+
+
+@pytest.fixture
+def serverless(monkeypatch):
+    completion = Completion()
+    monkeypatch.setattr(path_completition, "_serverless", completion)
+    yield completion
+    completion.close()
+
+
+def test_invalidate_drops_path_and_subdirectories():
+    cache = ListingCache()
+    for path in ["/a", "/a/b", "/a/b/c", "/a/bc", "/d"]:
+        cache.get("host", path, lambda host, path: [])
+
+    cache.invalidate("HOST", "/a/b/")
+
+    assert [p for p in ["/a", "/a/b", "/a/b/c", "/a/bc", "/d"]
+            if cache.has("host", p)] == ["/a", "/a/bc", "/d"]
+
+
+def test_invalidated_listing_shows_new_file(host, tmp_path, serverless,
+                                            server):
+    (tmp_path / "COLVAR").write_text("")
+    for completion in (serverless, server.completion):
+        completion.get_entries(host, f"{tmp_path}/")
+    (tmp_path / "COLVAR.1").write_text("")
+
+    invalidate_listings(host, str(tmp_path), server.address)
+
+    for completion in (serverless, server.completion):
+        assert not completion.is_cached(host, f"{tmp_path}/")
+        assert f"{tmp_path}/COLVAR.1" in \
+            completion.get_dirs(host, f"{tmp_path}/")
+
+
+def test_invalidate_does_not_start_server(host, tmp_path, serverless,
+                                          monkeypatch):
+    def start_server(*args):
+        raise AssertionError("server must not be started")
+
+    monkeypatch.setattr(path_completition, "connect_to_suggestion_server",
+                        start_server)
+    serverless.get_entries(host, f"{tmp_path}/")
+
+    invalidate_listings(host, str(tmp_path), tmp_path / "missing")
+
+    assert not serverless.is_cached(host, f"{tmp_path}/")
+
+
+@pytest.mark.parametrize("payload", [5, None, ["get_dirs"]])
+def test_malformed_request_disconnects_client(tmp_path, payload):
+    srv = SuggestionServer(str(tmp_path / "socket"))
+
+    class Writer:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    async def handle():
+        reader = asyncio.StreamReader()
+        reader.feed_data(protocol.pack(1, payload))
+        reader.feed_eof()
+        writer = Writer()
+        await srv.handle_client(reader, writer)
+        return writer
+
+    try:
+        writer = asyncio.run(handle())
+    finally:
+        srv.close()
+
+    assert writer.closed
+
+
+class _Shell:
+    """Stands for ssh connection, commands run in local shell and sftp
+    reads local file system."""
+
+    def __init__(self, find=True):
+        self.subprocess = self
+        self.sftp = self
+        self._find = find
+
+    def run(self, command, suppress_out=False, quiet=False, **kwargs):
+        if not self._find:
+            command = "exit 1"
+        return subprocess.run(command, shell=True, **kwargs)
+
+    @staticmethod
+    def listdir_attr(path):
+        return [SimpleNamespace(filename=name, **_attrs(os.lstat(
+            os.path.join(path, name)))) for name in os.listdir(path)]
+
+    @staticmethod
+    def stat(path):
+        return SimpleNamespace(**_attrs(os.stat(path)))
+
+
+def _attrs(st):
+    return {"st_mode": st.st_mode, "st_size": st.st_size,
+            "st_mtime": st.st_mtime}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / "run").mkdir()
+    (tmp_path / "COLVAR").write_text("#! FIELDS time cv\n")
+    (tmp_path / "link").symlink_to(tmp_path / "COLVAR")
+    (tmp_path / "link-dir").symlink_to(tmp_path / "run")
+    return tmp_path
+
+
+@pytest.mark.parametrize("find", [True, False], ids=["find", "sftp"])
+def test_remote_listing_matches_local(tree, find):
+    completion = Completion()
+
+    local = sorted(completion._list_local(str(tree)))
+    remote = sorted(completion._list_remote(_Shell(find), str(tree)))
+
+    assert [e[:3] for e in remote] == [e[:3] for e in local]
+    assert [e[3] for e in remote] == pytest.approx([e[3] for e in local])
+    assert (f"{tree}/link-dir/", True) in [e[:2] for e in remote]
+
+
+def test_remote_listing_of_missing_directory(tmp_path):
+    completion = Completion()
+
+    for find in (True, False):
+        assert completion._list_remote(_Shell(find),
+                                       str(tmp_path / "missing")) is None
+
+
+def test_typing_in_directory_lists_it_once(host, tree, monkeypatch):
+    completion = Completion()
+    listed = []
+    list_local = completion._list_local
+    monkeypatch.setattr(completion, "_list_local",
+                        lambda path: listed.append(path) or list_local(path))
+
+    for typed in ("", "C", "CO", "COL"):
+        entries = completion.get_dirs(host, f"{tree}/{typed}")
+
+    assert entries == [f"{tree}/COLVAR"]
+    assert listed == [str(tree)]
@@ -0,0 +1,66 @@
+import shutil
+import threading
+
+import pytest
+
+from simulation_visualizer.data_cache import cache_key
+from simulation_visualizer.path_completition import Completion
+from simulation_visualizer.suggestion_server import prefetch
+from simulation_visualizer.utils import stat_files
+
+
+@pytest.fixture
+def prefetcher(cache):
+    completion = Completion()
+    prefetcher = prefetch.Prefetcher(completion)
+    prefetcher._cache = cache
+    yield prefetcher
+    prefetcher.close()
+    completion.close()
+
+
+def _wait(prefetcher):
+    prefetcher._executor.shutdown(wait=True)
+
+
+def test_suggested_dirs_and_headers_are_prefetched(prefetcher, cache, host,
+                                                   make_file, tmp_path):
+    for d in ("a", "b"):
+        (tmp_path / d).mkdir()
+    colvar = tmp_path / "COLVAR"
+    shutil.copy(make_file("colvar"), colvar)
+    (tmp_path / "notes.txt").write_text("1 2 3\n")
+    completion = prefetcher._completion
+    entries = completion.get_entries(host, f"{tmp_path}/")
+
+    prefetcher.schedule(host, entries)
+    _wait(prefetcher)
+
+    assert completion.is_cached(host, f"{tmp_path}/a/")
+    assert completion.is_cached(host, f"{tmp_path}/b/")
+    for path in (colvar, tmp_path / "notes.txt"):
+        stat = stat_files(host, [str(path)])[str(path)]
+        cached = cache.get(cache_key("header", str(path), host, stat))
+        # only files with known output names are worth parsing
+        assert (cached is not None) == (path == colvar)
+
+
+def test_pending_jobs_are_bounded(prefetcher, host, tmp_path, monkeypatch):
+    monkeypatch.setattr(prefetch, "MAX_PENDING", 2)
+    release = threading.Event()
+    listed = []
+
+    def list_dir(host, path):
+        listed.append(path)
+        release.wait(10)
+
+    monkeypatch.setattr(prefetcher._completion, "list_dir", list_dir)
+    entries = [(f"{tmp_path}/{i}/", True, 0, 0.0) for i in range(5)]
+
+    prefetcher.schedule(host, entries)
+    # same suggestion again is not prefetched twice
+    prefetcher.schedule(host, entries)
+    release.set()
+    _wait(prefetcher)
+
+    assert len(listed) == 2
@@ -0,0 +1,75 @@
+import base64
+
+import pytest
+from flask import Flask
+
+from simulation_visualizer import profiling
+from simulation_visualizer.parser import DataExtractor
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path / "profiles")
+    monkeypatch.setattr(profiling, "_ENABLED_DIR",
+                        tmp_path / "profiles" / "enabled")
+    return tmp_path / "profiles"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(profiling, "get_admins", lambda: ["admin"])
+    app = Flask(__name__)
+    profiling.init_app(app)
+    auth = base64.b64encode(b"admin:secret").decode()
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Basic {auth}"
+    return client
+
+
+def test_get_does_not_switch_profiling(client):
+    response = client.get("/admin/profiles?session=abc&action=session")
+
+    assert response.status_code == 200
+    assert profiling._config("abc") is None
+
+
+def test_post_switches_profiling(client):
+    client.post("/admin/profiles", data={"session": "abc",
+                                         "action": "request"})
+    assert profiling._config("abc") == {"mode": "request"}
+
+    client.post("/admin/profiles", data={"session": "abc",
+                                         "action": "disable"})
+    assert profiling._config("abc") is None
+
+
+def test_cross_site_post_refused(client):
+    response = client.post("/admin/profiles",
+                           data={"session": "abc", "action": "session"},
+                           headers={"Origin": "https://evil.example"})
+
+    assert response.status_code == 403
+    assert profiling._config("abc") is None
+
+
+def test_request_profiles_share_id(profile_dir, make_file, host):
+    path = make_file("colvar")
+    profiling.enable("abc", "session")
+    config = (profile_dir / "enabled" / "abc").read_text()
+
+    extractor = DataExtractor(path, host, "abc", "Plumed-COLVAR")
+    # header is parsed in worker thread, header_from in the calling one
+    for request_id, read in (("req1", extractor.header),
+                             ("req2", lambda: extractor.header_from(
+                                 open(path).read(4096)))):
+        token = profiling._REQUEST_ID.set(request_id)
+        try:
+            read()
+        finally:
+            profiling._REQUEST_ID.reset(token)
+
+    names = sorted(p.name for p in profile_dir.glob("*.txt"))
+    assert names == ["req1-PlumedMetaDParser.extract_header.txt",
+                     "req2-PlumedMetaDParser.extract_header.txt"]
+    # switch file is not rewritten by requests
+    assert (profile_dir / "enabled" / "abc").read_text() == config
@@ -0,0 +1,60 @@
+import socket
+import threading
+
+import pytest
+
+from simulation_visualizer.suggestion_server import protocol
+
+
+@pytest.fixture
+def pair():
+    left, right = socket.socketpair()
+    yield left, right
+    left.close()
+    right.close()
+
+
+def test_frames_round_trip(pair):
+    left, right = pair
+    reader = protocol.FrameReader(right)
+    payloads = [["list_dir", {"path": "/tmp"}, "session"], {"ok": None},
+                {"error": "žluťoučký kůň"}, [], "x" * 100]
+
+    for i, payload in enumerate(payloads):
+        left.sendall(protocol.pack(i, payload))
+
+    assert [reader.read() for _ in payloads] == list(enumerate(payloads))
+
+
+def test_frame_bigger_than_buffer(pair):
+    left, right = pair
+    reader = protocol.FrameReader(right)
+    payload = {"ok": ["a" * 1000] * (protocol.BUFFER_SIZE // 500)}
+    frame = protocol.pack(2 ** 32 - 1, payload)
+
+    # frame arrives in many small pieces, reader must join them
+    def send():
+        for i in range(0, len(frame), 997):
+            left.sendall(frame[i:i + 997])
+
+    sender = threading.Thread(target=send)
+    sender.start()
+    assert reader.read() == (2 ** 32 - 1, payload)
+    sender.join()
+
+
+def test_oversized_frame_refused(pair):
+    left, right = pair
+    left.sendall(protocol.HEADER.pack(1, protocol.MAX_FRAME + 1))
+
+    with pytest.raises(protocol.ProtocolError):
+        protocol.FrameReader(right).read()
+
+
+def test_closed_connection(pair):
+    left, right = pair
+    left.sendall(protocol.pack(1, {"ok": 1})[:-1])
+    left.close()
+
+    with pytest.raises(ConnectionResetError):
+        protocol.FrameReader(right).read()
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from simulation_visualizer import shared_arrays
+
+
+def _mapped(arr: np.ndarray) -> bool:
+    """Check if array is a view of memory mapped file."""
+    while arr is not None:
+        if isinstance(arr, np.memmap):
+            return True
+        arr = arr.base
+    return False
+
+
+def _frame(rows: int = 100000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "step": np.arange(rows, dtype=np.int64),
+        "cv1": rng.random(rows),
+        "count": rng.integers(0, 10, rows, dtype=np.int32),
+        "cv2": rng.random(rows),
+    })
+
+
+def test_round_trip_keeps_dtypes_and_order():
+    df = _frame()
+    assert shared_arrays.publish("key", df)
+    assert shared_arrays.exists("key")
+
+    attached = shared_arrays.attach("key")
+    pd.testing.assert_frame_equal(attached, df)
+
+
+def test_mixed_dtypes_are_not_copied():
+    shared_arrays.publish("key", _frame())
+    attached = shared_arrays.attach("key")
+
+    for column in attached:
+        assert _mapped(attached[column].to_numpy()), column
+
+
+def test_index_round_trip():
+    df = _frame(300000).iloc[::3]
+    assert shared_arrays.publish("range", df)
+    pd.testing.assert_frame_equal(shared_arrays.attach("range"), df)
+
+    df = df.sample(frac=0.5, random_state=0)
+    assert shared_arrays.publish("sampled", df)
+    pd.testing.assert_frame_equal(shared_arrays.attach("sampled"), df)
+
+
+def test_small_frames_are_not_shared():
+    assert not shared_arrays.publish("key", _frame(10))
+    assert not shared_arrays.exists("key")
+    assert shared_arrays.attach("key") is None
+
+
+def test_referenced_entries_are_not_evicted(monkeypatch):
+    shared_arrays.publish("key", _frame())
+    shared_arrays.attach("key")
+    monkeypatch.setattr(shared_arrays, "SHARED_LIMIT", 0)
+
+    shared_arrays.evict()
+    assert shared_arrays.exists("key")
+
+    shared_arrays.release("key")
+    shared_arrays.evict()
+    assert not shared_arrays.exists("key")
+
+
+def test_threads_publish_same_key(shared_dir):
+    df = _frame()
+    barrier = threading.Barrier(4)
+    results = []
+
+    def publish():
+        barrier.wait()
+        results.append(shared_arrays.publish("key", df))
+
+    threads = [threading.Thread(target=publish) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [True] * 4
+    pd.testing.assert_frame_equal(shared_arrays.attach("key"), df)
+    # temporary directories of the losers are gone
+    assert [p.name for p in shared_dir.iterdir()] == \
+        [shared_arrays._entry_dir("key").name]
+
+
+def test_entries_expire(monkeypatch):
+    shared_arrays.publish("key", _frame(), timeout=10)
+    assert shared_arrays.attach("key") is not None
+
+    later = time.time() + 11
+    monkeypatch.setattr(shared_arrays, "time", lambda: later)
+    assert not shared_arrays.exists("key")
+    assert shared_arrays.attach("key") is None
+
+    shared_arrays.evict()
+    assert not shared_arrays._entry_dir("key").exists()
+
+
+def test_new_version_supersedes_old():
+    shared_arrays.publish("old", _frame(), group="file")
+    shared_arrays.publish("other", _frame(), group="other file")
+    shared_arrays.publish("new", _frame(), group="file")
+
+    assert not shared_arrays.exists("old")
+    assert shared_arrays.exists("new") and shared_arrays.exists("other")
@@ -0,0 +1,130 @@
+import gzip
+import shutil
+
+import pandas as pd
+import pytest
+
+from simulation_visualizer.parser import find_parser
+from simulation_visualizer.transfer import ParallelDownload
+from simulation_visualizer.utils import open_text
+
+DEVI = "DeepMD-model_deviation-v2"
+
+
+class _Remote:
+    """Remote file whose first read of every third range fails."""
+
+    failed = set()
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+
+    def readv(self, chunks):
+        for offset, size in chunks:
+            if offset % 3 == 0 and offset not in self.failed:
+                self.failed.add(offset)
+                raise EOFError("channel dropped")
+            self._file.seek(offset)
+            yield self._file.read(size)
+
+    def close(self):
+        self._file.close()
+
+
+class _SFTP:
+
+    opened = 0
+
+    def __init__(self):
+        type(self).opened += 1
+
+    def open(self, path, mode):
+        return _Remote(path)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sftp():
+    _Remote.failed = set()
+    _SFTP.opened = 0
+    return _SFTP
+
+
+def _download(sftp, path, tmp_path, chunk=4099):
+    size = path.stat().st_size
+    return ParallelDownload(sftp, str(path), size, str(tmp_path / "part"),
+                            streams=3, chunk=chunk)
+
+
+def test_ranges_reassemble_file(sftp, make_file, tmp_path):
+    path = make_file("colvar")
+
+    raw = _download(sftp, path, tmp_path)
+    try:
+        with open_text(raw) as f:
+            text = f.read()
+    finally:
+        raw.close()
+
+    assert text == path.read_text()
+    assert raw.fetched == path.stat().st_size
+    # failed ranges were retried over new channels
+    assert _Remote.failed
+    assert sftp.opened > 3
+
+
+def test_failing_range_raises(make_file, tmp_path):
+
+    class Broken(_SFTP):
+        def open(self, path, mode):
+            raise OSError("permission denied")
+
+    raw = _download(Broken, make_file("colvar"), tmp_path)
+    try:
+        with pytest.raises(OSError):
+            with open_text(raw) as f:
+                f.read()
+    finally:
+        raw.close()
+
+
+def test_atomic_devi_from_download(sftp, make_file, tmp_path, host,
+                                   monkeypatch):
+    path = make_file("model_devi_atomic")
+    parser = find_parser(DEVI)
+    expected = parser.extract_data(str(path), host)
+
+    cut = []
+    cut_lines = parser._cut_lines
+    monkeypatch.setattr(parser, "_cut_lines",
+                        lambda lines: cut.append(1) or cut_lines(lines))
+
+    raw = _download(sftp, path, tmp_path)
+    try:
+        with open_text(raw) as f:
+            df = parser.extract_data(str(path), host, f)
+    finally:
+        raw.close()
+
+    # download has no memory map, per-atom columns are cut line by line
+    assert cut
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_atomic_devi_compressed(make_file, tmp_path, host):
+    path = make_file("model_devi_atomic")
+    packed = tmp_path / "model_devi.out.gz"
+    with open(path, "rb") as src, \
+            gzip.open(packed, "wb", compresslevel=1) as dst:
+        shutil.copyfileobj(src, dst)
+    parser = find_parser(DEVI)
+
+    pd.testing.assert_frame_equal(
+        parser.extract_data(str(packed), host),
+        parser.extract_data(str(path), host)
+    )
+    frames = [0, 5, 3]
+    assert (parser.extract_atomic(str(packed), host, frames) ==
+            parser.extract_atomic(str(path), host, frames)).all()
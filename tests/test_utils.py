@@ -0,0 +1,86 @@
+import os
+import subprocess
+
+import pytest
+import ssh_utilities
+
+from simulation_visualizer import utils
+from simulation_visualizer.parser import DataExtractor
+
+
+class _ShellConnection:
+    """Stands for ssh connection, runs remote commands in local shell."""
+
+    def __init__(self, *args, **kwargs):
+        self.subprocess = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    @staticmethod
+    def run(command, suppress_out=False, quiet=False, **kwargs):
+        return subprocess.run(command, shell=True, **kwargs)
+
+
+@pytest.fixture
+def remote(monkeypatch):
+    monkeypatch.setattr(utils, "is_local", lambda host: False)
+    monkeypatch.setattr(ssh_utilities, "Connection", _ShellConnection)
+    return "remote"
+
+
+def test_remote_probe_matches_local(remote, host, make_file):
+    path = make_file("colvar")
+
+    assert utils.probe_file(remote, str(path), 1000) == \
+        utils.probe_file(host, str(path), 1000)
+
+
+@pytest.mark.parametrize("target", ["directory", "missing", "unreadable"])
+def test_remote_probe_of_inaccessible_file(target, remote, tmp_path):
+    path = tmp_path / "file"
+    if target == "directory":
+        path.mkdir()
+    elif target == "unreadable":
+        if os.geteuid() == 0:
+            pytest.skip("root can read any file")
+        path.write_text("1 2 3\n")
+        path.chmod(0)
+
+    with pytest.raises(FileNotFoundError):
+        utils.probe_file(remote, str(path))
+
+
+
+def test_open_mapped_reads_through_memory_map(make_file):
+    path = make_file("colvar")
+
+    with utils.open_mapped(str(path)) as f:
+        assert isinstance(f.buffer.raw, utils.MappedFile)
+        text = f.read()
+
+    assert text == path.read_text()
+
+
+def test_open_mapped_empty_file(tmp_path):
+    path = tmp_path / "COLVAR"
+    path.write_text("")
+
+    with utils.open_mapped(str(path)) as f:
+        assert f.read() == ""
+
+
+def test_local_file_is_parsed_without_connection(host, make_file,
+                                                 monkeypatch):
+    def connection(*args, **kwargs):
+        raise AssertionError("local files must not need a connection")
+
+    monkeypatch.setattr(ssh_utilities, "Connection", connection)
+    path = make_file("colvar")
+
+    df = DataExtractor(str(path), host, "test").extract()
+
+    assert len(df) == len(path.read_text().splitlines()) - 1
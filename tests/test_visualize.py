@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+from simulation_visualizer import visualize
+
+# runs in a fresh interpreter, the app is imported only there
+SCRIPT = """
+import sys
+
+from simulation_visualizer import layout, visualize
+
+assert "ssh_utilities" not in sys.modules
+assert "paramiko" not in sys.modules
+assert layout.get_hosts.cache_info().currsize == 0
+
+layout.get_hosts = lambda: [{"label": "other", "value": "other"}]
+with visualize.app.server.test_request_context():
+    page = str(visualize.app.layout())
+assert "'other'" in page and "Plumed-COLVAR" in page, page
+"""
+
+
+def test_layout_reads_hosts_on_request_not_on_import():
+    result = subprocess.run([sys.executable, "-c", SCRIPT],
+                            capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+
+
+def test_file_links_keep_url_prefix():
+    link = visualize._file_link("host", "/home/user/COLVAR")
+
+    assert link == "/visualize/home/user/COLVAR#host"
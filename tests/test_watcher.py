@@ -0,0 +1,207 @@
+import os
+
+import pandas as pd
+import pytest
+import ssh_utilities
+
+from simulation_visualizer import watcher
+from simulation_visualizer.data_cache import has_df, lookup_df
+from simulation_visualizer.parser import DataExtractor, find_parser
+from simulation_visualizer.utils import stat_files
+
+
+@pytest.fixture
+def bookmark(monkeypatch, host):
+    """Bookmark single file, returns function that sets it."""
+    bookmarks = []
+    monkeypatch.setattr(watcher, "load_bookmarks", lambda: bookmarks)
+
+    def set_bookmark(path):
+        bookmarks[:] = [(host, str(path))]
+
+    return set_bookmark
+
+
+@pytest.fixture
+def full_parses(monkeypatch):
+    """Count how many times bookmarked files are parsed whole."""
+    calls = []
+    original = DataExtractor.header
+
+    def header(self):
+        calls.append(self)
+        return original(self)
+
+    monkeypatch.setattr(DataExtractor, "header", header)
+    return calls
+
+
+def _append(path, lines: str):
+    with open(path, "a") as f:
+        f.write(lines)
+    # make sure the fingerprint changes even on coarse mtime resolution
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 1))
+
+
+def _cached(cache, host, path):
+    stat = stat_files(host, [str(path)])[str(path)]
+    assert has_df(cache, str(path), host, stat)
+    return lookup_df(cache, f"df-{host}-{path}-{stat[0]}-{stat[1]}", host)
+
+
+def _parsed(host, path):
+    return DataExtractor(str(path), host, "test").extract()
+
+
+@pytest.mark.parametrize("kind", ["colvar", "lcurve_v2",
+                                  "model_devi_atomic"])
+def test_appended_rows_are_parsed_incrementally(kind, cache, host, make_file,
+                                                bookmark, full_parses):
+    path = make_file(kind)
+    bookmark(path)
+    w = watcher.BookmarkWatcher(cache)
+    w.poll()
+
+    # last line is being written, it must not be parsed until complete
+    lines = path.read_text().splitlines(keepends=True)[-20:]
+    _append(path, "".join(lines[:10]) + lines[10][:5])
+    w.poll()
+    _append(path, lines[10][5:] + "".join(lines[11:]))
+    w.poll()
+
+    assert len(full_parses) == 1
+    pd.testing.assert_frame_equal(_cached(cache, host, path),
+                                  _parsed(host, path))
+
+
+def test_unchanged_file_is_not_parsed_again(cache, host, make_file, bookmark,
+                                            full_parses):
+    bookmark(make_file("colvar"))
+    w = watcher.BookmarkWatcher(cache)
+    w.poll()
+    w.poll()
+    assert len(full_parses) == 1
+
+
+def test_shrunk_or_replaced_file_is_parsed_whole(cache, host, make_file,
+                                                 bookmark, full_parses):
+    path = make_file("colvar")
+    bookmark(path)
+    w = watcher.BookmarkWatcher(cache)
+    w.poll()
+
+    lines = path.read_text().splitlines(keepends=True)
+    path.write_text("".join(lines[:100]))
+    w.poll()
+    assert len(full_parses) == 2
+    assert len(_cached(cache, host, path)) == 99
+
+    replacement = path.with_name("new")
+    replacement.write_text("".join(lines[:500]))
+    os.replace(replacement, path)
+    w.poll()
+    assert len(full_parses) == 3
+    pd.testing.assert_frame_equal(_cached(cache, host, path),
+                                  _parsed(host, path))
+
+
+def test_lines_after_data_end_are_ignored(cache, host, make_file, bookmark,
+                                          full_parses):
+    path = make_file("lammps_log")
+    bookmark(path)
+    w = watcher.BookmarkWatcher(cache)
+    w.poll()
+
+    _append(path, "run 1000\nStep Temp\n1 2 3 4 5 6 7\n")
+    w.poll()
+
+    assert len(full_parses) == 1
+    pd.testing.assert_frame_equal(_cached(cache, host, path),
+                                  _parsed(host, path))
+
+
+def test_files_without_layout_are_parsed_whole(cache, host, make_file,
+                                               bookmark, full_parses,
+                                               monkeypatch):
+    monkeypatch.setattr(find_parser("Plumed-COLVAR"), "agent_layout", None)
+
+    path = make_file("colvar")
+    bookmark(path)
+    w = watcher.BookmarkWatcher(cache)
+    w.poll()
+    _append(path, "1 2 3 4 5 6\n")
+    w.poll()
+
+    assert len(full_parses) == 2
+    pd.testing.assert_frame_equal(_cached(cache, host, path),
+                                  _parsed(host, path))
+
+
+def test_growing_file_keeps_one_shared_entry(cache, host, make_file, bookmark,
+                                             shared_dir):
+    path = make_file("colvar", size=4 * 1024 ** 2)
+    bookmark(path)
+    w = watcher.BookmarkWatcher(cache)
+    w.poll()
+    lines = path.read_text().splitlines(keepends=True)[-10:]
+    for _ in range(3):
+        _append(path, "".join(lines))
+        w.poll()
+
+    # only the newest version of the file stays in shared memory
+    assert len(list(shared_dir.iterdir())) == 1
+
+
+class _SFTP:
+    """SFTP channel reading local files."""
+
+    def open(self, path, mode):
+        self._path = path
+        return self
+
+    def readv(self, chunks):
+        with open(self._path, "rb") as f:
+            for offset, size in chunks:
+                yield os.pread(f.fileno(), size, offset)
+
+    def close(self):
+        pass
+
+
+def test_remote_prefix_is_mapped_from_download(make_file, monkeypatch):
+    path = make_file("colvar")
+    data = path.read_bytes()
+    size = len(data) - 10
+
+    sftp = _SFTP()
+
+    class Connection:
+        def __init__(self, *args, **kwargs):
+            self.sftp = sftp
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+    monkeypatch.setattr(watcher, "is_local", lambda host: False)
+    monkeypatch.setattr(ssh_utilities, "Connection", Connection)
+    monkeypatch.setattr(watcher, "sftp_factory", lambda sftp: lambda: sftp)
+
+    with watcher._map_prefix("remote", str(path), size) as (mm, end):
+        assert end == data.rfind(b"\n", 0, size) + 1
+        assert mm[:end] == data[:end]
+
+
+def test_empty_file_is_skipped(cache, host, tmp_path, bookmark):
+    path = tmp_path / "COLVAR"
+    path.write_text("")
+    bookmark(path)
+    w = watcher.BookmarkWatcher(cache)
+    w.poll()
+
+    path.write_text("#! FIELDS time cv\n 0 1.0\n 1 2.0\n")
+    w.poll()
+    assert len(_cached(cache, host, path)) == 2
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+# runs in a fresh interpreter, the app is imported only there
+SCRIPT = """
+import threading
+
+from simulation_visualizer import wsgi
+
+assert threading.active_count() == 1, threading.enumerate()
+
+started = []
+wsgi.start_bookmark_watcher = lambda: started.append("watcher")
+wsgi.start_index_crawler = lambda: started.append("crawler")
+
+def start_response(status, headers):
+    pass
+
+for _ in range(2):
+    wsgi.application({"REQUEST_METHOD": "GET", "PATH_INFO": "/metrics",
+                      "SERVER_NAME": "test", "SERVER_PORT": "80",
+                      "wsgi.url_scheme": "http"}, start_response)
+assert started == ["watcher", "crawler"], started
+"""
+
+
+def test_threads_start_on_first_request_not_on_import(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    result = subprocess.run([sys.executable, "-c", SCRIPT], env=env,
+                            capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr